@@ -1,17 +1,26 @@
+import os
 from flask import Flask
 from flask_restful import Api
 from flask_cors import CORS 
 from resources.controller import (
     LoginResource, RegisterResource, LogoutResource, 
-    UserDetailResource, 
+    UserDetailResource, DashboardResource, BalanceResource,
     UtilityListResource, UtilityDetailResource,
     BillListResource, BillDetailResource,
-    PaymentListResource, PaymentDetailResource,
+    PaymentListResource, PaymentDetailResource, PaymentJobResource,
     ReminderListResource, ReminderDetailResource,
     AdminUserListResource, AdminUtilityListResource, AdminBillListResource, AdminPaymentListResource,
-    BatchPaymentResource # <-- NEW IMPORT
+    AdminMetricsResource, AdminExportResource, AdminImportResource,
+    AdminBillingRunListResource, AdminBillingRunResource, AdminBalanceListResource, AdminAnalyticsResource,
+    BatchPaymentResource, # <-- NEW IMPORT
+    HealthResource, ReadinessResource, MetricsResource
 )
 from resources import database as db 
+from resources import payment_queue
+from resources import reminder_scheduler
+from resources import serialization
+from resources import instrumentation
+from resources.controller import check_credentials
 
 app = Flask(__name__)
 CORS(app, 
@@ -23,6 +32,10 @@ CORS(app,
     }}
 )
 api = Api(app)
+# Fast JSON (orjson when installed) and optional MessagePack via Accept
+serialization.register(api)
+# Request timing, database / SQL spans, slow query log and admin profiling (X-Profile header)
+instrumentation.install(app, database=db, is_admin=check_credentials)
 
 # ----------------------------------------------------------------------
 # Define all Endpoints
@@ -36,6 +49,10 @@ api.add_resource(LogoutResource, '/api/auth/logout')
 # 👤 User Management Endpoints
 api.add_resource(UserDetailResource, '/api/users/<int:userId>') # GET, PUT
 
+# 🏠 Dashboard (one round trip for the home page)
+api.add_resource(DashboardResource, '/api/dashboard/<int:current_user_id>')
+api.add_resource(BalanceResource, '/api/balance/<int:current_user_id>')
+
 # 💡 Utility Management Endpoints
 api.add_resource(UtilityListResource, '/api/utilities')
 api.add_resource(UtilityDetailResource, '/api/utilities/<int:utilityId>')
@@ -51,6 +68,8 @@ api.add_resource(BatchPaymentResource, '/api/payments/batch/<int:current_user_id
 api.add_resource(PaymentListResource, '/api/payments/<int:current_user_id>')
 # 3. STANDARD PAYMENT DETAIL ENDPOINT
 api.add_resource(PaymentDetailResource, '/api/payments/<int:paymentId>')
+# 4. ASYNC PAYMENT JOB STATUS
+api.add_resource(PaymentJobResource, '/api/payments/jobs/<int:jobId>')
 
 # 🔔 Reminders & Notifications
 api.add_resource(ReminderListResource, '/api/reminders/<int:current_user_id>')
@@ -61,13 +80,42 @@ api.add_resource(AdminUserListResource, '/api/admin/users')
 api.add_resource(AdminUtilityListResource, '/api/admin/utilities')
 api.add_resource(AdminBillListResource, '/api/admin/bills')
 api.add_resource(AdminPaymentListResource, '/api/admin/payments')
+api.add_resource(AdminMetricsResource, '/api/admin/metrics')
+api.add_resource(AdminExportResource, '/api/admin/export/<string:kind>')
+api.add_resource(AdminImportResource, '/api/admin/import/<string:kind>')
+api.add_resource(AdminBillingRunListResource, '/api/admin/billing-runs')
+api.add_resource(AdminBillingRunResource, '/api/admin/billing-runs/<int:runId>')
+api.add_resource(AdminBalanceListResource, '/api/admin/balances')
+api.add_resource(AdminAnalyticsResource, '/api/admin/analytics/<string:report>')
+
+# 🩺 Health Checks (for load balancers and process managers)
+api.add_resource(HealthResource, '/healthz')
+api.add_resource(ReadinessResource, '/readyz')
+
+# 📈 Metrics (Prometheus scrape target)
+api.add_resource(MetricsResource, '/metrics')
 
 # ----------------------------------------------------------------------
 # Run
 # ----------------------------------------------------------------------
 
 if __name__ == '__main__':
-    # Initialize the database and insert dummy data on startup
-    db.create_table()
-    db.insert_dummy_data()
-    app.run(debug=True)
\ No newline at end of file
+    # The debug reloader runs this block in a file-watching parent and again in
+    # the serving child (WERKZEUG_RUN_MAIN=true). Only the child sets up the
+    # database and starts background threads, so they never run twice.
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        # Migrate the database (RESET_DB=1 drops and rebuilds it) and seed dummy data into an empty one
+        if os.environ.get("RESET_DB") == "1":
+            db.create_table()
+        else:
+            db.migrate()
+        db.verify_storage_profile()
+        db.insert_dummy_data()
+        # Payment gateway calls run on background workers
+        payment_queue.workers.start()
+        # Reminders for bills falling due are generated and sent in the background
+        reminder_scheduler.scheduler.start()
+        # Keep READ_REPLICAS (if any) copied from the primary
+        db.replica_syncer.start()
+    # Development server; for production use gunicorn.conf.py (pre-fork) or asgi.py (ASGI)
+    app.run(debug=True, use_reloader=True)
\ No newline at end of file
@@ -0,0 +1,126 @@
+import argparse
+import os
+
+from application import app as flask_app
+from resources import database as db
+from resources import instrumentation
+from resources import payment_queue
+from resources import reminder_scheduler
+from resources import tokens
+from resources.asgi_bridge import AsgiBridge
+
+# ----------------------------------------------------------------------
+# ASGI serving mode
+# ----------------------------------------------------------------------
+#
+#     python asgi.py --workers 4 --port 5000     # production launcher (uvicorn)
+#     uvicorn asgi:app                           # or any ASGI server
+#
+# Same URL map as application.py (the dev server); the difference is that an
+# event loop holds the connections, so idle keep-alive clients and slow
+# uploads or downloads do not tie up a thread. Request handling itself is not
+# more concurrent than under a threaded WSGI server: every handler is still
+# synchronous and holds one of DB_EXECUTOR_WORKERS threads from start to end,
+# so at most that many requests per process are processed at once (see
+# resources/asgi_bridge.py). Unlike the dev server it never resets the
+# database: startup only migrates.
+#
+# SIGTERM / Ctrl+C shut down gracefully: stop accepting, finish in-flight
+# requests (up to --shutdown-timeout), stop the payment workers after their
+# current charge, then close the connection pool.
+
+# Start the reminder scheduler and replica syncer with the app. The launcher
+# turns this off in its workers and runs them once, in its own process.
+ASGI_RUN_SCHEDULERS = os.environ.get("ASGI_RUN_SCHEDULERS", "1") == "1"
+ASGI_SHUTDOWN_TIMEOUT = float(os.environ.get("ASGI_SHUTDOWN_TIMEOUT", "30"))
+
+
+def startup():
+    tokens.require_production_keys()
+    db.migrate()
+    db.verify_storage_profile()
+    db.warm_up()
+    # Payment jobs are claimed row by row, so every worker process drains the queue
+    payment_queue.workers.start()
+    if ASGI_RUN_SCHEDULERS:
+        start_schedulers()
+
+
+def shutdown():
+    payment_queue.workers.stop(ASGI_SHUTDOWN_TIMEOUT)
+    if ASGI_RUN_SCHEDULERS:
+        stop_schedulers()
+    db.pool.close_all()
+
+
+def start_schedulers():
+    """Background jobs that must run once per deployment, not once per worker."""
+    reminder_scheduler.scheduler.start()
+    db.replica_syncer.start()
+
+
+def stop_schedulers():
+    reminder_scheduler.scheduler.stop(ASGI_SHUTDOWN_TIMEOUT)
+    db.replica_syncer.stop(ASGI_SHUTDOWN_TIMEOUT)
+
+
+app = AsgiBridge(flask_app, on_startup=startup, on_shutdown=shutdown)
+
+
+@instrumentation.registry.collector
+def bridge_metrics():
+    stats = app.metrics()
+    return [('asgi_requests_in_flight', 'gauge', 'Requests being handled by this process.', stats['in_flight']),
+            ('asgi_client_disconnects_total', 'counter', 'Requests abandoned before the body arrived.', stats['disconnects'])]
+
+
+def raise_open_file_limit():
+    """Every open connection is a file descriptor; lift the soft limit to the hard one."""
+    try:
+        import resource
+    except ImportError:  # not available on Windows
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the API over ASGI (uvicorn).")
+    parser.add_argument('--host', default=os.environ.get("HOST", "127.0.0.1"))
+    parser.add_argument('--port', type=int, default=int(os.environ.get("PORT", "5000")))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get("WEB_CONCURRENCY", "1")),
+                        help="Worker processes (each with its own event loop, executor and pool).")
+    parser.add_argument('--shutdown-timeout', type=float, default=ASGI_SHUTDOWN_TIMEOUT,
+                        help="Seconds in-flight requests get to finish on shutdown.")
+    parser.add_argument('--keep-alive', type=int, default=int(os.environ.get("ASGI_KEEPALIVE", "75")),
+                        help="Seconds an idle keep-alive connection is held open.")
+    parser.add_argument('--max-requests', type=int, default=int(os.environ.get("MAX_REQUESTS", "0")) or None,
+                        help="Replace a worker after this many requests (default: never).")
+    parser.add_argument('--backlog', type=int, default=2048)
+    args = parser.parse_args(argv)
+
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit('The ASGI launcher needs uvicorn: pip install "uvicorn[standard]"')
+
+    tokens.require_production_keys()
+    raise_open_file_limit()
+    # Migrate once here, so workers start against an up-to-date schema
+    db.migrate()
+    # Workers inherit the environment: they serve requests, this process runs the schedulers
+    os.environ["ASGI_RUN_SCHEDULERS"] = "0"
+    start_schedulers()
+    try:
+        uvicorn.run("asgi:app", host=args.host, port=args.port, workers=args.workers,
+                    app_dir=os.path.dirname(os.path.abspath(__file__)), lifespan="on",
+                    timeout_graceful_shutdown=args.shutdown_timeout, timeout_keep_alive=args.keep_alive,
+                    limit_max_requests=args.max_requests, backlog=args.backlog)
+    finally:
+        stop_schedulers()
+        db.pool.close_all()
+
+
+if __name__ == '__main__':
+    main()
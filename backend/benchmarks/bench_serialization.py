@@ -0,0 +1,102 @@
+import argparse
+import json
+import random
+import sqlite3
+import time
+from datetime import date, timedelta
+
+from resources import migrations
+from resources import serialization
+from resources.database import BILL_LIST_SQL, PAYMENT_LIST_SQL
+
+# --- Serialization Benchmark ---
+#
+#     python -m benchmarks.bench_serialization [--rows 50000] [--repeat 5]
+#
+# Builds an in-memory database, runs the admin bill and payment list queries
+# and reports the per-row cost of turning the result into a response body:
+#
+#   before   sqlite3.Row -> dict(row) -> flask-restful's stdlib json.dumps
+#   after    plain tuples -> RowSet -> serialization.dumps_json (orjson if installed)
+#   msgpack  plain tuples -> RowSet -> serialization.dumps_msgpack (if installed)
+
+
+def build_dataset(rows):
+    conn = sqlite3.connect(':memory:')
+    migrations.migrate(conn)
+    cursor = conn.cursor()
+    now = '2025-01-01 00:00:00'
+    users = max(1, rows // 20)
+    cursor.executemany("INSERT INTO users (username, password_hash, email, phone_number, created_at) VALUES (?, ?, ?, ?, ?)",
+                       ((f"user{i}", 'x', f"user{i}@example.com", '9876543210', now) for i in range(users)))
+    cursor.executemany("INSERT INTO utilities (name, description, provider_name, created_at) VALUES (?, ?, ?, ?)",
+                       ((f"Utility {i}", 'Benchmark utility', f"Provider {i}", now) for i in range(5)))
+    rng = random.Random(42)
+    start = date(2024, 1, 1)
+    cursor.executemany("INSERT INTO bills (user_id, utility_id, amount, due_date, status, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                       ((rng.randint(1, users), rng.randint(1, 5), round(rng.uniform(100, 5000), 2),
+                         (start + timedelta(days=rng.randint(0, 365))).isoformat(), rng.choice(['pending', 'paid']), now)
+                        for _ in range(rows)))
+    cursor.execute("""INSERT INTO payments (bill_id, user_id, amount, payment_method, status, transaction_date)
+                      SELECT bill_id, user_id, amount, 'UPI', 'completed', due_date || ' 10:00:00' FROM bills""")
+    conn.commit()
+    return conn
+
+
+def encode_before(conn, sql):
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute(sql).fetchall()
+    conn.row_factory = None
+    body = json.dumps({'rows': [dict(r) for r in rows]}) + "\n"
+    return len(rows), body
+
+
+def encode_after(conn, sql, dumps):
+    cursor = serialization.tuple_cursor(conn)
+    cursor.execute(sql)
+    rows = serialization.fetch_rowset(cursor)
+    return len(rows), dumps({'rows': rows})
+
+
+def measure(fn, repeat):
+    best = None
+    count = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        count, _body = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, count
+
+
+def run(rows=50000, repeat=5):
+    conn = build_dataset(rows)
+    variants = [('before', lambda sql: encode_before(conn, sql)),
+                ('after', lambda sql: encode_after(conn, sql, serialization.dumps_json))]
+    if serialization.msgpack is not None:
+        variants.append(('msgpack', lambda sql: encode_after(conn, sql, serialization.dumps_msgpack)))
+
+    results = {}
+    for endpoint, sql in (('admin/bills', BILL_LIST_SQL), ('admin/payments', PAYMENT_LIST_SQL)):
+        for name, fn in variants:
+            best, count = measure(lambda: fn(sql), repeat)
+            results[(endpoint, name)] = best / count * 1e6
+    conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-row response encoding cost, before vs after.")
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"Encoder: {serialization.encoder_name()}, msgpack: {'yes' if serialization.msgpack else 'no'}, rows: {args.rows}")
+    results = run(args.rows, args.repeat)
+    for (endpoint, name), per_row in results.items():
+        baseline = results[(endpoint, 'before')]
+        print(f"{endpoint:<16} {name:<8} {per_row:8.2f} us/row   {baseline / per_row:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import os
+import random
+import sqlite3
+import time
+from datetime import date, datetime, timedelta
+
+from resources import engines
+from resources import hashing
+from resources import migrations
+from resources import profiles
+
+# --- Synthetic Benchmark Datasets ---
+#
+#     python -m benchmarks.datasets 1m [--rebuild]
+#
+# Rows follow the shapes written by add_user / add_bill / add_payment /
+# add_reminder. The scale name is the number of bills; there is one user per
+# ten bills, roughly half the bills are paid (with a matching payment) and
+# every user has one reminder. Generation is seeded, so the same scale always
+# produces the same data. Built files are kept in benchmarks/data/ and reused;
+# copy_to() loads one into another engine's database (e.g. PostgreSQL).
+
+SCALES = {
+    '10k': 10_000,
+    '1m': 1_000_000,
+    '10m': 10_000_000,
+}
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# Every synthetic user (and the admin) logs in with this password
+BENCH_PASSWORD = 'password123'
+BENCH_ADMIN = 'bench_admin'
+
+UTILITIES = [
+    ("Electricity", "Residential electricity consumption.", "Tata Power"),
+    ("Water", "Municipal water supply.", "BWSSB"),
+    ("Gas", "Piped natural gas supply.", "Adani Gas"),
+]
+
+PAYMENT_METHODS = ['credit_card', 'debit_card', 'upi', 'net_banking']
+
+INSERT_CHUNK = 50_000
+
+
+def dataset_path(scale):
+    return os.path.join(DATA_DIR, f"bench-{scale}.db")
+
+
+def _pan(i):
+    letters = ''
+    n = i // 10000
+    for _ in range(5):
+        n, r = divmod(n, 26)
+        letters = chr(ord('A') + r) + letters
+    return f"{letters}{i % 10000:04d}Z"
+
+
+def _insert_chunked(cursor, sql, rows):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= INSERT_CHUNK:
+            cursor.executemany(sql, chunk)
+            chunk = []
+    if chunk:
+        cursor.executemany(sql, chunk)
+
+
+def build(scale, path=None, rebuild=False):
+    """Create (or reuse) the dataset file for a scale and return its path."""
+    if scale not in SCALES:
+        raise ValueError(f"Unknown scale '{scale}'. Choose one of: {', '.join(SCALES)}")
+    path = path or dataset_path(scale)
+    if os.path.exists(path) and not rebuild:
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    bills = SCALES[scale]
+    users = max(10, bills // 10)
+    rng = random.Random(f"bench-{scale}")
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    # One bcrypt hash shared by every row: hashing millions of passwords would dominate the build
+    password_hash = hashing.hash_password(BENCH_PASSWORD)
+    started = time.perf_counter()
+
+    conn = sqlite3.connect(path)
+    profiles.apply_profile(conn, 'bulk-load')
+    migrations.migrate(conn)
+    cursor = conn.cursor()
+    cursor.execute("BEGIN")
+
+    cursor.execute('''INSERT INTO users (username, password_hash, email, phone_number, pan, aadhaar, role, created_at)
+                      VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                   (BENCH_ADMIN, password_hash, 'admin@example.com', '9000000000', None, None, 'admin', now))
+    _insert_chunked(cursor, '''INSERT INTO users (username, password_hash, email, phone_number, pan, aadhaar, role, created_at)
+                               VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                    ((f"user{i}", password_hash, f"user{i}@example.com", f"9{i % 1_000_000_000:09d}",
+                      _pan(i), f"{i:012d}", 'user', now) for i in range(1, users)))
+    cursor.executemany("INSERT INTO utilities (name, description, provider_name, created_at) VALUES (?, ?, ?, ?)",
+                       [u + (now,) for u in UTILITIES])
+
+    start = date.today() - timedelta(days=365)
+    _insert_chunked(cursor, '''INSERT INTO bills (user_id, utility_id, amount, due_date, status, created_at)
+                               VALUES (?, ?, ?, ?, ?, ?)''',
+                    ((rng.randint(2, users), rng.randint(1, len(UTILITIES)), round(rng.uniform(50, 5000), 2),
+                      (start + timedelta(days=rng.randint(0, 425))).isoformat(),
+                      'paid' if rng.random() < 0.5 else 'pending', now)
+                     for _ in range(bills)))
+    cursor.execute('''INSERT INTO payments (bill_id, user_id, amount, payment_method, status, transaction_date)
+                      SELECT bill_id, user_id, amount,
+                             CASE bill_id % 4 WHEN 0 THEN 'credit_card' WHEN 1 THEN 'debit_card' WHEN 2 THEN 'upi' ELSE 'net_banking' END,
+                             'completed', due_date || ' 10:00:00'
+                      FROM bills WHERE status = 'paid' ''')
+    cursor.execute('''INSERT INTO reminders (user_id, message, reminder_date, created_at)
+                      SELECT user_id, 'Bill ' || bill_id || ' due on ' || due_date, date(due_date, '-1 day'), ?
+                      FROM bills WHERE status = 'pending' GROUP BY user_id''', (now,))
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+    print(f"Built {scale} dataset ({bills} bills, {users} users) in {time.perf_counter() - started:.1f}s: {path}")
+    return path
+
+
+def copy_to(path, target):
+    """Replace the contents of the database at target with the dataset file's tables."""
+    engine = engines.get_engine(target)
+    started = time.perf_counter()
+    source = sqlite3.connect(path)
+    conn = engine.connect(target, 'bulk-load')
+    try:
+        engine.drop_all_tables(conn)
+        engine.prepare(conn)
+        migrations.migrate(conn)
+        tables = [row[0] for row in source.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' AND name != 'schema_migrations'")]
+        for table in tables:
+            columns = [row[1] for row in source.execute(f'PRAGMA table_info("{table}")')]
+            # Triggers off: the summary and rollup tables are copied as they are
+            recreate = engine.drop_secondary_objects(conn, table)
+            conn.execute(f"DELETE FROM {table};")
+            engine.copy_rows(conn, table, columns, source.execute(f"SELECT {', '.join(columns)} FROM {table}"))
+            conn.commit()
+            for sql in recreate:
+                conn.execute(sql)
+            conn.commit()
+            engine.sync_ids(conn, table)
+        engine.optimize(conn)
+    finally:
+        conn.close()
+        source.close()
+    print(f"Copied {os.path.basename(path)} into {engine.name} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Build a synthetic benchmark dataset.")
+    parser.add_argument('scale', choices=list(SCALES))
+    parser.add_argument('--rebuild', action='store_true')
+    args = parser.parse_args()
+    build(args.scale, rebuild=args.rebuild)
@@ -0,0 +1,161 @@
+import http.client
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+# --- Load Generators ---
+#
+# Both drivers send `requests` requests for one scenario from `threads`
+# concurrent workers and return a summary with latency percentiles and
+# throughput. ClientDriver calls the app in-process through the Flask test
+# client (no sockets, measures the application itself); HttpDriver sends real
+# HTTP requests, either to a server it starts in a background thread or to an
+# already running deployment given by --url.
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(latencies, statuses, elapsed):
+    """Latency percentiles (ms), throughput and status counts for one scenario."""
+    ordered = sorted(latencies)
+    # 503 is the API's deliberate back-pressure (e.g. the hashing queue is full), not a failure
+    rejected = sum(1 for s in statuses if s == 503)
+    errors = sum(1 for s in statuses if s is None or (s >= 500 and s != 503))
+    codes = {}
+    for s in statuses:
+        codes[str(s)] = codes.get(str(s), 0) + 1
+    return {
+        'requests': len(ordered),
+        'errors': errors,
+        'rejected': rejected,
+        'statuses': codes,
+        'p50_ms': round(percentile(ordered, 50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 3),
+        'max_ms': round((ordered[-1] if ordered else 0) * 1000, 3),
+        'throughput_rps': round(len(ordered) / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class _Driver:
+    def __init__(self, threads=8):
+        self.threads = threads
+
+    def _worker(self):
+        """Return a callable (method, path, headers, body) -> status code for one thread."""
+        raise NotImplementedError
+
+    def run(self, scenario, ctx, requests):
+        latencies, statuses = [], []
+        lock = threading.Lock()
+        counter = iter(range(requests))
+        counter_lock = threading.Lock()
+
+        def loop():
+            send = self._worker()
+            local_lat, local_status = [], []
+            while True:
+                with counter_lock:
+                    i = next(counter, None)
+                if i is None:
+                    break
+                path, headers, body = scenario.build(ctx, i)
+                started = time.perf_counter()
+                try:
+                    status = send(scenario.method, path, headers, body)
+                except Exception:
+                    status = None
+                local_lat.append(time.perf_counter() - started)
+                local_status.append(status)
+            with lock:
+                latencies.extend(local_lat)
+                statuses.extend(local_status)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            for future in [executor.submit(loop) for _ in range(self.threads)]:
+                future.result()
+        return summarize(latencies, statuses, time.perf_counter() - started)
+
+    def close(self):
+        pass
+
+
+class ClientDriver(_Driver):
+    """In-process requests through app.test_client() (one client per thread)."""
+
+    name = 'client'
+
+    def __init__(self, app, threads=8):
+        super().__init__(threads)
+        self.app = app
+
+    def _worker(self):
+        client = self.app.test_client()
+
+        def send(method, path, headers, body):
+            response = client.open(path, method=method, headers=headers, json=body)
+            response.get_data()  # drain streamed bodies such as exports
+            return response.status_code
+        return send
+
+
+class HttpDriver(_Driver):
+    """Real HTTP requests over keep-alive connections (one per thread)."""
+
+    name = 'http'
+
+    def __init__(self, app=None, url=None, threads=8):
+        super().__init__(threads)
+        self._server = None
+        if url is None:
+            self._server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=_QuietHandler)
+            threading.Thread(target=self._server.serve_forever, daemon=True).start()
+            url = f"http://127.0.0.1:{self._server.server_port}"
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+
+    def _worker(self):
+        state = {'conn': None}
+
+        def send(method, path, headers, body):
+            if state['conn'] is None:
+                state['conn'] = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            payload = None
+            headers = dict(headers)
+            if body is not None:
+                payload = json.dumps(body)
+                headers['Content-Type'] = 'application/json'
+            try:
+                state['conn'].request(method, path, body=payload, headers=headers)
+                response = state['conn'].getresponse()
+                response.read()
+            except (http.client.HTTPException, OSError):
+                state['conn'].close()
+                state['conn'] = None
+                raise
+            if response.will_close:
+                state['conn'].close()
+                state['conn'] = None
+            return response.status
+        return send
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
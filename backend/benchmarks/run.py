@@ -0,0 +1,200 @@
+import argparse
+import json
+import logging
+import os
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks import datasets
+from benchmarks.loadgen import ClientDriver, HttpDriver
+from benchmarks.scenarios import SCENARIOS, Context, uncovered_routes
+
+# --- API Benchmark / Load Test Runner ---
+#
+#     python -m benchmarks.run --dataset 10k --mode client http
+#     python -m benchmarks.run --dataset 1m --mode http --threads 16 --requests 2000
+#     python -m benchmarks.run --dataset 10k --save-baseline
+#     python -m benchmarks.run --dataset 10k --database-url postgresql://localhost/bench
+#
+# Builds (or reuses) a synthetic dataset, copies it to a scratch file so write
+# scenarios never touch the original, drives every endpoint and prints
+# p50/p95/p99 latency and throughput. Results are compared against
+# benchmarks/baseline.json; the exit status is 1 when any scenario's p95 grew,
+# or its throughput dropped, by more than --threshold. With --database-url the
+# same dataset is copied into that database (its contents are replaced) and
+# the suite runs against the engine serving it; results are keyed
+# "<dataset>@<engine>/..." so both engines keep their own baseline.
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+DEFAULT_THRESHOLD = 0.25
+# p95 differences below this are treated as noise on sub-millisecond endpoints
+MIN_DELTA_MS = 1.0
+
+
+def prepare_database(scale, in_place=False, rebuild=False, database_url=None):
+    """Point the application at a copy of the dataset and return the dataset file's path."""
+    from resources import database as db
+    from resources import cache
+
+    path = datasets.build(scale, rebuild=rebuild)
+    if not in_place:
+        scratch = os.path.join(tempfile.mkdtemp(prefix='bench-'), os.path.basename(path))
+        shutil.copyfile(path, scratch)
+        path = scratch
+    db.use_database(path)
+    db.migrate()
+    if database_url:
+        datasets.copy_to(path, database_url)
+        db.use_database(database_url)
+        db.migrate()
+    cache.clear()
+    return path
+
+
+def seed_jobs(ctx):
+    """Queue a few payment jobs so the job status scenario has something to read."""
+    from resources import database as db
+    for user_id in ctx.user_ids[:20]:
+        if ctx.pending[user_id]:
+            bill_id = ctx.pending[user_id][0]
+            job_id, _ = db.enqueue_payment_job(bill_id, user_id, ctx.amounts[bill_id], 'upi')
+            if job_id:
+                ctx.job_ids.append(job_id)
+
+
+def median_summary(rounds):
+    """Combine per-round summaries by taking the median of every timing metric."""
+    merged = dict(rounds[0])
+    for key in ('p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'throughput_rps'):
+        merged[key] = statistics.median(r[key] for r in rounds)
+    for key in ('requests', 'errors', 'rejected'):
+        merged[key] = sum(r[key] for r in rounds)
+    statuses = {}
+    for r in rounds:
+        for code, n in r['statuses'].items():
+            statuses[code] = statuses.get(code, 0) + n
+    merged['statuses'] = statuses
+    return merged
+
+
+def run_suite(driver, ctx, scenarios, requests, warmup, rounds=1):
+    results = {}
+    for scenario in scenarios:
+        count = min(requests, scenario.max_requests or requests)
+        if warmup:
+            driver.run(scenario, ctx, min(warmup, count))
+        results[scenario.name] = median_summary([driver.run(scenario, ctx, count) for _ in range(rounds)])
+        r = results[scenario.name]
+        print(f"  {scenario.name:<22} {r['requests']:>6} req  p50 {r['p50_ms']:>9.2f}  p95 {r['p95_ms']:>9.2f}  "
+              f"p99 {r['p99_ms']:>9.2f} ms  {r['throughput_rps']:>9.1f} req/s  errors {r['errors']}  rejected {r['rejected']}")
+    return results
+
+
+def compare(results, baseline, threshold, min_delta_ms=MIN_DELTA_MS):
+    """Return a list of human-readable regressions against the baseline."""
+    regressions = []
+    for key, current in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        if current['p95_ms'] > base['p95_ms'] * (1 + threshold) and current['p95_ms'] - base['p95_ms'] > min_delta_ms:
+            regressions.append(f"{key}: p95 {base['p95_ms']:.2f} -> {current['p95_ms']:.2f} ms")
+        if base['throughput_rps'] and current['throughput_rps'] < base['throughput_rps'] * (1 - threshold) \
+                and current['p95_ms'] - base['p95_ms'] > min_delta_ms:
+            regressions.append(f"{key}: throughput {base['throughput_rps']:.1f} -> {current['throughput_rps']:.1f} req/s")
+        if current['errors'] > base.get('errors', 0):
+            regressions.append(f"{key}: errors {base.get('errors', 0)} -> {current['errors']}")
+    return regressions
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f).get('results', {})
+
+
+def save_baseline(path, results, args):
+    merged = load_baseline(path)
+    merged.update(results)
+    with open(path, 'w') as f:
+        json.dump({'threads': args.threads, 'requests': args.requests, 'rounds': args.rounds, 'results': dict(sorted(merged.items()))},
+                  f, indent=2)
+        f.write('\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every API endpoint against a synthetic dataset.")
+    parser.add_argument('--dataset', choices=list(datasets.SCALES), default='10k')
+    parser.add_argument('--mode', nargs='+', choices=['client', 'http'], default=['client'])
+    parser.add_argument('--url', help="Drive an already running server instead of an in-process one (http mode).")
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=300, help="Requests per scenario.")
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--rounds', type=int, default=3, help="Repeat each scenario and keep the median.")
+    parser.add_argument('--only', help="Regex on scenario names.")
+    parser.add_argument('--read-only', action='store_true', help="Skip scenarios that write.")
+    parser.add_argument('--in-place', action='store_true', help="Run against the dataset file itself, not a copy.")
+    parser.add_argument('--rebuild', action='store_true', help="Regenerate the dataset.")
+    parser.add_argument('--database-url', help="Run against this database (e.g. postgresql://...) instead of SQLite.")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--output', help="Write this run's results as JSON.")
+    args = parser.parse_args(argv)
+
+    path = prepare_database(args.dataset, in_place=args.in_place, rebuild=args.rebuild, database_url=args.database_url)
+    from resources import database as db
+    label = args.dataset if db.engine.name == 'sqlite' else f"{args.dataset}@{db.engine.name}"
+    import application
+    # Handlers that raise are counted as errors; their tracebacks would drown the report
+    application.app.logger.setLevel(logging.CRITICAL)
+    ctx = Context(path)
+    seed_jobs(ctx)
+
+    scenarios = [s for s in SCENARIOS
+                 if (not args.only or re.search(args.only, s.name)) and not (args.read_only and s.write)]
+    missing = uncovered_routes(application.app)
+    if missing:
+        print("Routes without a scenario: " + ", ".join(f"{m} {r}" for m, r in missing))
+
+    results = {}
+    for mode in args.mode:
+        if mode == 'client':
+            driver = ClientDriver(application.app, threads=args.threads)
+        else:
+            driver = HttpDriver(application.app, url=args.url, threads=args.threads)
+        print(f"[{label}/{mode}] {args.threads} threads, {args.requests} requests per scenario x {args.rounds} rounds")
+        started = time.perf_counter()
+        try:
+            for name, summary in run_suite(driver, ctx, scenarios, args.requests, args.warmup, args.rounds).items():
+                results[f"{label}/{mode}/{name}"] = summary
+        finally:
+            driver.close()
+        print(f"[{label}/{mode}] done in {time.perf_counter() - started:.1f}s")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results, args)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    regressions = compare(results, load_baseline(args.baseline), args.threshold)
+    if regressions:
+        print(f"Regressions (threshold {args.threshold:.0%}):")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
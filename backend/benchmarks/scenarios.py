@@ -0,0 +1,207 @@
+import random
+import sqlite3
+import uuid
+
+from resources import tokens
+from benchmarks.datasets import BENCH_ADMIN, BENCH_PASSWORD
+
+# --- Endpoint Scenarios ---
+#
+# One scenario per (method, route) registered in application.py. build(ctx, i)
+# returns (path, headers, json_body) for the i-th request so every request
+# hits a different user / bill. Writes that would consume the dataset
+# (DELETE) target ids that do not exist, which still runs the full handler.
+
+SAMPLE_USERS = 500
+
+
+class Scenario:
+    def __init__(self, name, method, rule, build, write=False, max_requests=None):
+        self.name = name
+        self.method = method
+        self.rule = rule
+        self.build = build
+        self.write = write
+        # bcrypt-bound scenarios cap their request count to keep runs short
+        self.max_requests = max_requests
+
+
+class Context:
+    """Ids and credentials sampled from the dataset before a run."""
+
+    def __init__(self, db_path, seed=7):
+        rng = random.Random(seed)
+        conn = sqlite3.connect(db_path)
+        self.admin_id = conn.execute("SELECT user_id FROM users WHERE username = ?", (BENCH_ADMIN,)).fetchone()[0]
+        max_user = conn.execute("SELECT MAX(user_id) FROM users").fetchone()[0]
+        max_bill = conn.execute("SELECT MAX(bill_id) FROM bills").fetchone()[0]
+        self.missing_id = max(max_user, max_bill) + 1_000_000
+        self.user_ids = sorted(rng.sample(range(self.admin_id + 1, max_user + 1), min(SAMPLE_USERS, max_user - self.admin_id)))
+        self.bill_ids = [rng.randint(1, max_bill) for _ in range(SAMPLE_USERS)]
+        # A pending bill per sampled user, for payment and batch scenarios
+        self.pending = {}
+        self.amounts = {}
+        for user_id in self.user_ids:
+            rows = conn.execute("SELECT bill_id, amount FROM bills WHERE user_id = ? AND status = 'pending'", (user_id,)).fetchall()
+            self.pending[user_id] = [r[0] for r in rows]
+            self.amounts.update(rows)
+        self.usernames = {user_id: name for user_id, name in conn.execute(
+            f"SELECT user_id, username FROM users WHERE user_id IN ({','.join('?' * len(self.user_ids))})", self.user_ids)}
+        conn.close()
+        self.utility_ids = [1, 2, 3]
+        self.job_ids = []
+        self.admin_token, _ = tokens.issue_token(self.admin_id, 'admin')
+        self.user_tokens = {user_id: tokens.issue_token(user_id, 'user')[0] for user_id in self.user_ids}
+        self.run_id = uuid.uuid4().hex[:8]
+
+    def user(self, i):
+        return self.user_ids[i % len(self.user_ids)]
+
+    def auth(self, user_id):
+        return {'Authorization': 'Bearer ' + self.user_tokens[user_id]}
+
+    def admin(self):
+        return {'Authorization': 'Bearer ' + self.admin_token}
+
+
+def _user_get(prefix):
+    def build(ctx, i):
+        user_id = ctx.user(i)
+        return f"{prefix}/{user_id}", ctx.auth(user_id), None
+    return build
+
+
+def _login(ctx, i):
+    user_id = ctx.user(i)
+    return '/api/auth/login', {}, {'username': ctx.usernames[user_id], 'password': BENCH_PASSWORD}
+
+
+def _register(ctx, i):
+    name = f"bench_{ctx.run_id}_{i}"
+    return '/api/auth/register', {}, {'username': name, 'password': BENCH_PASSWORD,
+                                      'email': f"{name}@example.com", 'phone_number': '9876543210'}
+
+
+def _logout(ctx, i):
+    token, _ = tokens.issue_token(ctx.user(i), 'user')
+    return '/api/auth/logout', {'Authorization': 'Bearer ' + token}, None
+
+
+def _update_user(ctx, i):
+    user_id = ctx.user(i)
+    return f"/api/users/{user_id}", ctx.auth(user_id), {'email': f"user{user_id}+{i}@example.com"}
+
+
+def _add_utility(ctx, i):
+    return '/api/utilities', {}, {'name': f"Bench utility {i}", 'description': 'Benchmark', 'provider_name': 'Bench'}
+
+
+def _utility(ctx, i):
+    return f"/api/utilities/{ctx.utility_ids[i % len(ctx.utility_ids)]}", {}, None
+
+
+def _update_utility(ctx, i):
+    utility_id = ctx.utility_ids[i % len(ctx.utility_ids)]
+    return f"/api/utilities/{utility_id}", {}, {'description': f"Updated {i}"}
+
+
+def _missing(prefix):
+    def build(ctx, i):
+        return f"{prefix}/{ctx.missing_id + i}", ctx.admin(), None
+    return build
+
+
+def _update_bill(ctx, i):
+    bill_id = ctx.bill_ids[i % len(ctx.bill_ids)]
+    return f"/api/bills/{bill_id}", ctx.admin(), {'amount': 100 + i % 50}
+
+
+def _pay(ctx, i):
+    user_id = ctx.user(i)
+    pending = ctx.pending[user_id] or [ctx.missing_id]
+    bill_id = pending[i % len(pending)]
+    return f"/api/payments/{user_id}", ctx.auth(user_id), {
+        'bill_id': bill_id, 'payment_amount': ctx.amounts.get(bill_id, 100), 'payment_method': 'upi'}
+
+
+def _batch_pay(ctx, i):
+    user_id = ctx.user(i)
+    headers = dict(ctx.auth(user_id), **{'Idempotency-Key': f"bench-{ctx.run_id}-{i}"})
+    return f"/api/payments/batch/{user_id}", headers, {
+        'bill_ids': ctx.pending[user_id][:5] or [ctx.missing_id], 'payment_method': 'upi'}
+
+
+def _job(ctx, i):
+    job_id = ctx.job_ids[i % len(ctx.job_ids)] if ctx.job_ids else ctx.missing_id
+    return f"/api/payments/jobs/{job_id}", ctx.admin(), None
+
+
+def _admin(path):
+    def build(ctx, i):
+        return path, ctx.admin(), None
+    return build
+
+
+def _admin_bills_page(ctx, i):
+    return f"/api/admin/bills?limit=100&user_id={ctx.user(i)}", ctx.admin(), None
+
+
+ANALYTICS_REPORTS = ['revenue?granularity=month', 'collection', 'aging', 'payment-methods']
+
+
+def _analytics(ctx, i):
+    return f"/api/admin/analytics/{ANALYTICS_REPORTS[i % len(ANALYTICS_REPORTS)]}", ctx.admin(), None
+
+
+def _export(ctx, i):
+    return f"/api/admin/export/bills?format=ndjson&user_id={ctx.user(i)}", ctx.admin(), None
+
+
+SCENARIOS = [
+    Scenario('login', 'POST', '/api/auth/login', _login, max_requests=40),
+    Scenario('register', 'POST', '/api/auth/register', _register, write=True, max_requests=40),
+    Scenario('logout', 'POST', '/api/auth/logout', _logout, write=True),
+    Scenario('user', 'GET', '/api/users/<int:userId>', _user_get('/api/users')),
+    Scenario('user_update', 'PUT', '/api/users/<int:userId>', _update_user, write=True),
+    Scenario('dashboard', 'GET', '/api/dashboard/<int:current_user_id>', _user_get('/api/dashboard')),
+    Scenario('balance', 'GET', '/api/balance/<int:current_user_id>', _user_get('/api/balance')),
+    Scenario('utilities', 'GET', '/api/utilities', lambda ctx, i: ('/api/utilities', {}, None)),
+    Scenario('utility_add', 'POST', '/api/utilities', _add_utility, write=True),
+    Scenario('utility', 'GET', '/api/utilities/<int:utilityId>', _utility),
+    Scenario('utility_update', 'PUT', '/api/utilities/<int:utilityId>', _update_utility, write=True),
+    Scenario('utility_delete', 'DELETE', '/api/utilities/<int:utilityId>', _missing('/api/utilities'), write=True),
+    Scenario('bills', 'GET', '/api/bills/<int:current_user_id>', _user_get('/api/bills')),
+    Scenario('bill_update', 'PUT', '/api/bills/<int:billId>', _update_bill, write=True),
+    Scenario('bill_delete', 'DELETE', '/api/bills/<int:billId>', _missing('/api/bills'), write=True),
+    Scenario('payments', 'GET', '/api/payments/<int:current_user_id>', _user_get('/api/payments')),
+    Scenario('payment_submit', 'POST', '/api/payments/<int:current_user_id>', _pay, write=True),
+    Scenario('payment_batch', 'POST', '/api/payments/batch/<int:current_user_id>', _batch_pay, write=True),
+    Scenario('payment_update', 'PUT', '/api/payments/<int:paymentId>', lambda ctx, i: (
+        f"/api/payments/{ctx.missing_id + i}", ctx.admin(), {'status': 'completed'}), write=True),
+    Scenario('payment_delete', 'DELETE', '/api/payments/<int:paymentId>', _missing('/api/payments'), write=True),
+    Scenario('payment_job', 'GET', '/api/payments/jobs/<int:jobId>', _job),
+    Scenario('reminders', 'GET', '/api/reminders/<int:current_user_id>', _user_get('/api/reminders')),
+    Scenario('reminder_delete', 'DELETE', '/api/reminders/<int:reminderId>', _missing('/api/reminders'), write=True),
+    Scenario('admin_users', 'GET', '/api/admin/users', _admin('/api/admin/users')),
+    Scenario('admin_utilities', 'GET', '/api/admin/utilities', _admin('/api/admin/utilities')),
+    Scenario('admin_bills', 'GET', '/api/admin/bills', _admin('/api/admin/bills?limit=100')),
+    Scenario('admin_bills_filtered', 'GET', '/api/admin/bills', _admin_bills_page),
+    Scenario('admin_payments', 'GET', '/api/admin/payments', _admin('/api/admin/payments?limit=100')),
+    Scenario('admin_balances', 'GET', '/api/admin/balances', _admin('/api/admin/balances?limit=100')),
+    Scenario('admin_analytics', 'GET', '/api/admin/analytics/<string:report>', _analytics),
+    Scenario('admin_metrics', 'GET', '/api/admin/metrics', _admin('/api/admin/metrics')),
+    Scenario('admin_export', 'GET', '/api/admin/export/<string:kind>', _export),
+]
+
+
+def uncovered_routes(app):
+    """(method, rule) pairs registered on the app that no scenario drives."""
+    covered = {(s.method, s.rule) for s in SCENARIOS}
+    missing = []
+    for rule in app.url_map.iter_rules():
+        if not rule.rule.startswith('/api/'):
+            continue
+        for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}):
+            if (method, rule.rule) not in covered:
+                missing.append((method, rule.rule))
+    return missing
@@ -0,0 +1,98 @@
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+
+# ----------------------------------------------------------------------
+# Pre-fork production server (gunicorn)
+# ----------------------------------------------------------------------
+#
+#     gunicorn -c gunicorn.conf.py                  # from backend/
+#     WEB_CONCURRENCY=8 GUNICORN_THREADS=8 gunicorn -c gunicorn.conf.py
+#
+# The master imports the app once and migrates the database (never
+# destructive), then forks the workers, which share the loaded code
+# copy-on-write. No database connection crosses the fork: each worker opens
+# and warms its own pool before taking traffic, starts its payment workers and
+# is replaced after max_requests (+ jitter) requests. The reminder scheduler
+# and the replica syncer must run once per deployment, so the master runs
+# them as child processes rather than in every worker.
+#
+# Probes: GET /healthz (process up) and GET /readyz (database answers, schema
+# current; 503 otherwise).
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+wsgi_app = "application:app"
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+# One process per core; threads cover the time each request waits on I/O
+workers = int(os.environ.get("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+max_requests = int(os.environ.get("MAX_REQUESTS", "10000"))
+# Spread the recycling out so the workers do not all restart together
+max_requests_jitter = int(os.environ.get("MAX_REQUESTS_JITTER", str(max_requests // 10)))
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.environ.get("WORKER_TIMEOUT", "60"))
+keepalive = int(os.environ.get("KEEPALIVE", "5"))
+preload_app = True
+chdir = BACKEND_DIR
+
+# Run the reminder scheduler / replica syncer next to the workers (0 when they run elsewhere)
+RUN_SCHEDULERS = os.environ.get("RUN_SCHEDULERS", "1") == "1"
+
+_sidecars = []
+
+
+def on_starting(server):
+    from resources import database as db
+    from resources import tokens
+
+    tokens.require_production_keys()
+    applied = db.migrate()
+    db.verify_storage_profile()
+    server.log.info("Schema migrated (applied: %s)", applied or "none")
+    # Close what the master opened, so forked workers never share a connection
+    db.pool.reset()
+
+
+def when_ready(server):
+    from resources import replicas
+
+    if not RUN_SCHEDULERS:
+        return
+    modules = ['resources.reminder_scheduler'] + (['resources.replicas'] if replicas.READ_REPLICAS else [])
+    for module in modules:
+        _sidecars.append(subprocess.Popen([sys.executable, '-m', module], cwd=BACKEND_DIR))
+        server.log.info("Started %s [%s]", module, _sidecars[-1].pid)
+
+
+def post_fork(server, worker):
+    from resources import database as db
+    from resources import payment_queue
+
+    db.pool.reset()
+    warmed = db.warm_up()
+    payment_queue.workers.start()
+    server.log.info("Worker %s warmed %s connection(s)", worker.pid, warmed)
+
+
+def worker_exit(server, worker):
+    from resources import database as db
+    from resources import payment_queue
+
+    # Let in-flight charges finish before the process goes away
+    payment_queue.workers.stop(graceful_timeout)
+    db.pool.close_all()
+
+
+def on_exit(server):
+    # Both sidecars finish their current batch and exit on Ctrl+C
+    for process in _sidecars:
+        process.send_signal(signal.SIGINT)
+    for process in _sidecars:
+        try:
+            process.wait(graceful_timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
@@ -0,0 +1,202 @@
+import argparse
+import os
+import threading
+import time
+from datetime import datetime
+from sqlite3 import Error
+
+from resources import database as db
+
+# --- Admin Analytics ---
+#
+# The admin reports read two rollup tables instead of bills and payments:
+#
+#   payment_daily_rollup   payments per transaction day, method and status
+#   bill_daily_rollup      bills per due date, utility and status
+#
+# refresh() recomputes each rollup from its watermark (the last day it had
+# seen) onwards, plus any older days that the triggers in
+# migrations.ANALYTICS_TRIGGERS queued because a write landed behind the
+# watermark (a bill paid late, an edited payment). Reports refresh at most
+# every ANALYTICS_MAX_STALENESS seconds, so a report costs a handful of
+# indexed range reads plus a query over at most days x utilities rows.
+#
+#     python -m resources.analytics [--full]
+
+ANALYTICS_MAX_STALENESS = float(os.environ.get("ANALYTICS_MAX_STALENESS", "60"))
+
+AGING_BUCKETS = ['1-30', '31-60', '61-90', '90+']
+
+ROLLUPS = {
+    'payments': {
+        'table': 'payment_daily_rollup',
+        'day': 'day',
+        'insert': '''INSERT INTO payment_daily_rollup (day, payment_method, status, payment_count, amount)
+                     SELECT date(p.transaction_date), p.payment_method, p.status, COUNT(*), ROUND(SUM(p.amount), 2)
+                     FROM payments p {source}
+                     GROUP BY 1, 2, 3;''',
+        'since': "WHERE p.transaction_date >= ?",
+        'dirty': '''JOIN analytics_dirty_days d ON d.rollup = 'payments'
+                    AND p.transaction_date >= d.day AND p.transaction_date < date(d.day, '+1 day')''',
+    },
+    'bills': {
+        'table': 'bill_daily_rollup',
+        'day': 'due_date',
+        'insert': '''INSERT INTO bill_daily_rollup (due_date, utility_id, status, bill_count, amount)
+                     SELECT b.due_date, b.utility_id, b.status, COUNT(*), ROUND(SUM(b.amount), 2)
+                     FROM bills b {source}
+                     GROUP BY 1, 2, 3;''',
+        # Closed range: with an open one the planner walks idx_bills_utility_due instead
+        'since': "WHERE b.due_date >= ? AND b.due_date <= '9999-12-31'",
+        'dirty': "JOIN analytics_dirty_days d ON d.rollup = 'bills' AND b.due_date = d.day",
+    },
+}
+
+
+def refresh(conn, full=False):
+    """Bring both rollups up to date in one transaction. Returns {rollup: new watermark}."""
+    today = datetime.now().strftime('%Y-%m-%d')
+    watermarks = {}
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE;")
+    try:
+        for name, spec in ROLLUPS.items():
+            table, day = spec['table'], spec['day']
+            cursor.execute("SELECT value FROM scheduler_checkpoints WHERE name = ?;", (f'analytics.{name}',))
+            row = cursor.fetchone()
+            watermark = None if full or row is None else row[0]
+            if watermark is None:
+                cursor.execute(f"DELETE FROM {table};")
+                cursor.execute(spec['insert'].format(source=''))
+            else:
+                # Older days touched since the last refresh, then everything from the watermark on
+                cursor.execute(f"DELETE FROM {table} WHERE {day} IN (SELECT day FROM analytics_dirty_days WHERE rollup = ?);",
+                               (name,))
+                cursor.execute(spec['insert'].format(source=spec['dirty']))
+                cursor.execute(f"DELETE FROM {table} WHERE {day} >= ?;", (watermark,))
+                cursor.execute(spec['insert'].format(source=spec['since']), (watermark,))
+            cursor.execute("DELETE FROM analytics_dirty_days WHERE rollup = ?;", (name,))
+            cursor.execute(f"SELECT MAX({day}) FROM {table};")
+            watermarks[name] = cursor.fetchone()[0] or watermark or today
+            db.set_checkpoint(cursor, f'analytics.{name}', watermarks[name])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return watermarks
+
+
+def invalidate(conn):
+    """Forget the watermarks so the next refresh rebuilds both rollups (e.g. after a bulk load)."""
+    conn.execute("DELETE FROM scheduler_checkpoints WHERE name LIKE 'analytics.%';")
+    conn.commit()
+
+
+_refresh_lock = threading.Lock()
+_last_refresh = 0.0
+
+
+def refresh_if_stale(max_age=None):
+    """Refresh the rollups if this process has not done so in the last max_age seconds."""
+    global _last_refresh
+    max_age = ANALYTICS_MAX_STALENESS if max_age is None else max_age
+    with _refresh_lock:
+        if time.monotonic() - _last_refresh < max_age:
+            return
+        try:
+            with db.get_connection() as conn:
+                refresh(conn)
+            _last_refresh = time.monotonic()
+        except Error as e:
+            # Serve the last rollup rather than fail the report
+            print(f"Error refreshing analytics rollups: {e}")
+
+
+def _query(sql, params=()):
+    with db.get_read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        return [dict(row) for row in cursor.fetchall()]
+
+
+def _range(date_from, date_to):
+    return date_from or '0000-00-00', date_to or '9999-12-31'
+
+
+def as_of():
+    """When the rollups were last refreshed (by any process)."""
+    rows = _query("SELECT MIN(updated_at) AS as_of FROM scheduler_checkpoints WHERE name LIKE 'analytics.%';")
+    return rows[0]['as_of']
+
+
+# --- Reports ---
+
+def revenue(granularity='day', date_from=None, date_to=None):
+    """Completed payment count and amount per day or month."""
+    period = 'day' if granularity == 'day' else 'substr(day, 1, 7)'
+    return _query(f'''SELECT {period} AS period, SUM(payment_count) AS payments, ROUND(SUM(amount), 2) AS amount
+                      FROM payment_daily_rollup
+                      WHERE status = 'completed' AND day >= ? AND day <= ?
+                      GROUP BY 1 ORDER BY 1;''', _range(date_from, date_to))
+
+
+def collection(group='utility', date_from=None, date_to=None):
+    """Billed vs collected amounts per utility or provider, for bills due in the range."""
+    columns = ('util.utility_id, util.name AS utility_name, util.provider_name' if group == 'utility'
+               else 'util.provider_name')
+    rows = _query(f'''SELECT {columns}, SUM(r.bill_count) AS bills,
+                             ROUND(SUM(r.amount), 2) AS billed,
+                             ROUND(SUM(CASE WHEN r.status = 'paid' THEN r.amount ELSE 0 END), 2) AS collected,
+                             ROUND(SUM(CASE WHEN r.status = 'pending' THEN r.amount ELSE 0 END), 2) AS outstanding
+                      FROM bill_daily_rollup r JOIN utilities util ON r.utility_id = util.utility_id
+                      WHERE r.due_date >= ? AND r.due_date <= ?
+                      GROUP BY {'util.utility_id' if group == 'utility' else 'util.provider_name'}
+                      ORDER BY billed DESC;''', _range(date_from, date_to))
+    for row in rows:
+        row['collection_rate'] = round(row['collected'] / row['billed'], 4) if row['billed'] else None
+    return rows
+
+
+def aging(today=None, utility_id=None):
+    """Pending bills past their due date, bucketed by days overdue."""
+    today = today or datetime.now().strftime('%Y-%m-%d')
+    clauses, params = ["status = 'pending'", "due_date < ?"], [today, today]
+    if utility_id is not None:
+        clauses.append("utility_id = ?")
+        params.append(utility_id)
+    rows = _query(f'''SELECT CASE WHEN overdue <= 30 THEN '1-30' WHEN overdue <= 60 THEN '31-60'
+                                  WHEN overdue <= 90 THEN '61-90' ELSE '90+' END AS bucket,
+                             SUM(bill_count) AS bills, ROUND(SUM(amount), 2) AS amount
+                      FROM (SELECT julianday(?) - julianday(due_date) AS overdue, bill_count, amount
+                            FROM bill_daily_rollup WHERE {" AND ".join(clauses)})
+                      GROUP BY 1;''', params)
+    found = {row['bucket']: row for row in rows}
+    return [found.get(bucket, {'bucket': bucket, 'bills': 0, 'amount': 0.0}) for bucket in AGING_BUCKETS]
+
+
+def payment_methods(date_from=None, date_to=None):
+    """Completed payments per method, with each method's share of the amount."""
+    rows = _query('''SELECT payment_method, SUM(payment_count) AS payments, ROUND(SUM(amount), 2) AS amount
+                     FROM payment_daily_rollup
+                     WHERE status = 'completed' AND day >= ? AND day <= ?
+                     GROUP BY payment_method ORDER BY amount DESC;''', _range(date_from, date_to))
+    total = sum(row['amount'] for row in rows)
+    for row in rows:
+        row['share'] = round(row['amount'] / total, 4) if total else None
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh the admin analytics rollups.")
+    parser.add_argument('--full', action='store_true', help="Rebuild the rollups from scratch")
+    args = parser.parse_args(argv)
+
+    db.migrate()
+    started = time.perf_counter()
+    with db.get_connection() as conn:
+        watermarks = refresh(conn, full=args.full)
+    print(f"Rollups refreshed in {time.perf_counter() - started:.2f}s (watermarks: {watermarks})")
+
+
+if __name__ == "__main__":
+    main()
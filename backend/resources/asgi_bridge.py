@@ -0,0 +1,187 @@
+import os
+import sys
+import tempfile
+import threading
+
+from resources import async_db
+
+# --- ASGI Bridge ---
+#
+# Serves the Flask app (and its whole URL map) from an ASGI server. The event
+# loop owns the sockets: reading a request body, waiting on a slow client and
+# idle keep-alive connections cost no thread. Only the handler itself runs on
+# the database executor (resources/async_db.py), so the number of threads is
+# bounded by DB_EXECUTOR_WORKERS however many connections are open. Streamed
+# responses (exports) are pulled one chunk per executor call and the thread is
+# free again while the chunk is being sent.
+#
+# What this does not do is overlap work inside a request: the whole WSGI
+# handler, with all its queries, runs on one executor thread, so handler
+# throughput is that of a threaded server with DB_EXECUTOR_WORKERS threads.
+# The gain is in connection handling, not in request concurrency; the
+# handlers would have to become coroutines awaiting async_db.run() for that.
+#
+# The ASGI lifespan runs the on_startup / on_shutdown hooks; on shutdown the
+# server first stops accepting and lets in-flight requests finish, then the
+# hooks run and the executor is drained.
+
+# Request bodies larger than this are spooled to a temporary file (bytes)
+ASGI_BODY_SPOOL = int(os.environ.get("ASGI_BODY_SPOOL", str(1024 * 1024)))
+
+
+class AsgiBridge:
+    """An ASGI application that runs a WSGI app on the database executor."""
+
+    def __init__(self, wsgi_app, on_startup=None, on_shutdown=None):
+        self.wsgi_app = wsgi_app
+        self.on_startup = on_startup
+        self.on_shutdown = on_shutdown
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'in_flight': 0, 'disconnects': 0}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        elif scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'websocket':
+            await send({'type': 'websocket.close', 'code': 1000})
+
+    def metrics(self):
+        with self._lock:
+            return dict(self._stats)
+
+    # --- Lifespan ---
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    if self.on_startup:
+                        await async_db.run(self.on_startup)
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                try:
+                    if self.on_shutdown:
+                        await async_db.run(self.on_shutdown)
+                finally:
+                    async_db.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # --- Requests ---
+
+    async def _http(self, scope, receive, send):
+        body = tempfile.SpooledTemporaryFile(max_size=ASGI_BODY_SPOOL)
+        with self._lock:
+            self._stats['requests'] += 1
+            self._stats['in_flight'] += 1
+        try:
+            more = True
+            while more:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    self._count('disconnects')
+                    return
+                body.write(message.get('body', b''))
+                more = message.get('more_body', False)
+            length = body.tell()
+            body.seek(0)
+            environ = self._environ(scope, body, length)
+            status, headers, result, chunks, rest = await async_db.run(self._start, environ)
+            try:
+                await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+                for chunk in chunks:
+                    if chunk:
+                        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                # A streamed response: one executor round trip per further chunk
+                while rest is not None:
+                    chunk = await async_db.run(next, rest, None)
+                    if chunk is None:
+                        break
+                    if chunk:
+                        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                await send({'type': 'http.response.body', 'body': b''})
+            finally:
+                if hasattr(result, 'close'):
+                    await async_db.run(result.close)
+        finally:
+            body.close()
+            with self._lock:
+                self._stats['in_flight'] -= 1
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _start(self, environ):
+        """Call the WSGI app up to its first body chunk (runs on the executor).
+
+        Returns the status, headers, the app's iterable (to close), the chunks
+        read so far and the iterator still to drain (None when complete).
+        """
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                   for name, value in headers]
+            return written.append
+
+        written = []
+        result = self.wsgi_app(environ, start_response)
+        if isinstance(result, (list, tuple)):
+            return response['status'], response['headers'], result, written + list(result), None
+        rest = iter(result)
+        first = next(rest, None)
+        chunks = written + ([first] if first is not None else [])
+        # start_response may only have been called on the first chunk
+        length = dict(response['headers']).get(b'content-length')
+        if first is None or (length is not None and sum(map(len, chunks)) >= int(length)):
+            rest = None
+        return response['status'], response['headers'], result, chunks, rest
+
+    @staticmethod
+    def _environ(scope, body, length):
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        path = scope.get('raw_path') or scope['path'].encode('utf-8')
+        root_path = scope.get('root_path', '').encode('utf-8')
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': root_path.decode('latin-1'),
+            'PATH_INFO': path.split(b'?', 1)[0].decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': str(server[0]),
+            'SERVER_PORT': str(server[1] or 80),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'CONTENT_LENGTH': str(length),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name == 'CONTENT_LENGTH':
+                continue
+            if name != 'CONTENT_TYPE':
+                name = f'HTTP_{name}'
+            if name in environ:
+                value = f"{environ[name]}{'; ' if name == 'HTTP_COOKIE' else ','}{value}"
+            environ[name] = value
+        return environ
@@ -0,0 +1,51 @@
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from resources import database as db
+
+# --- Async Database Access ---
+#
+# The database layer is synchronous (sqlite3 / psycopg behind the connection
+# pool). Async code awaits it through run(), which executes the call on a
+# bounded thread pool: at most DB_EXECUTOR_WORKERS calls hold a thread at
+# once, and everything else waits on the event loop, where a waiting request
+# costs a coroutine rather than a thread. The ASGI bridge uses this executor
+# to run whole (synchronous) Flask requests; the per-call run() only helps
+# code that is itself async.
+#
+#     user = await async_db.run(db.get_user_by_id, 1)
+
+# Threads running database work; 0 sizes it from the connection pool. Handlers
+# also hash, encode and compress outside the database, hence twice the pool.
+DB_EXECUTOR_WORKERS = int(os.environ.get("DB_EXECUTOR_WORKERS", "0"))
+
+_executor = None
+_lock = threading.Lock()
+
+
+def executor():
+    """The shared executor, created on first use."""
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS or 2 * db.POOL_SIZE,
+                                           thread_name_prefix="db-executor")
+        return _executor
+
+
+async def run(func, *args, **kwargs):
+    """Await func(*args, **kwargs) run on the database executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor(), functools.partial(func, *args, **kwargs))
+
+
+def shutdown(wait=True):
+    """Stop taking new calls and (by default) wait for the ones in flight."""
+    global _executor
+    with _lock:
+        pending, _executor = _executor, None
+    if pending is not None:
+        pending.shutdown(wait=wait)
@@ -0,0 +1,70 @@
+import argparse
+import sys
+
+from resources import database as db
+from resources import migrations
+
+# --- Balance Summary Maintenance ---
+#
+# Triggers keep user_balances / user_utility_balances in step with bills and
+# payments. This module recomputes them from scratch, e.g. after a bulk load
+# that ran with the triggers dropped, or to check for drift:
+#
+#     python -m resources.balances            # rebuild
+#     python -m resources.balances --check    # report users whose summary is off
+
+DRIFT_SQL = '''
+    WITH fresh AS (
+        SELECT user_id, COUNT(*) AS bill_count,
+               COUNT(CASE WHEN status = 'pending' THEN 1 END) AS pending_count,
+               ROUND(COALESCE(SUM(CASE WHEN status = 'pending' THEN amount END), 0), 2) AS pending_total,
+               ROUND(COALESCE(SUM(CASE WHEN status = 'paid' THEN amount END), 0), 2) AS paid_total
+        FROM bills GROUP BY user_id
+    )
+    SELECT f.user_id, f.bill_count, f.pending_count, f.pending_total, f.paid_total,
+           ub.bill_count, ub.pending_count, ub.pending_total, ub.paid_total
+    FROM fresh f LEFT JOIN user_balances ub ON ub.user_id = f.user_id
+    WHERE ub.user_id IS NULL
+       OR ub.bill_count != f.bill_count OR ub.pending_count != f.pending_count
+       OR ABS(ub.pending_total - f.pending_total) > 0.005 OR ABS(ub.paid_total - f.paid_total) > 0.005
+    LIMIT ?;'''
+
+
+def rebuild(conn):
+    """Recompute every balance row from bills and payments. Returns the number of users summarized."""
+    conn.execute("BEGIN IMMEDIATE;")
+    try:
+        for statement in migrations.REBUILD_BALANCES:
+            conn.execute(statement)
+        db.bump_versions(conn.cursor(), 'balances')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return conn.execute("SELECT COUNT(*) FROM user_balances;").fetchone()[0]
+
+
+def check(conn, limit=20):
+    """Return up to limit (user_id, fresh totals, stored totals) rows that disagree."""
+    return [tuple(row) for row in conn.execute(DRIFT_SQL, (limit,)).fetchall()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild or check the per-user balance summaries.")
+    parser.add_argument('--check', action='store_true', help="Only report users whose stored balance is off")
+    args = parser.parse_args(argv)
+
+    db.migrate()
+    with db.get_connection() as conn:
+        if args.check:
+            drift = check(conn)
+            for row in drift:
+                print(f"user {row[0]}: bills say {row[1:5]}, summary says {row[5:]}")
+            print(f"{len(drift)} user(s) out of step")
+            return 1 if drift else 0
+        print(f"Rebuilt balances for {rebuild(conn)} users")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,295 @@
+import argparse
+import multiprocessing
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+from resources import database as db
+from resources import engines
+
+try:
+    import numpy as np
+except ImportError:  # optional: vectorized amount computation
+    np = None
+
+# --- Monthly Billing Cycle ---
+#
+#     python -m resources.billing 2026-10 [--workers 4] [--partition-size 10000]
+#
+# Issues one bill per (user, utility with a tariff) for a billing period:
+#
+#     amount = (fixed_charge + units * unit_rate) * (1 + tax_rate)
+#
+# with units taken from the consumption table (0 when there is no reading).
+# Users are split into user_id ranges (partitions); each partition computes
+# its amounts in one vectorized pass and writes its bills, their reminders,
+# the version bumps and its own "done" checkpoint in a single transaction.
+# A crashed or interrupted run is resumed by running the same period again:
+# finished partitions are skipped and the unique (billing_period, user_id,
+# utility_id) index makes a half-written partition impossible to double-bill.
+# Partitions run in a process pool; SQLite serializes the writes.
+
+BILLING_PARTITION_SIZE = int(os.environ.get("BILLING_PARTITION_SIZE", "10000"))
+BILLING_WORKERS = int(os.environ.get("BILLING_WORKERS", str(min(4, os.cpu_count() or 1))))
+BILL_DUE_DAY = int(os.environ.get("BILL_DUE_DAY", "15"))
+REMINDER_DAYS_BEFORE = int(os.environ.get("REMINDER_DAYS_BEFORE", "3"))
+
+PERIOD_PATTERN = re.compile(r'^\d{4}-(0[1-9]|1[0-2])$')
+
+PARTITION_SQL = '''
+    SELECT u.user_id, t.utility_id, COALESCE(c.units, 0)
+    FROM users u
+    CROSS JOIN tariffs t
+    LEFT JOIN consumption c ON c.period = ? AND c.user_id = u.user_id AND c.utility_id = t.utility_id
+    WHERE u.role = 'user' AND u.user_id BETWEEN ? AND ?
+'''
+
+
+class BillingError(Exception):
+    """Raised for an invalid billing request (bad period, bad worker count, no tariffs)."""
+
+
+def cycle_dates(period):
+    """Return (due_date, reminder_date) for a 'YYYY-MM' billing period."""
+    if not PERIOD_PATTERN.match(period or ''):
+        raise BillingError("period must be YYYY-MM.")
+    year, month = map(int, period.split('-'))
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    due = next_month + timedelta(days=BILL_DUE_DAY - 1)
+    return due.isoformat(), (due - timedelta(days=REMINDER_DAYS_BEFORE)).isoformat()
+
+
+def compute_amounts(units, utility_ids, tariffs):
+    """Bill amounts for parallel lists of units and utility ids.
+
+    tariffs maps utility_id -> (fixed_charge, unit_rate, tax_rate). Uses NumPy
+    over the whole partition when it is installed, a plain loop otherwise.
+    """
+    if np is not None:
+        ids = sorted(tariffs)
+        lookup = np.searchsorted(np.array(ids), np.array(utility_ids))
+        fixed, rate, tax = (np.array([tariffs[i][k] for i in ids], dtype=float) for k in range(3))
+        amounts = (fixed[lookup] + np.array(units, dtype=float) * rate[lookup]) * (1 + tax[lookup])
+        return np.round(amounts, 2).tolist()
+    return [round((tariffs[u][0] + n * tariffs[u][1]) * (1 + tariffs[u][2]), 2)
+            for n, u in zip(units, utility_ids)]
+
+
+def _connect(db_path):
+    conn = engines.get_engine(db_path).connect(db_path, db.DB_PROFILE)
+    conn.row_factory = None
+    return conn
+
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def bill_partition(db_path, run_id, period, first_user_id, last_user_id):
+    """Bill one user_id range. Returns (bills_created, reminders_created).
+
+    Runs in a pool worker process, so it opens its own connection.
+    """
+    due_date, reminder_date = cycle_dates(period)
+    conn = _connect(db_path)
+    try:
+        row = conn.execute("SELECT status FROM billing_run_partitions WHERE run_id = ? AND first_user_id = ?;",
+                           (run_id, first_user_id)).fetchone()
+        if row and row[0] == 'done':
+            return 0, 0
+
+        tariffs = {r[0]: (r[1], r[2], r[3]) for r in conn.execute(
+            "SELECT utility_id, fixed_charge, unit_rate, tax_rate FROM tariffs;")}
+        pairs = conn.execute(PARTITION_SQL, (period, first_user_id, last_user_id)).fetchall()
+        amounts = compute_amounts([p[2] for p in pairs], [p[1] for p in pairs], tariffs) if pairs else []
+        now = _now()
+
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE;")
+        try:
+            # Another worker may have finished this partition while we computed
+            cursor.execute("SELECT status FROM billing_run_partitions WHERE run_id = ? AND first_user_id = ?;",
+                           (run_id, first_user_id))
+            if cursor.fetchone()[0] == 'done':
+                conn.rollback()
+                return 0, 0
+            # New bill ids are above the current maximum while we hold the write lock
+            cursor.execute("SELECT COALESCE(MAX(bill_id), 0) FROM bills;")
+            last_bill_id = cursor.fetchone()[0]
+            cursor.executemany('''INSERT OR IGNORE INTO bills (user_id, utility_id, amount, due_date, status, created_at, billing_period)
+                                  VALUES (?, ?, ?, ?, 'pending', ?, ?);''',
+                               [(p[0], p[1], amount, due_date, now, period) for p, amount in zip(pairs, amounts)])
+            bills_created = cursor.rowcount if pairs else 0
+            cursor.execute('''INSERT INTO reminders (user_id, bill_id, message, reminder_date, created_at)
+                              SELECT b.user_id, b.bill_id,
+                                     util.name || ' bill of Rs. ' || printf('%.2f', b.amount) || ' due on ' || b.due_date,
+                                     ?, ?
+                              FROM bills b JOIN utilities util ON b.utility_id = util.utility_id
+                              WHERE b.bill_id > ? AND b.billing_period = ?;''',
+                           (reminder_date, now, last_bill_id, period))
+            reminders_created = cursor.rowcount
+            if bills_created:
+                cursor.execute("SELECT DISTINCT user_id FROM bills WHERE bill_id > ?;", (last_bill_id,))
+                users = [r[0] for r in cursor.fetchall()]
+                db.bump_versions(cursor, 'bills', *[db.user_scope(u, kind) for u in users for kind in ('bills', 'reminders')])
+            cursor.execute('''UPDATE billing_run_partitions SET status = 'done', bills_created = ?, reminders_created = ?,
+                                     updated_at = ? WHERE run_id = ? AND first_user_id = ?;''',
+                           (bills_created, reminders_created, now, run_id, first_user_id))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return bills_created, reminders_created
+    finally:
+        conn.close()
+
+
+def prepare_run(conn, period, partition_size=None):
+    """Create the run and its partitions for a period, or return the existing run_id."""
+    due_date, _ = cycle_dates(period)
+    if conn.execute("SELECT COUNT(*) FROM tariffs;").fetchone()[0] == 0:
+        raise BillingError("No tariffs configured; nothing to bill.")
+    size = partition_size or BILLING_PARTITION_SIZE
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE;")
+    try:
+        now = _now()
+        cursor.execute("SELECT run_id FROM billing_runs WHERE period = ?;", (period,))
+        row = cursor.fetchone()
+        if row:
+            run_id = row[0]
+            cursor.execute("UPDATE billing_runs SET status = 'running', error = NULL WHERE run_id = ?;", (run_id,))
+        else:
+            cursor.execute("INSERT INTO billing_runs (period, status, due_date, started_at) VALUES (?, 'running', ?, ?);",
+                           (period, due_date, now))
+            run_id = cursor.lastrowid
+
+        # Partitions cover every user_id up to the current maximum; a resumed
+        # run also picks up users registered since it started
+        cursor.execute("SELECT MAX(last_user_id) FROM billing_run_partitions WHERE run_id = ?;", (run_id,))
+        covered = cursor.fetchone()[0]
+        cursor.execute("SELECT MIN(user_id), MAX(user_id) FROM users;")
+        low, high = cursor.fetchone()
+        if low is not None:
+            low = low if covered is None else covered + 1
+            ranges = [(lo, min(lo + size - 1, high)) for lo in range(low, high + 1, size)]
+            cursor.executemany('''INSERT INTO billing_run_partitions (run_id, first_user_id, last_user_id, updated_at)
+                                  VALUES (?, ?, ?, ?);''', [(run_id, lo, hi, now) for lo, hi in ranges])
+        cursor.execute('''UPDATE billing_runs SET partitions = (SELECT COUNT(*) FROM billing_run_partitions WHERE run_id = ?)
+                          WHERE run_id = ?;''', (run_id, run_id))
+        conn.commit()
+        return run_id
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def _finish_run(conn, run_id, error=None):
+    totals = conn.execute('''SELECT COALESCE(SUM(bills_created), 0), COALESCE(SUM(reminders_created), 0),
+                                    COUNT(CASE WHEN status != 'done' THEN 1 END) FROM billing_run_partitions WHERE run_id = ?;''',
+                          (run_id,)).fetchone()
+    status = 'failed' if error or totals[2] else 'completed'
+    conn.execute('''UPDATE billing_runs SET status = ?, bills_created = ?, reminders_created = ?, error = ?,
+                           finished_at = ? WHERE run_id = ?;''',
+                 (status, totals[0], totals[1], error, _now(), run_id))
+    conn.commit()
+
+
+def run_billing(period, workers=None, partition_size=None, db_path=None):
+    """Run (or resume) the billing cycle for a period and return the run summary."""
+    db_path = db_path or db.DATABASE
+    db_path = engines.get_engine(db_path).locate(db_path)
+    workers = BILLING_WORKERS if workers is None else workers
+    conn = _connect(db_path)
+    try:
+        run_id = prepare_run(conn, period, partition_size)
+        pending = conn.execute('''SELECT first_user_id, last_user_id FROM billing_run_partitions
+                                  WHERE run_id = ? AND status != 'done' ORDER BY first_user_id;''', (run_id,)).fetchall()
+        error = None
+        try:
+            if workers > 1 and len(pending) > 1:
+                # spawn: forking a multi-threaded server process is not safe
+                with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                    futures = [pool.submit(bill_partition, db_path, run_id, period, lo, hi) for lo, hi in pending]
+                    for future in futures:
+                        future.result()
+            else:
+                for lo, hi in pending:
+                    bill_partition(db_path, run_id, period, lo, hi)
+        except Exception as e:
+            error = str(e)
+            print(f"Error during billing run {run_id}: {e}")
+        _finish_run(conn, run_id, error)
+    finally:
+        conn.close()
+    return get_billing_run(run_id)
+
+
+def check_workers(workers):
+    """Validate a requested worker count: a positive int no larger than the CPU count."""
+    if workers is None:
+        return None
+    limit = os.cpu_count() or 1
+    if isinstance(workers, bool) or not isinstance(workers, int) or not 1 <= workers <= limit:
+        raise BillingError(f"workers must be an integer from 1 to {limit}.")
+    return workers
+
+
+def start_billing_run(period, workers=None):
+    """Validate the period and worker count, then run the cycle on a background thread. Returns the run_id."""
+    cycle_dates(period)
+    check_workers(workers)
+    with db.get_connection() as conn:
+        run_id = prepare_run(conn, period)
+    threading.Thread(target=run_billing, args=(period, workers), name=f"billing-{period}", daemon=True).start()
+    return run_id
+
+
+def get_billing_run(run_id):
+    """Retrieve a billing run with its partition progress."""
+    try:
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM billing_runs WHERE run_id = ?;", (run_id,))
+            run = cursor.fetchone()
+            if run is None:
+                return None
+            cursor.execute('''SELECT COUNT(*) AS partitions, COUNT(CASE WHEN status = 'done' THEN 1 END) AS done
+                              FROM billing_run_partitions WHERE run_id = ?;''', (run_id,))
+            progress = cursor.fetchone()
+            result = dict(run)
+            result['partitions_done'] = progress['done']
+            return result
+    except sqlite3.Error as e:
+        print(f"Error while fetching billing run: {e}")
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Issue the bills (and reminders) for a billing period.")
+    parser.add_argument('period', help="Billing period, YYYY-MM")
+    parser.add_argument('--workers', type=int, default=BILLING_WORKERS)
+    parser.add_argument('--partition-size', type=int, default=BILLING_PARTITION_SIZE)
+    parser.add_argument('--database', help="SQLite file or postgresql:// URL (default: the application database)")
+    args = parser.parse_args(argv)
+
+    if args.database:
+        db.use_database(args.database)
+    db.migrate()
+    started = datetime.now()
+    try:
+        run = run_billing(args.period, args.workers, args.partition_size)
+    except BillingError as e:
+        parser.error(str(e))
+    elapsed = (datetime.now() - started).total_seconds()
+    print(f"Billing run {run['run_id']} for {run['period']}: {run['status']}, {run['bills_created']} bills, "
+          f"{run['reminders_created']} reminders, {run['partitions_done']}/{run['partitions']} partitions in {elapsed:.1f}s")
+    if run['error']:
+        print(f"Error: {run['error']}")
+
+
+if __name__ == "__main__":
+    main()
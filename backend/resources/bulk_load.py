@@ -0,0 +1,425 @@
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import sqlite3
+import time
+from datetime import date, datetime
+
+from resources import analytics
+from resources import balances
+from resources import cache
+from resources import database as db
+from resources import hashing
+from resources import migrations
+from resources.serialization import orjson
+
+# --- Bulk Import ---
+#
+#     python -m resources.bulk_load --users users.csv --bills bills.ndjson [--workers 8]
+#
+# Loads users / utilities / tariffs / consumption / bills / payments from CSV
+# or NDJSON files (one object per line, same field names as the CSV header).
+# Rows are inserted with executemany in one transaction per batch instead of
+# one connection and commit per row. Secondary indexes are dropped for the
+# load and rebuilt once at the end. PAN and Aadhaar are validated a whole
+# batch column at a time. Passwords are either supplied as precomputed bcrypt
+# hashes (password_hash) or hashed in parallel across every CPU. The same
+# loader backs POST /api/admin/import/<kind>.
+
+BULK_BATCH_SIZE = int(os.environ.get("BULK_BATCH_SIZE", "50000"))
+MAX_REPORTED_ERRORS = 20
+
+TABLES = {
+    'users': {
+        'columns': ['user_id', 'username', 'password_hash', 'email', 'phone_number', 'pan', 'aadhaar', 'role', 'created_at'],
+        'id': 'user_id',
+        'required': ['username', 'email', 'phone_number'],
+        'defaults': {'role': 'user'},
+        'types': {'user_id': int},
+    },
+    'utilities': {
+        'columns': ['utility_id', 'name', 'description', 'provider_name', 'created_at'],
+        'id': 'utility_id',
+        'required': ['name'],
+        'defaults': {},
+        'types': {'utility_id': int},
+    },
+    'bills': {
+        'columns': ['bill_id', 'user_id', 'utility_id', 'amount', 'due_date', 'status', 'created_at'],
+        'id': 'bill_id',
+        'required': ['user_id', 'utility_id', 'amount', 'due_date'],
+        'defaults': {'status': 'pending'},
+        'types': {'bill_id': int, 'user_id': int, 'utility_id': int, 'amount': float},
+        'dates': ['due_date'],
+    },
+    'tariffs': {
+        'columns': ['utility_id', 'fixed_charge', 'unit_rate', 'tax_rate', 'updated_at'],
+        'required': ['utility_id', 'unit_rate'],
+        'defaults': {'fixed_charge': 0.0, 'tax_rate': 0.0},
+        'types': {'utility_id': int, 'fixed_charge': float, 'unit_rate': float, 'tax_rate': float},
+    },
+    'consumption': {
+        'columns': ['period', 'user_id', 'utility_id', 'units', 'recorded_at'],
+        'required': ['period', 'user_id', 'utility_id', 'units'],
+        'defaults': {},
+        'types': {'user_id': int, 'utility_id': int, 'units': float},
+        'periods': ['period'],
+    },
+    'payments': {
+        'columns': ['payment_id', 'bill_id', 'user_id', 'amount', 'payment_method', 'status', 'transaction_date'],
+        'id': 'payment_id',
+        'required': ['bill_id', 'user_id', 'amount', 'payment_method'],
+        'defaults': {'status': 'completed'},
+        'types': {'payment_id': int, 'bill_id': int, 'user_id': int, 'amount': float},
+    },
+}
+
+LOAD_ORDER = ['users', 'utilities', 'tariffs', 'consumption', 'bills', 'payments']
+
+FORMATS = ('csv', 'ndjson')
+
+DATE_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+PERIOD_PATTERN = re.compile(r'^\d{4}-(0[1-9]|1[0-2])$')
+
+# Filled with the load time when the input leaves them out
+TIMESTAMP_COLUMNS = ('created_at', 'transaction_date', 'updated_at', 'recorded_at')
+
+_loads = orjson.loads if orjson is not None else json.loads
+
+
+# --- Reading ---
+
+def detect_format(name):
+    """Pick csv or ndjson from a file name or content type."""
+    name = (name or '').lower()
+    if 'ndjson' in name or name.endswith('.jsonl') or name.endswith('.json'):
+        return 'ndjson'
+    if 'csv' in name:
+        return 'csv'
+    return None
+
+
+def read_records(stream, fmt):
+    """Yield (line_number, record_dict) from a text stream of CSV or NDJSON."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            # Empty CSV cells mean "not given"
+            yield reader.line_num, {k: (v if v != '' else None) for k, v in record.items()}
+    elif fmt == 'ndjson':
+        for line_no, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = _loads(line)
+            except ValueError:
+                yield line_no, None
+                continue
+            yield line_no, record if isinstance(record, dict) else None
+    else:
+        raise ValueError(f"Unknown format '{fmt}'. Use one of: {', '.join(FORMATS)}")
+
+
+def _batches(records, size):
+    batch = []
+    for item in records:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# --- Validation ---
+
+def _coerce(spec, record, now):
+    """Turn one input record into a row (list of values in column order), or raise ValueError."""
+    if record is None:
+        raise ValueError("not a JSON object")
+    missing = [c for c in spec['required'] if record.get(c) in (None, '')]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    values = []
+    for column in spec['columns']:
+        value = record.get(column)
+        if value is None:
+            value = spec['defaults'].get(column)
+        if value is None and column in TIMESTAMP_COLUMNS:
+            value = now
+        if value is not None and column in spec['types']:
+            try:
+                value = spec['types'][column](value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{column} must be a number")
+        values.append(value)
+    for column in spec.get('dates', []):
+        if not _is_date(record[column]):
+            raise ValueError(f"{column} must be a date (YYYY-MM-DD)")
+    for column in spec.get('periods', []):
+        if not PERIOD_PATTERN.match(str(record[column])):
+            raise ValueError(f"{column} must be a billing period (YYYY-MM)")
+    return values
+
+
+def _is_date(value):
+    # strptime is by far the slowest step of a load; match the shape, then let fromisoformat check the calendar
+    if not isinstance(value, str) or not DATE_PATTERN.match(value):
+        return False
+    try:
+        date.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _validate_identity_columns(spec, rows):
+    """Check the PAN and Aadhaar columns of a users batch; return {row_index: reason}."""
+    pan_at = spec['columns'].index('pan')
+    aadhaar_at = spec['columns'].index('aadhaar')
+    pans = [row[pan_at] for row in rows]
+    aadhaars = [row[aadhaar_at] for row in rows]
+    # Both are optional; only given values are matched
+    pan_ok = [p is None or db.PAN_PATTERN.match(str(p)) is not None for p in pans]
+    aadhaar_ok = [a is None or db.AADHAAR_PATTERN.match(str(a)) is not None for a in aadhaars]
+    bad = {}
+    for i, (p, a) in enumerate(zip(pan_ok, aadhaar_ok)):
+        if not p:
+            bad[i] = "Invalid PAN format."
+        elif not a:
+            bad[i] = "Invalid Aadhaar format."
+    return bad
+
+
+def _resolve_passwords(spec, rows, records, allow_plaintext, executor):
+    """Fill password_hash for every users row; return {row_index: reason} for rows that cannot be."""
+    hash_at = spec['columns'].index('password_hash')
+    bad, plaintext = {}, []
+    for i, (row, record) in enumerate(zip(rows, records)):
+        stored = row[hash_at]
+        if stored:
+            if hashing.get_cost(stored) is None:
+                bad[i] = "password_hash is not a bcrypt hash"
+        elif record.get('password'):
+            if allow_plaintext:
+                plaintext.append(i)
+            else:
+                bad[i] = "password_hash is required (plaintext passwords are only hashed by the CLI)"
+        else:
+            bad[i] = "missing password or password_hash"
+    if plaintext:
+        hashes = hashing.hash_passwords([str(records[i]['password']) for i in plaintext], executor=executor)
+        for i, hashed in zip(plaintext, hashes):
+            rows[i][hash_at] = hashed
+    return bad
+
+
+# --- Writing ---
+
+def _insert_sql(table, columns, skip_duplicates):
+    verb = "INSERT OR IGNORE" if skip_duplicates else "INSERT"
+    return f"{verb} INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))});"
+
+
+def _changed_scopes(table, columns, rows):
+    """Data version scopes touched by a batch (see database.bump_versions)."""
+    if table == 'utilities':
+        return ['utilities']
+    if table in ('users', 'tariffs', 'consumption'):
+        return []  # no cached responses depend on these rows yet
+    user_at = columns.index('user_id')
+    return [table] + [db.user_scope(uid, table) for uid in {row[user_at] for row in rows}]
+
+
+def _write_rows(conn, table, spec, rows, skip_duplicates):
+    """Insert a batch. Returns (inserted, {row_index: reason}).
+
+    Rows without an id leave the id column out, so the database assigns one
+    (only SQLite turns an explicit NULL key into a new id).
+    """
+    columns = spec['columns']
+    if 'id' not in spec:
+        return _write_batch(conn, table, columns, _insert_sql(table, columns, skip_duplicates), rows)
+    id_at = columns.index(spec['id'])
+    inserted, bad = 0, {}
+    for with_id in (True, False):
+        index = [i for i, row in enumerate(rows) if (row[id_at] is not None) == with_id]
+        if not index:
+            continue
+        keep = [c for c, column in enumerate(columns) if with_id or c != id_at]
+        subset = [[rows[i][c] for c in keep] for i in index]
+        subset_columns = [columns[c] for c in keep]
+        count, subset_bad = _write_batch(conn, table, subset_columns,
+                                         _insert_sql(table, subset_columns, skip_duplicates), subset)
+        inserted += count
+        bad.update((index[i], reason) for i, reason in subset_bad.items())
+    return inserted, bad
+
+
+def _write_batch(conn, table, columns, sql, rows):
+    """Insert a batch in one transaction. Returns (inserted, {row_index: reason})."""
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE;")
+    try:
+        cursor.execute("SAVEPOINT batch;")
+        try:
+            cursor.executemany(sql, rows)
+            inserted = cursor.rowcount
+            cursor.execute("RELEASE batch;")
+            bad = {}
+        except sqlite3.IntegrityError:
+            # Isolate the offending rows instead of failing the whole batch
+            cursor.execute("ROLLBACK TO batch;")
+            cursor.execute("RELEASE batch;")
+            inserted, bad = 0, {}
+            for i, row in enumerate(rows):
+                try:
+                    cursor.execute(sql, row)
+                    inserted += cursor.rowcount
+                except sqlite3.IntegrityError as e:
+                    bad[i] = str(e)
+        db.bump_versions(cursor, *_changed_scopes(table, columns, rows))
+        conn.commit()
+        return inserted, bad
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def _rebuild_indexes(conn, statements):
+    for sql in statements:
+        conn.execute(sql)
+    conn.commit()
+
+
+def load(conn, table, records, batch_size=None, defer_indexes=False, skip_duplicates=False,
+         allow_plaintext=False, executor=None):
+    """Load (line_number, record) pairs into a table and return a report dict."""
+    if table not in TABLES:
+        raise ValueError(f"Unknown table '{table}'. Use one of: {', '.join(LOAD_ORDER)}")
+    spec = TABLES[table]
+    report = {'table': table, 'read': 0, 'inserted': 0, 'rejected': 0, 'errors': []}
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    started = time.perf_counter()
+
+    def reject(line_no, reason):
+        report['rejected'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'line': line_no, 'error': reason})
+
+    index_sql = db.engine.drop_secondary_objects(conn, table) if defer_indexes else []
+    try:
+        for batch in _batches(records, batch_size or BULK_BATCH_SIZE):
+            report['read'] += len(batch)
+            lines, rows, raw = [], [], []
+            for line_no, record in batch:
+                try:
+                    rows.append(_coerce(spec, record, now))
+                except ValueError as e:
+                    reject(line_no, str(e))
+                    continue
+                lines.append(line_no)
+                raw.append(record)
+
+            if table == 'users' and rows:
+                bad = _validate_identity_columns(spec, rows)
+                bad.update(_resolve_passwords(spec, rows, raw, allow_plaintext, executor))
+                if bad:
+                    for i in sorted(bad):
+                        reject(lines[i], bad[i])
+                    keep = [i for i in range(len(rows)) if i not in bad]
+                    rows, lines = [rows[i] for i in keep], [lines[i] for i in keep]
+            if not rows:
+                continue
+
+            inserted, bad = _write_rows(conn, table, spec, rows, skip_duplicates)
+            report['inserted'] += inserted
+            for i in sorted(bad):
+                reject(lines[i], bad[i])
+    finally:
+        if 'id' in spec:
+            db.engine.sync_ids(conn, table)
+        if index_sql:
+            _rebuild_indexes(conn, index_sql)
+            if table in ('bills', 'payments'):
+                # The balance and rollup triggers were off for the load: recompute once
+                balances.rebuild(conn)
+                analytics.invalidate(conn)
+
+    if table == 'utilities':
+        cache.invalidate_namespace('utilities')
+        cache.invalidate_namespace('utility')
+    elapsed = time.perf_counter() - started
+    report['seconds'] = round(elapsed, 3)
+    report['rows_per_sec'] = round(report['inserted'] / elapsed, 1) if elapsed > 0 else 0.0
+    return report
+
+
+def load_stream(conn, table, stream, fmt, **options):
+    """Load a text stream in the given format (csv or ndjson)."""
+    return load(conn, table, read_records(stream, fmt), **options)
+
+
+def open_bulk_connection(path=None):
+    """A dedicated connection with the bulk-load storage profile (not from the request pool)."""
+    if path:
+        db.use_database(path)
+    conn = db.engine.connect(db.DATABASE, 'bulk-load')
+    conn.row_factory = None
+    db.engine.prepare(conn)
+    migrations.migrate(conn)
+    return conn
+
+
+def print_report(report):
+    print(f"{report['table']:<10} read {report['read']:>10}  inserted {report['inserted']:>10}  "
+          f"rejected {report['rejected']:>8}  {report['seconds']:>8.2f}s  {report['rows_per_sec']:>10.0f} rows/s")
+    for error in report['errors']:
+        print(f"    line {error['line']}: {error['error']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import users, utilities, tariffs, consumption, bills and payments.")
+    for table in LOAD_ORDER:
+        parser.add_argument(f"--{table}", metavar='FILE', help=f"CSV or NDJSON file of {table}")
+    parser.add_argument('--format', choices=FORMATS, help="Input format (default: from the file extension)")
+    parser.add_argument('--database', help="SQLite file or postgresql:// URL to load into (default: the application database)")
+    parser.add_argument('--batch-size', type=int, default=BULK_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, help="Processes for hashing plaintext passwords (default: all CPUs)")
+    parser.add_argument('--skip-duplicates', action='store_true', help="Ignore rows that hit a UNIQUE constraint")
+    parser.add_argument('--keep-indexes', action='store_true', help="Do not drop secondary indexes during the load")
+    args = parser.parse_args(argv)
+
+    jobs = [(table, getattr(args, table)) for table in LOAD_ORDER if getattr(args, table)]
+    if not jobs:
+        parser.error("give at least one of " + ', '.join(f"--{t}" for t in LOAD_ORDER))
+
+    conn = open_bulk_connection(args.database)
+    executor = hashing.new_bulk_executor(args.workers) if args.users else None
+    total_rows, started = 0, time.perf_counter()
+    try:
+        for table, path in jobs:
+            fmt = args.format or detect_format(path)
+            if fmt is None:
+                parser.error(f"cannot tell the format of {path}; pass --format")
+            with io.open(path, newline='', encoding='utf-8') as stream:
+                report = load_stream(conn, table, stream, fmt, batch_size=args.batch_size,
+                                     defer_indexes=not args.keep_indexes, skip_duplicates=args.skip_duplicates,
+                                     allow_plaintext=True, executor=executor)
+            print_report(report)
+            total_rows += report['inserted']
+        db.engine.optimize(conn)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        conn.close()
+    elapsed = time.perf_counter() - started
+    print(f"Loaded {total_rows} rows in {elapsed:.1f}s ({total_rows / elapsed if elapsed else 0:.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+import copy
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from resources.engines import Row
+from resources.pool import ConnectionPool
+
+# --- Read-Through Cache ---
+#
+# Small, hot lookups (utilities catalog, user profiles) are cached in front of
+# the database functions with @cached(namespace, ttl). Writers call
+# invalidate(namespace, *args) / invalidate_namespace(namespace).
+#
+# CACHE_BACKEND=memory (default) keeps entries in a per-process LRU.
+# CACHE_BACKEND=shared stores them in a separate SQLite file (CACHE_DATABASE)
+# that every worker process reads and invalidates, standing in for Redis, so
+# a write handled by one worker is seen by all of them.
+#
+# Writers invalidate after they commit, so a reader that missed and read the
+# old row just before the commit could store it after the invalidation. Every
+# invalidation therefore bumps its namespace's generation, and a miss only
+# stores its result if the generation it saw before reading the database is
+# still current.
+
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory")
+CACHE_DATABASE = os.environ.get("CACHE_DATABASE", "cache.db")
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", "10000"))
+CACHE_ENABLED = os.environ.get("CACHE_ENABLED", "1") != "0"
+
+
+class MemoryBackend:
+    """A thread-safe LRU cache with per-entry TTL."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._generations = {}  # namespace -> generation
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def generation(self, namespace):
+        with self._lock:
+            return self._generations.get(namespace, 0)
+
+    def set(self, key, value, ttl, namespace, generation):
+        """Store value unless namespace was invalidated since generation was read."""
+        with self._lock:
+            if self._generations.get(namespace, 0) != generation:
+                return False
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            return True
+
+    def delete(self, key, namespace):
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            self._entries.pop(key, None)
+
+    def delete_prefix(self, prefix, namespace):
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class SQLiteBackend:
+    """A cache shared between processes, stored as JSON in its own SQLite file."""
+
+    def __init__(self, path=CACHE_DATABASE, max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._writes = 0
+        self._pool = ConnectionPool(self._connect, max_size=4, timeout=5.0)
+        with self._pool.connection() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS cache_entries (
+                                key TEXT PRIMARY KEY,
+                                value TEXT NOT NULL,
+                                expires_at REAL NOT NULL);''')
+            conn.execute('''CREATE TABLE IF NOT EXISTS cache_generations (
+                                namespace TEXT PRIMARY KEY,
+                                generation INTEGER NOT NULL);''')
+            conn.commit()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode = wal;")
+        conn.execute("PRAGMA synchronous = OFF;")  # the cache can always be rebuilt
+        return conn
+
+    def get(self, key):
+        with self._pool.connection() as conn:
+            row = conn.execute("SELECT value, expires_at FROM cache_entries WHERE key = ?;", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return False, None
+        return True, json.loads(row[0])
+
+    def generation(self, namespace):
+        with self._pool.connection() as conn:
+            row = conn.execute("SELECT generation FROM cache_generations WHERE namespace = ?;", (namespace,)).fetchone()
+        return row[0] if row else 0
+
+    def set(self, key, value, ttl, namespace, generation):
+        """Store value unless namespace was invalidated (by any process) since generation was read."""
+        with self._pool.connection() as conn:
+            # Check and write in one statement, so an invalidation cannot slip in between
+            cursor = conn.execute('''INSERT OR REPLACE INTO cache_entries (key, value, expires_at)
+                                     SELECT ?, ?, ? WHERE COALESCE(
+                                         (SELECT generation FROM cache_generations WHERE namespace = ?), 0) = ?;''',
+                                  (key, json.dumps(value), time.time() + ttl, namespace, generation))
+            stored = cursor.rowcount > 0
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._trim(conn)
+            conn.commit()
+        return stored
+
+    def _trim(self, conn):
+        conn.execute("DELETE FROM cache_entries WHERE expires_at < ?;", (time.time(),))
+        excess = conn.execute("SELECT COUNT(*) FROM cache_entries;").fetchone()[0] - self.max_entries
+        if excess > 0:
+            conn.execute('''DELETE FROM cache_entries WHERE key IN (
+                                SELECT key FROM cache_entries ORDER BY expires_at LIMIT ?);''', (excess,))
+            self.evictions += excess
+
+    def _bump(self, conn, namespace):
+        conn.execute('''INSERT INTO cache_generations (namespace, generation) VALUES (?, 1)
+                        ON CONFLICT(namespace) DO UPDATE SET generation = generation + 1;''', (namespace,))
+
+    def delete(self, key, namespace):
+        with self._pool.connection() as conn:
+            self._bump(conn, namespace)
+            conn.execute("DELETE FROM cache_entries WHERE key = ?;", (key,))
+            conn.commit()
+
+    def delete_prefix(self, prefix, namespace):
+        # Range scan on the primary key instead of LIKE
+        with self._pool.connection() as conn:
+            self._bump(conn, namespace)
+            conn.execute("DELETE FROM cache_entries WHERE key >= ? AND key < ?;", (prefix, prefix + '\uffff'))
+            conn.commit()
+
+    def clear(self):
+        with self._pool.connection() as conn:
+            conn.execute("DELETE FROM cache_entries;")
+            conn.commit()
+
+    def size(self):
+        with self._pool.connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM cache_entries;").fetchone()[0]
+
+
+backend = SQLiteBackend() if CACHE_BACKEND == "shared" else MemoryBackend()
+
+_stats_lock = threading.Lock()
+_stats = {}  # namespace -> {'hits', 'misses', 'invalidations', 'stale_skips'}
+
+
+def _count(namespace, counter):
+    with _stats_lock:
+        ns = _stats.setdefault(namespace, {'hits': 0, 'misses': 0, 'invalidations': 0, 'stale_skips': 0})
+        ns[counter] += 1
+
+
+def make_key(namespace, args=()):
+    return namespace + ':' + ':'.join(str(a) for a in args)
+
+
+def to_plain(value):
+    """Convert sqlite3.Row (or engines.Row) results into plain dicts/lists that can be cached."""
+    if isinstance(value, (sqlite3.Row, Row)):
+        return dict(value)
+    if isinstance(value, list):
+        return [to_plain(v) for v in value]
+    return value
+
+
+def cached(namespace, ttl=60):
+    """Decorator: cache a lookup function's (truthy) result under namespace + positional args."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            if not CACHE_ENABLED:
+                return func(*args)
+            key = make_key(namespace, args)
+            try:
+                hit, value = backend.get(key)
+            except sqlite3.Error:
+                hit, value = False, None
+            if hit:
+                _count(namespace, 'hits')
+                # Callers are free to mutate what they get back
+                return copy.deepcopy(value)
+            _count(namespace, 'misses')
+            try:
+                generation = backend.generation(namespace)
+            except sqlite3.Error:
+                generation = None
+            value = to_plain(func(*args))
+            # Errors surface as None / [] from the database layer; never cache those
+            if value and generation is not None:
+                try:
+                    if not backend.set(key, value, ttl, namespace, generation):
+                        _count(namespace, 'stale_skips')
+                except sqlite3.Error:
+                    pass
+                value = copy.deepcopy(value)
+            return value
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+
+def invalidate(namespace, *args):
+    """Drop one cached entry (and turn away misses of the namespace still in flight)."""
+    _count(namespace, 'invalidations')
+    backend.delete(make_key(namespace, args), namespace)
+
+
+def invalidate_namespace(namespace):
+    """Drop every cached entry of a namespace."""
+    _count(namespace, 'invalidations')
+    backend.delete_prefix(namespace + ':', namespace)
+
+
+def clear():
+    backend.clear()
+
+
+def get_metrics():
+    """Return per-namespace hit/miss counters plus backend size and evictions."""
+    with _stats_lock:
+        namespaces = {ns: dict(counters) for ns, counters in _stats.items()}
+    for counters in namespaces.values():
+        lookups = counters['hits'] + counters['misses']
+        counters['hit_rate'] = round(counters['hits'] / lookups, 3) if lookups else 0.0
+    return {
+        'backend': CACHE_BACKEND,
+        'entries': backend.size(),
+        'max_entries': backend.max_entries,
+        'evictions': backend.evictions,
+        'namespaces': namespaces,
+    }
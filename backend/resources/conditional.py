@@ -0,0 +1,101 @@
+import functools
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from flask import request, Response
+
+from resources import database as db
+
+# --- Conditional GET (ETag / Last-Modified) ---
+#
+#     @conditional(lambda kw: ['utilities'], cache_control='public, max-age=60')
+#     def get(self): ...
+#
+# Before the handler runs, the data versions of the listed scopes are read
+# (one primary-key lookup). If they match the client's If-None-Match (or
+# If-Modified-Since), the request is answered with 304 and the handler - and
+# its query - never runs. Otherwise the handler runs and its response gets
+# ETag, Last-Modified and Cache-Control headers. The handler reads from the
+# primary (database.primary_reads), where the versions came from, so a
+# lagging read replica cannot pair a stale body with a current ETag.
+
+
+def compute_etag(versions, extra=''):
+    text = '|'.join(f"{scope}={versions[scope]}" for scope in sorted(versions)) + '|' + extra
+    return 'W/"' + hashlib.sha1(text.encode('utf-8')).hexdigest()[:20] + '"'
+
+
+def _http_date(timestamp):
+    local = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S').astimezone()
+    return format_datetime(local.astimezone(timezone.utc), usegmt=True)
+
+
+def _not_modified(etag, last_modified):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+    if_modified_since = request.headers.get('If-Modified-Since')
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+            changed = datetime.strptime(last_modified, '%Y-%m-%d %H:%M:%S').astimezone()
+            return changed.replace(microsecond=0) <= since
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def conditional(scopes, cache_control='private, no-cache', authorize=None, vary_by_day=False):
+    """Decorator for flask-restful GET methods.
+
+    scopes(kwargs) returns the data_versions scopes the response depends on.
+    authorize(kwargs) may return an error response; it runs before any 304 so
+    validators never leak to unauthorized callers. vary_by_day folds today's
+    date into the ETag for responses that filter on "today".
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if authorize is not None:
+                denied = authorize(kwargs)
+                if denied:
+                    return denied
+
+            versions, last_modified = db.get_versions(scopes(kwargs))
+            if versions is None:
+                return method(self, *args, **kwargs)
+
+            extra = datetime.now().strftime('%Y-%m-%d') if vary_by_day else ''
+            etag = compute_etag(versions, extra)
+            headers = {'ETag': etag, 'Cache-Control': cache_control}
+            if last_modified and not vary_by_day:
+                headers['Last-Modified'] = _http_date(last_modified)
+
+            if _not_modified(etag, None if vary_by_day else last_modified):
+                return Response(status=304, headers=headers)
+
+            with db.primary_reads():
+                result = method(self, *args, **kwargs)
+            return _with_headers(result, headers)
+        return wrapper
+    return decorator
+
+
+def _with_headers(result, headers):
+    """Attach validator headers to a 200 response in any flask-restful return shape."""
+    if isinstance(result, Response):
+        if result.status_code == 200:
+            result.headers.update(headers)
+        return result
+    if not isinstance(result, tuple):
+        return result, 200, headers
+    if len(result) == 2:
+        body, status = result
+        return (body, status, headers) if status == 200 else result
+    body, status, existing = result
+    if status != 200:
+        return result
+    merged = dict(existing or {})
+    merged.update(headers)
+    return body, status, merged
@@ -1,7 +1,23 @@
 import datetime
-from flask import request
+import hmac
+import io
+import sqlite3
+from flask import request, Response
 from flask_restful import Resource
 from resources import database as db
+from resources import hashing
+from resources import tokens
+from resources import cache
+from resources import pagination
+from resources import export
+from resources import payment_queue
+from resources import bulk_load
+from resources import billing
+from resources import analytics
+from resources import reminder_scheduler
+from resources import instrumentation
+from resources import queries
+from resources.conditional import conditional
 
 # ================================
 
@@ -13,13 +29,53 @@ VALID_USERNAME = "admin"
 VALID_PASSWORD = "admin123"
 
 def check_credentials():
-    username = request.headers.get("X-USERNAME")
-    password = request.headers.get("X-PASSWORD")
-    if username != VALID_USERNAME or password != VALID_PASSWORD:
-        return False
-    return True
+    # A signed admin token is verified without touching the database
+    claims = get_token_claims()
+    if claims is not None:
+        return claims.get('role') == 'admin'
+    username = request.headers.get("X-USERNAME") or ""
+    password = request.headers.get("X-PASSWORD") or ""
+    username_ok = hmac.compare_digest(username.encode('utf-8'), VALID_USERNAME.encode('utf-8'))
+    password_ok = hmac.compare_digest(password.encode('utf-8'), VALID_PASSWORD.encode('utf-8'))
+    return username_ok and password_ok
+
+def admin_required():
+    """Return an error response unless the request carries admin credentials."""
+    if check_credentials():
+        return None
+    return {'error': 'Invalid Credentials'}, 401
+
+# ================================
+
+# SESSION TOKENS (Authorization: Bearer <token>)
+
+# ================================
+
+def get_token_claims():
+    """Return the verified claims of the request's bearer token, or None."""
+    header = request.headers.get("Authorization", "")
+    if not header.startswith("Bearer "):
+        return None
+    try:
+        return tokens.verify_token(header[len("Bearer "):].strip())
+    except tokens.InvalidToken:
+        return None
+
+def authorize_user(user_id):
+    """Return an error response unless the token belongs to user_id (or an admin)."""
+    claims = get_token_claims()
+    if claims is None:
+        return {'message': 'Missing, invalid or expired token'}, 401
+    if claims.get('uid') != user_id and claims.get('role') != 'admin':
+        return {'message': 'Forbidden'}, 403
+    return None
+
+# Back-pressure response when the password hashing queue is full
+def busy_response():
+    return {'message': 'Server is busy, please retry shortly.'}, 503, {'Retry-After': str(hashing.RETRY_AFTER_SECONDS)}
 
 # Helper function to convert sqlite3.Row to a standard dictionary
+@instrumentation.timed('row_to_dict')
 def row_to_dict(row):
     if row is None:
         return None
@@ -42,9 +98,20 @@ class LoginResource(Resource):
 
         user = db.get_user_by_username(username)
 
-        if user and db.check_password(user, password):
-            # In a real app, a JWT token would be generated here
-            return {'message': 'Login successful', 'token': 'dummy_jwt_token_for_user' , 'user_id': user['user_id']}, 200
+        try:
+            valid = bool(user) and db.check_password(user, password)
+        except hashing.HashingBusy:
+            return busy_response()
+
+        if valid:
+            # Transparently upgrade hashes made with an old cost factor
+            if hashing.needs_rehash(user['password_hash']):
+                try:
+                    db.update_password(user['user_id'], password)
+                except hashing.HashingBusy:
+                    pass  # try again on the next login
+            token, claims = tokens.issue_token(user['user_id'], user['role'])
+            return {'message': 'Login successful', 'token': token, 'user_id': user['user_id'], 'expires_at': claims['exp']}, 200
         else:
             return {'message': 'Invalid credentials'}, 401
 
@@ -62,7 +129,10 @@ class RegisterResource(Resource):
         if not all([username, email, phone_number, password]):
             return {'message': 'Missing required fields: username, email, phone_number, password'}, 400
 
-        result = db.add_user(username, password, email, phone_number, pan, aadhaar, role='user')
+        try:
+            result = db.add_user(username, password, email, phone_number, pan, aadhaar, role='user')
+        except hashing.HashingBusy:
+            return busy_response()
         
         if result is True:
             return {'message': f'User {username} registered successfully.'}, 201
@@ -75,32 +145,36 @@ class RegisterResource(Resource):
 
 class LogoutResource(Resource):
     def post(self):
-        """POST /api/auth/logout - Stub for JWT invalidation"""
-        # In a real app, this would blacklist the token or clear a session/cookie.
-        return {'message': 'Logout successful. (JWT Token invalidated)'}, 200
+        """POST /api/auth/logout - Revoke the presented session token"""
+        claims = get_token_claims()
+        if claims is None:
+            return {'message': 'Missing, invalid or expired token'}, 401
+        result = tokens.revoke(claims)
+        if result is True:
+            return {'message': 'Logout successful. (Token invalidated)'}, 200
+        return {'message': f'Logout failed: {result}'}, 500
 
 # ==============================================================================
 # 👤 User Management Endpoints 👤
 # ==============================================================================
 
 class UserDetailResource(Resource):
+    @conditional(lambda kw: [db.user_scope(kw['userId'], 'profile')],
+                 authorize=lambda kw: authorize_user(kw['userId']))
     def get(self, userId):
         """GET /api/users/{userId}"""
-        # Auth check (should ensure the requester is the user OR an admin)
-        
-        user = db.get_user_by_id(userId)
+        user = db.get_user_profile(userId)
         if not user:
             return {'message': 'User not found'}, 404
         
-        user_dict = row_to_dict(user)
-        # Never expose the password hash
-        del user_dict['password_hash']
-        
-        return {'user': user_dict}, 200
+        # The profile never includes the password hash
+        return {'user': row_to_dict(user)}, 200
 
     def put(self, userId):
         """PUT /api/users/{userId}"""
-        # Auth check (should ensure the requester is the user OR an admin)
+        denied = authorize_user(userId)
+        if denied:
+            return denied
         
         data = request.get_json()
         email = data.get('email')
@@ -112,22 +186,47 @@ class UserDetailResource(Resource):
         result = db.update_user(userId, email=email, phone_number=phone_number)
         
         if result is True:
-            updated_user = db.get_user_by_id(userId)
+            updated_user = db.get_user_profile(userId)
             if updated_user:
-                updated_user_dict = row_to_dict(updated_user)
-                del updated_user_dict['password_hash']
-                return {'message': 'User updated successfully', 'user': updated_user_dict}, 200
+                return {'message': 'User updated successfully', 'user': row_to_dict(updated_user)}, 200
             return {'message': 'User updated, but failed to fetch details'}, 200
         elif isinstance(result, str):
             return {'message': f'Update failed: {result}'}, 500
         else:
             return {'message': 'User not found or no change made'}, 404
 
+# ==============================================================================
+# 🏠 Dashboard Endpoint 🏠
+# ==============================================================================
+
+class DashboardResource(Resource):
+    @conditional(lambda kw: [db.user_scope(kw['current_user_id'], kind) for kind in ('profile', 'bills', 'payments', 'reminders')] + ['utilities', 'balances'],
+                 authorize=lambda kw: authorize_user(kw['current_user_id']),
+                 vary_by_day=True)
+    def get(self, current_user_id):
+        """GET /api/dashboard/{current_user_id} - Profile, bills, totals, reminders and recent payments"""
+        dashboard = db.get_dashboard(current_user_id)
+        if dashboard is None:
+            return {'message': 'User not found'}, 404
+        return dashboard, 200
+
+class BalanceResource(Resource):
+    @conditional(lambda kw: [db.user_scope(kw['current_user_id'], kind) for kind in ('bills', 'payments')] + ['utilities', 'balances'],
+                 authorize=lambda kw: authorize_user(kw['current_user_id']),
+                 vary_by_day=True)
+    def get(self, current_user_id):
+        """GET /api/balance/{current_user_id} - Amount owed, overdue count, last payment and per-utility totals"""
+        balance = db.get_user_balance(current_user_id)
+        if balance is None:
+            return {'message': 'User not found'}, 404
+        return balance, 200
+
 # ==============================================================================
 # 💡 Utility Management Endpoints 💡
 # ==============================================================================
 
 class UtilityListResource(Resource):
+    @conditional(lambda kw: ['utilities'], cache_control='public, max-age=60')
     def get(self):
         """GET /api/utilities"""
         utilities = db.get_all_utilities()
@@ -152,6 +251,7 @@ class UtilityListResource(Resource):
             return {'message': 'Failed to add utility'}, 500
 
 class UtilityDetailResource(Resource):
+    @conditional(lambda kw: ['utilities'], cache_control='public, max-age=60')
     def get(self, utilityId):
         """GET /api/utilities/{utilityId}"""
         utility = db.get_utility_by_id(utilityId)
@@ -193,15 +293,12 @@ class UtilityDetailResource(Resource):
 # ==============================================================================
 
 class BillListResource(Resource):
+    @conditional(lambda kw: [db.user_scope(kw['current_user_id'], 'bills'), 'utilities'],
+                 authorize=lambda kw: authorize_user(kw['current_user_id']))
     def get(self, current_user_id):
         """GET /api/bills - Get bills for the authenticated user"""
-        # Placeholder for current user ID (should be retrieved from JWT)
-        # Using a dummy ID for demonstration without Auth
-        # In a real app: current_user_id = decode_jwt().get('user_id')
-        # current_user_id = 1 
-        
         bills = db.get_bills_by_user(current_user_id)
-        return {'bills': [row_to_dict(b) for b in bills]}, 200
+        return {'bills': bills}, 200
 
     def post(self):
         """POST /api/bills - Generate a new bill (Admin/System only)"""
@@ -271,33 +368,65 @@ class BillDetailResource(Resource):
 class PaymentListResource(Resource):
     def get(self, current_user_id):
         """GET /api/payments - Get payments for the authenticated user"""
-        # Placeholder for current user ID (should be retrieved from JWT)
-        # In a real app: current_user_id = decode_jwt().get('user_id')
-        # current_user_id = 1 
+        denied = authorize_user(current_user_id)
+        if denied:
+            return denied
         
         payments = db.get_payments_by_user(current_user_id)
         return {'payments': [row_to_dict(p) for p in payments]}, 200
 
-    def post(self):
-        """POST /api/payments - Make a payment for a bill."""
+    def post(self, current_user_id):
+        """POST /api/payments/{current_user_id} - Queue a payment for a bill (202 + status URL)."""
+        denied = authorize_user(current_user_id)
+        if denied:
+            return denied
+
         data = request.get_json()
         bill_id = data.get('bill_id')
-        user_id = data.get('user_id')
         payment_amount = data.get('payment_amount')
         payment_method = data.get('payment_method')
         
-        if not all([bill_id, user_id, payment_amount, payment_method]):
-            return {'message': 'Missing required fields: bill_id, user_id, payment_amount, payment_method'}, 400
-        
-        # In a real app, this would involve a call to an external payment gateway.
-        # For simulation, we assume immediate completion.
-        payment_id = db.add_payment(bill_id, user_id, payment_amount, payment_method, status='completed')
+        if not all([bill_id, payment_amount, payment_method]):
+            return {'message': 'Missing required fields: bill_id, payment_amount, payment_method'}, 400
 
-        if payment_id:
-            return {'message': 'Payment successful', 'payment_id': payment_id}, 201
+        bill = db.get_bill_by_id(bill_id)
+        if not bill or bill['user_id'] != current_user_id:
+            return {'message': 'Bill not found'}, 404
+        if bill['status'] != 'pending':
+            return {'message': 'Bill is already paid'}, 409
+        # The bill decides what is charged; the client's amount only confirms it
+        try:
+            amount_matches = round(float(payment_amount), 2) == round(bill['amount'], 2)
+        except (TypeError, ValueError):
+            amount_matches = False
+        if not amount_matches:
+            return {'message': f"payment_amount must equal the bill amount ({bill['amount']})"}, 400
+        
+        # The gateway call happens on a payment worker, not on this request thread
+        job_id, created = payment_queue.submit_payment(bill_id, current_user_id, bill['amount'], payment_method)
+
+        if job_id and not created:
+            status_url = f'/api/payments/jobs/{job_id}'
+            return {'message': 'A payment for this bill is already in progress', 'job_id': job_id,
+                    'status_url': status_url}, 409, {'Location': status_url}
+        if job_id:
+            status_url = f'/api/payments/jobs/{job_id}'
+            return {'message': 'Payment accepted for processing', 'job_id': job_id, 'status': 'pending',
+                    'status_url': status_url}, 202, {'Location': status_url}
         else:
             return {'message': 'Payment processing failed'}, 500
 
+class PaymentJobResource(Resource):
+    def get(self, jobId):
+        """GET /api/payments/jobs/{jobId} - Poll the status of a queued payment"""
+        job = db.get_payment_job(jobId)
+        if not job:
+            return {'message': 'Payment job not found'}, 404
+        denied = authorize_user(job['user_id'])
+        if denied:
+            return denied
+        return {'job': row_to_dict(job)}, 200
+
 class PaymentDetailResource(Resource):
     def get(self, paymentId):
         """GET /api/payments/{paymentId}"""
@@ -346,12 +475,11 @@ class PaymentDetailResource(Resource):
 # ==============================================================================
 
 class ReminderListResource(Resource):
+    @conditional(lambda kw: [db.user_scope(kw['current_user_id'], 'reminders')],
+                 authorize=lambda kw: authorize_user(kw['current_user_id']),
+                 vary_by_day=True)
     def get(self, current_user_id):
         """GET /api/reminders/current_user_id - Get reminders for the authenticated user"""
-        # Placeholder for current user ID (should be retrieved from JWT)
-        # In a real app: current_user_id = decode_jwt().get('user_id')
-        # current_user_id = 1 
-        
         reminders = db.get_reminders_by_user(current_user_id)
         return {'reminders': [row_to_dict(r) for r in reminders]}, 200
 
@@ -417,6 +545,7 @@ class AdminUserListResource(Resource):
             return {'error': 'Invalid Credentials'}, 401
 
 class AdminUtilityListResource(Resource):
+    @conditional(lambda kw: ['utilities'], authorize=lambda kw: admin_required())
     def get(self):
         if check_credentials():
             """GET /api/admin/utilities"""
@@ -427,129 +556,239 @@ class AdminUtilityListResource(Resource):
             return {'error': 'Invalid Credentials'}, 401
 
 class AdminBillListResource(Resource):
+    @conditional(lambda kw: ['bills', 'utilities'], authorize=lambda kw: admin_required())
     def get(self):
         if check_credentials():
-            """GET /api/admin/bills"""
-            # Admin Auth check required
-            bills = db.get_all_bills()
-            # Note: get_all_bills returns a custom join result, so keys are already clean
-            return {'bills': [dict(b) for b in bills]}, 200
+            """GET /api/admin/bills?cursor=&limit=&user_id=&utility_id=&status=&from=&to="""
+            try:
+                filters = pagination.parse_filters(request.args)
+                after = pagination.decode_cursor(request.args.get('cursor'))
+                limit = pagination.parse_limit(request.args.get('limit'))
+            except pagination.InvalidQuery as e:
+                return {'message': str(e)}, 400
+            bills, next_key = db.get_bills_page(filters, after, limit)
+            # RowSet of tuples: the response encoder builds the objects
+            return {'bills': bills, 'next_cursor': pagination.encode_cursor(next_key), 'limit': limit}, 200
         else:
             return {'error': 'Invalid Credentials'}, 401
 
 class AdminPaymentListResource(Resource):
+    @conditional(lambda kw: ['payments', 'bills', 'utilities'], authorize=lambda kw: admin_required())
     def get(self):
         if check_credentials():
-            """GET /api/admin/payments"""
-            # Admin Auth check required
-            payments = db.get_all_payments()
-            # Note: get_all_payments returns a custom join result, so keys are already clean
-            return {'payments': [dict(p) for p in payments]}, 200
+            """GET /api/admin/payments?cursor=&limit=&user_id=&utility_id=&status=&from=&to="""
+            try:
+                filters = pagination.parse_filters(request.args)
+                after = pagination.decode_cursor(request.args.get('cursor'))
+                limit = pagination.parse_limit(request.args.get('limit'))
+            except pagination.InvalidQuery as e:
+                return {'message': str(e)}, 400
+            payments, next_key = db.get_payments_page(filters, after, limit)
+            # RowSet of tuples: the response encoder builds the objects
+            return {'payments': payments, 'next_cursor': pagination.encode_cursor(next_key), 'limit': limit}, 200
+        else:
+            return {'error': 'Invalid Credentials'}, 401
+
+class AdminExportResource(Resource):
+    def get(self, kind):
+        if check_credentials():
+            """GET /api/admin/export/{bills|payments}?format=ndjson|csv&gzip=1&user_id=&utility_id=&status=&from=&to="""
+            if kind not in ('bills', 'payments'):
+                return {'message': 'Unknown export. Use bills or payments.'}, 404
+            fmt = request.args.get('format', 'ndjson')
+            if fmt not in export.FORMATS:
+                return {'message': f"format must be one of: {', '.join(export.FORMATS)}"}, 400
+            try:
+                filters = pagination.parse_filters(request.args)
+            except pagination.InvalidQuery as e:
+                return {'message': str(e)}, 400
+
+            batches = db.iter_bill_batches(filters) if kind == 'bills' else db.iter_payment_batches(filters)
+            compress = request.args.get('gzip') in ('1', 'true')
+            filename = f"{kind}.{fmt}" + ('.gz' if compress else '')
+            # Rows are pulled from the cursor only as the client reads the response
+            return Response(export.encode(batches, fmt, compress),
+                            mimetype='application/gzip' if compress else export.FORMATS[fmt],
+                            headers={'Content-Disposition': f'attachment; filename={filename}'})
+        else:
+            return {'error': 'Invalid Credentials'}, 401
+
+class AdminImportResource(Resource):
+    def post(self, kind):
+        if check_credentials():
+            """POST /api/admin/import/{users|utilities|bills|payments}?format=csv|ndjson&skip_duplicates=1
+
+            Body is the raw CSV / NDJSON file. Users must carry a precomputed
+            password_hash; plaintext passwords are only hashed by the CLI loader.
+            """
+            if kind not in bulk_load.TABLES:
+                return {'message': f"Unknown import. Use one of: {', '.join(bulk_load.LOAD_ORDER)}."}, 404
+            fmt = request.args.get('format') or bulk_load.detect_format(request.mimetype)
+            if fmt not in bulk_load.FORMATS:
+                return {'message': f"format must be one of: {', '.join(bulk_load.FORMATS)}"}, 400
+
+            stream = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+            try:
+                with db.get_connection() as conn:
+                    report = bulk_load.load_stream(conn, kind, stream, fmt,
+                                                   skip_duplicates=request.args.get('skip_duplicates') in ('1', 'true'))
+            except sqlite3.Error as e:
+                return {'message': f'Import failed: {e}'}, 500
+            return {'report': report}, 200
+        else:
+            return {'error': 'Invalid Credentials'}, 401
+
+class AdminBillingRunListResource(Resource):
+    def post(self):
+        if check_credentials():
+            """POST /api/admin/billing-runs {"period": "YYYY-MM"} - Issue (or resume) a month's bills in the background"""
+            data = request.get_json() or {}
+            period = data.get('period')
+            try:
+                run_id = billing.start_billing_run(period, workers=data.get('workers'))
+            except billing.BillingError as e:
+                return {'message': str(e)}, 400
+            except sqlite3.Error as e:
+                return {'message': f'Billing run failed to start: {e}'}, 500
+            status_url = f'/api/admin/billing-runs/{run_id}'
+            return {'message': 'Billing run started', 'run_id': run_id, 'status_url': status_url}, 202, {'Location': status_url}
+        else:
+            return {'error': 'Invalid Credentials'}, 401
+
+class AdminBillingRunResource(Resource):
+    def get(self, runId):
+        if check_credentials():
+            """GET /api/admin/billing-runs/{runId} - Progress of a billing run"""
+            run = billing.get_billing_run(runId)
+            if not run:
+                return {'message': 'Billing run not found'}, 404
+            return {'run': run}, 200
+        else:
+            return {'error': 'Invalid Credentials'}, 401
+
+class AdminBalanceListResource(Resource):
+    @conditional(lambda kw: ['bills', 'payments', 'balances'], authorize=lambda kw: admin_required())
+    def get(self):
+        if check_credentials():
+            """GET /api/admin/balances?limit= - Users with the largest pending totals"""
+            try:
+                limit = pagination.parse_limit(request.args.get('limit'))
+            except pagination.InvalidQuery as e:
+                return {'message': str(e)}, 400
+            balances = db.get_top_balances(limit)
+            if balances is None:
+                return {'message': 'Could not read balances'}, 500
+            return {'balances': balances, 'limit': limit}, 200
+        else:
+            return {'error': 'Invalid Credentials'}, 401
+
+class AdminAnalyticsResource(Resource):
+    def get(self, report):
+        if check_credentials():
+            """GET /api/admin/analytics/{revenue|collection|aging|payment-methods}?from=&to=&granularity=day|month&group=utility|provider&utility_id="""
+            try:
+                filters = pagination.parse_filters(request.args)
+            except pagination.InvalidQuery as e:
+                return {'message': str(e)}, 400
+            granularity = request.args.get('granularity', 'day')
+            group = request.args.get('group', 'utility')
+            if granularity not in ('day', 'month') or group not in ('utility', 'provider'):
+                return {'message': 'granularity must be day or month; group must be utility or provider'}, 400
+
+            analytics.refresh_if_stale()
+            try:
+                if report == 'revenue':
+                    rows = analytics.revenue(granularity, filters['date_from'], filters['date_to'])
+                elif report == 'collection':
+                    rows = analytics.collection(group, filters['date_from'], filters['date_to'])
+                elif report == 'aging':
+                    rows = analytics.aging(utility_id=filters['utility_id'])
+                elif report == 'payment-methods':
+                    rows = analytics.payment_methods(filters['date_from'], filters['date_to'])
+                else:
+                    return {'message': 'Unknown report. Use revenue, collection, aging or payment-methods.'}, 404
+            except sqlite3.Error as e:
+                return {'message': f'Could not read analytics: {e}'}, 500
+            return {'report': report, 'as_of': analytics.as_of(), 'rows': rows}, 200
+        else:
+            return {'error': 'Invalid Credentials'}, 401
+
+class AdminMetricsResource(Resource):
+    def get(self):
+        if check_credentials():
+            """GET /api/admin/metrics"""
+            return {'pool': db.get_pool_metrics(), 'hashing': hashing.get_metrics(), 'cache': cache.get_metrics(),
+                    'payment_workers': payment_queue.workers.metrics(),
+                    'reminder_scheduler': reminder_scheduler.scheduler.metrics(),
+                    'replicas': db.get_replica_metrics(),
+                    'slow_queries': instrumentation.get_slow_queries(),
+                    'statement_cache': queries.get_cache_metrics()}, 200
         else:
             return {'error': 'Invalid Credentials'}, 401
     
 
 
 class BatchPaymentResource(Resource):
-    def add_batch_payment(user_id, bill_ids, payment_method):
-        """
-        Process a batch payment for a list of bill IDs, 
-        update their status, and create payment records.
+    def post(self, current_user_id):
+        """POST /api/payments/batch/{current_user_id} - Pay several bills at once.
 
-        Returns: A tuple (success_status: bool | str, paid_bill_ids: list)
-        """
-        conn = db.create_connection()
-        if conn:
-            try:
-                cursor = conn.cursor()
-                transaction_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                payment_records = []
-
-                # 1. Prepare for batch query
-                # The list of bill_ids needs to be a tuple for use in execute()
-                bill_ids_tuple = tuple(bill_ids)
-
-                # 2. Fetch bills to get amounts and ensure they belong to the user and are pending
-                # NOTE: The bill_id placeholder count must match the number of bill_ids
-                sql_fetch_bills = f'''
-                    SELECT bill_id, amount
-                    FROM bills
-                    WHERE user_id = ? AND status = 'pending' AND bill_id IN ({','.join(['?'] * len(bill_ids_tuple))})
-                '''
-
-                # Combine user_id with bill_ids_tuple for parameters
-                params = [user_id] + list(bill_ids_tuple)
-
-                cursor.execute(sql_fetch_bills, tuple(params))
-                pending_bills = cursor.fetchall()
-
-                if not pending_bills:
-                    # This could happen if bills are already paid or don't belong to the user
-                    return "No pending bills found for the user with the given IDs or bills already paid.", []
-
-                processed_bill_ids = []
-
-                # 3. Insert payment for each bill and update bill status
-                for bill in pending_bills:
-                    bill_id = bill['bill_id']
-                    amount = bill['amount']
-
-                    # Insert payment record
-                    cursor.execute('''
-                        INSERT INTO payments (bill_id, user_id, amount, payment_method, status, transaction_date)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    ''', (bill_id, user_id, amount, payment_method, 'completed', transaction_date))
-
-                    payment_records.append(cursor.lastrowid)
-                    processed_bill_ids.append(bill_id)
-
-                    # Update bill status to 'paid'
-                    cursor.execute('''
-                        UPDATE bills SET status = 'paid' WHERE bill_id = ?
-                    ''', (bill_id,))
-
-                conn.commit()
-
-                # Return True and the list of successfully paid bill IDs
-                return True, processed_bill_ids
-            except Exception as e:
-                conn.rollback()
-                return str(e), []
-            finally:
-                if conn: conn.close()
-
-    def get_recent_payments_by_user(user_id, limit=5):
-        """
-        Retrieve the most recent payments for a user, including utility name and provider.
-        This is used to generate the receipt after a successful payment.
+        Body: {"bill_ids": [...], "payment_method": "..."}. Send an
+        Idempotency-Key header so a retried request is not charged twice.
         """
-        conn = db.create_connection()
-        payments = []
-        if conn:
-            try:
-                cursor = conn.cursor()
-                sql = '''
-                SELECT 
-                    p.*, 
-                    u.username AS username, 
-                    b.due_date AS bill_due_date,
-                    util.name AS utility_name,
-                    util.provider_name AS provider_name
-                FROM payments p
-                JOIN users u ON p.user_id = u.user_id
-                JOIN bills b ON p.bill_id = b.bill_id
-                JOIN utilities util ON b.utility_id = util.utility_id
-                WHERE p.user_id = ?
-                ORDER BY p.transaction_date DESC
-                LIMIT ?;
-                '''
-                cursor.execute(sql, (user_id, limit))
-                payments = cursor.fetchall()
-                # Convert to list of dicts for easy API consumption
-                return [dict(p) for p in payments]
-            except Exception as e:
-                print(f"Error fetching payments for user {user_id}: {e}")
-                return []
-            finally:
-                if conn: conn.close()
+        denied = authorize_user(current_user_id)
+        if denied:
+            return denied
+
+        data = request.get_json() or {}
+        bill_ids = data.get('bill_ids')
+        payment_method = data.get('payment_method')
+        idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+
+        if not bill_ids or not isinstance(bill_ids, list) or not payment_method:
+            return {'message': 'Missing required fields: bill_ids (list), payment_method'}, 400
+        if not all(isinstance(b, int) for b in bill_ids):
+            return {'message': 'bill_ids must be a list of integers'}, 400
+
+        status, outcomes, replayed = db.add_batch_payment(current_user_id, bill_ids, payment_method, idempotency_key)
+
+        if status is True:
+            receipts = [o for o in outcomes if o['outcome'] == 'paid']
+            body = {
+                'message': f'{len(receipts)} of {len(outcomes)} bills paid',
+                'results': outcomes,
+                'receipts': receipts,
+                'total_paid': round(sum(r['amount'] for r in receipts), 2),
+            }
+            return body, 200, {'Idempotent-Replayed': 'true' if replayed else 'false'}
+        elif status == db.IDEMPOTENCY_CONFLICT:
+            return {'message': status}, 409
+        else:
+            return {'message': f'Batch payment failed: {status}'}, 500
+
 
+class HealthResource(Resource):
+    def get(self):
+        """GET /healthz - Liveness: the process is up and serving (no database access)"""
+        return {'status': 'ok'}, 200
+
+def metrics_scraper():
+    """True when the request carries the METRICS_TOKEN bearer token."""
+    if not instrumentation.METRICS_TOKEN:
+        return False
+    header = request.headers.get("Authorization", "")
+    return hmac.compare_digest(header.encode('utf-8'), f"Bearer {instrumentation.METRICS_TOKEN}".encode('utf-8'))
+
+class MetricsResource(Resource):
+    def get(self):
+        """GET /metrics - Prometheus text format (see resources/instrumentation.py)"""
+        if not metrics_scraper():
+            denied = admin_required()
+            if denied:
+                return denied
+        return Response(instrumentation.registry.render(), content_type=instrumentation.CONTENT_TYPE)
+
+class ReadinessResource(Resource):
+    def get(self):
+        """GET /readyz - Readiness: the database answers and its schema is current"""
+        readiness = db.get_readiness()
+        return readiness, 200 if readiness['ready'] else 503
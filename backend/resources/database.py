@@ -1,10 +1,37 @@
-import sqlite3
-from sqlite3 import Error
-import bcrypt
+import os
+import json
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+from sqlite3 import Error, IntegrityError
 import re
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from resources.pool import ConnectionPool
+from resources import engines
+from resources import profiles
+from resources import migrations
+from resources import hashing
+from resources import cache
+from resources import replicas
+from resources import queries
+from resources.serialization import fetch_rowset, tuple_cursor
 
-DATABASE = "utility_payment_system.db"
+# A SQLite file, or a postgresql:// URL (see resources/engines.py)
+DATABASE = os.environ.get("DATABASE_URL", "utility_payment_system.db")
+engine = engines.get_engine(DATABASE)
+
+# Connection pool sizing (overridable per deployment; the default depends on the engine)
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", str(engine.pool_size)))
+POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+# Connections each server process opens before taking traffic (0: the whole pool)
+POOL_WARM = int(os.environ.get("DB_POOL_WARM", "0"))
+
+# Rows fetched per cursor.fetchmany() call when streaming exports
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "1000"))
+
+# Storage profile (dev / prod / bulk-load), see resources/profiles.py
+DB_PROFILE = profiles.get_profile_name()
 
 # --- Connection and Setup ---
 
@@ -12,96 +39,196 @@ def create_connection():
     """Create and return a database connection."""
     conn = None
     try:
-        conn = sqlite3.connect(DATABASE, check_same_thread=False)
-        conn.row_factory = sqlite3.Row
+        conn = engine.connect(DATABASE, DB_PROFILE)
     except Error as e:
-        print(f"Error while connecting to SQLite: {e}")
+        print(f"Error while connecting to {engine.name}: {e}")
     return conn
 
-def create_table():
-    """Create tables in the database."""
-    conn = create_connection()
-    if conn:
+pool = ConnectionPool(create_connection, max_size=POOL_SIZE, timeout=POOL_TIMEOUT)
+
+# Read-only queries can be served from READ_REPLICAS, see resources/replicas.py
+# (copies of a SQLite file; not used with other engines)
+_replica_paths = replicas.READ_REPLICAS if engine.name == 'sqlite' else []
+read_replicas = replicas.ReplicaSet(_replica_paths, pool_size=POOL_SIZE,
+                                    busy_timeout=profiles.PROFILES[DB_PROFILE]['busy_timeout'] / 1000.0)
+replica_syncer = replicas.ReplicaSyncer(DATABASE, _replica_paths)
+
+def use_database(target):
+    """Point this process at another database (file path or URL), e.g. for benchmarks."""
+    global DATABASE, engine
+    DATABASE, engine = target, engines.get_engine(target)
+    pool.max_size = int(os.environ.get("DB_POOL_SIZE", str(engine.pool_size)))
+    pool.reset()
+
+def get_connection():
+    """Check a connection out of the shared pool (use as a context manager)."""
+    return pool.connection()
+
+def get_read_connection(user_id=None):
+    """A connection for read-only queries: a replica within REPLICA_MAX_LAG, else the primary.
+
+    With user_id, a replica is only used once it holds that user's latest
+    writes (read-your-writes after e.g. a payment). A thread already inside a
+    primary transaction, or inside primary_reads(), keeps reading from it.
+    """
+    return _read_pool(user_id).connection()
+
+_local = threading.local()
+
+@contextmanager
+def primary_reads():
+    """Serve every read in the block from the primary.
+
+    Used for responses validated against the primary's data_versions (see
+    resources/conditional.py): a lagging replica would pair a stale body with
+    a current ETag, and the client would then get 304 for the stale body.
+    """
+    previous = getattr(_local, 'primary_reads', False)
+    _local.primary_reads = True
+    try:
+        yield
+    finally:
+        _local.primary_reads = previous
+
+def _read_pool(user_id=None):
+    if not read_replicas:
+        return pool
+    if pool.held_by_current_thread() or getattr(_local, 'primary_reads', False):
+        read_replicas.count_primary_read()
+        return pool
+    replica = read_replicas.choose(None if user_id is None else _caught_up_with(user_id))
+    return pool if replica is None else replica.pool
+
+USER_SCOPE_KINDS = ('profile', 'bills', 'payments', 'reminders')
+# Shared scopes the per-user reads also depend on (utility names, balance rollups)
+SHARED_SCOPES = ('utilities', 'balances')
+
+def _caught_up_with(user_id):
+    """A check that a replica's version counters for the user (and shared scopes) match the primary's."""
+    scopes = [user_scope(user_id, kind) for kind in USER_SCOPE_KINDS] + list(SHARED_SCOPES)
+    primary = []
+
+    def caught_up(replica):
+        if not primary:
+            primary.append(get_versions(scopes)[0])
+        if primary[0] is None:
+            return False
         try:
-            cursor = conn.cursor()
-            
-            cursor.execute("DROP TABLE IF EXISTS payments;")
-            cursor.execute("DROP TABLE IF EXISTS reminders;")
-            cursor.execute("DROP TABLE IF EXISTS bills;")
-            cursor.execute("DROP TABLE IF EXISTS utilities;")
-            cursor.execute("DROP TABLE IF EXISTS users;")
-            
-            # Create users table
-            cursor.execute('''CREATE TABLE IF NOT EXISTS users (
-                                user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                username TEXT NOT NULL UNIQUE,
-                                password_hash TEXT NOT NULL,
-                                email TEXT NOT NULL,
-                                phone_number TEXT NOT NULL,
-                                pan TEXT UNIQUE,
-                                aadhaar TEXT UNIQUE,
-                                role TEXT NOT NULL DEFAULT 'user',
-                                created_at TEXT NOT NULL);''')
-
-            # Create utilities table
-            cursor.execute('''CREATE TABLE IF NOT EXISTS utilities (
-                                utility_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                name TEXT NOT NULL,
-                                description TEXT,
-                                provider_name TEXT,
-                                created_at TEXT NOT NULL);''')
-
-            # Create bills table
-            cursor.execute('''CREATE TABLE IF NOT EXISTS bills (
-                                bill_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                user_id INTEGER NOT NULL,
-                                utility_id INTEGER NOT NULL,
-                                amount REAL NOT NULL,
-                                due_date TEXT NOT NULL,
-                                status TEXT NOT NULL DEFAULT 'pending',
-                                created_at TEXT NOT NULL, 
-                                FOREIGN KEY (user_id) REFERENCES users (user_id),
-                                FOREIGN KEY (utility_id) REFERENCES utilities (utility_id));''')
-
-            # Create payments table
-            cursor.execute('''CREATE TABLE IF NOT EXISTS payments (
-                                payment_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                bill_id INTEGER NOT NULL,
-                                user_id INTEGER NOT NULL,
-                                amount REAL NOT NULL,
-                                payment_method TEXT NOT NULL,
-                                status TEXT NOT NULL DEFAULT 'completed',
-                                transaction_date TEXT NOT NULL,
-                                FOREIGN KEY (bill_id) REFERENCES bills (bill_id),
-                                FOREIGN KEY (user_id) REFERENCES users (user_id));''')
-
-            # Create reminders table
-            cursor.execute('''CREATE TABLE IF NOT EXISTS reminders (
-                                reminder_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                user_id INTEGER NOT NULL,
-                                message TEXT NOT NULL,
-                                reminder_date TEXT NOT NULL,
-                                created_at TEXT NOT NULL,
-                                FOREIGN KEY (user_id) REFERENCES users (user_id));''')
+            with replica.pool.connection() as conn:
+                rows = conn.execute(*queries.in_statement('versions.by_scope', scopes)).fetchall()
+        except Error:
+            return False
+        copied = {row['scope']: row['version'] for row in rows}
+        return all(copied.get(scope, 0) >= version for scope, version in primary[0].items())
+    return caught_up
 
-            conn.commit()
+def get_replica_metrics():
+    """Routing counters and per-replica lag (empty when no replicas are configured)."""
+    if not read_replicas:
+        return {}
+    return dict(read_replicas.metrics(), syncer=replica_syncer.metrics())
+
+def get_pool_metrics():
+    """Return checkout/wait/eviction counters for the connection pool."""
+    return pool.metrics()
+
+def verify_storage_profile():
+    """Check at startup that connections really run with the configured storage profile."""
+    with get_connection() as conn:
+        mismatches = engine.verify_profile(conn, DB_PROFILE)
+    if mismatches:
+        details = ", ".join(f"{name}: expected {expected}, got {actual}" for name, expected, actual in mismatches)
+        raise RuntimeError(f"Storage profile '{DB_PROFILE}' not applied ({details})")
+    print(f"Storage profile '{DB_PROFILE}' verified.")
+
+def create_table():
+    """Drop every table and rebuild the schema from the migrations (dev reset)."""
+    try:
+        with get_connection() as conn:
+            engine.drop_all_tables(conn)
+            engine.prepare(conn)
+            migrations.migrate(conn)
+            cache.clear()
             print("Tables created successfully.")
-        except Error as e:
-            print(f"Error while creating tables: {e}")
-        finally:
-            conn.close()
+    except Error as e:
+        print(f"Error while creating tables: {e}")
+
+def migrate():
+    """Bring the schema up to date without touching existing data."""
+    with get_connection() as conn:
+        engine.prepare(conn)
+        return migrations.migrate(conn)
+
+def warm_up():
+    """Open this process's pooled connections up front (e.g. in each forked worker)."""
+    return pool.warm(POOL_WARM or None)
+
+def get_readiness():
+    """Whether this process can serve traffic: the database answers and the schema is current."""
+    try:
+        with get_connection() as conn:
+            version = conn.execute("SELECT MAX(version) FROM schema_migrations;").fetchone()[0] or 0
+    except Error as e:
+        return {'ready': False, 'database': str(e)}
+    return {'ready': version >= migrations.LATEST_VERSION, 'database': 'ok',
+            'schema_version': version, 'expected_schema_version': migrations.LATEST_VERSION}
+
+# --- Data Version Counters (conditional GET validators) ---
+#
+# Every write bumps the version of the scopes it changes, inside the same
+# transaction: table-wide scopes ('utilities', 'bills', 'payments') and per-user
+# scopes ('user:<id>:bills', ...). Read endpoints derive their ETag from these
+# counters, so a client poll can be answered with 304 from a single primary-key
+# lookup without running the real query. Versions are microsecond timestamps
+# (kept strictly increasing), so they never repeat even after create_table().
+
+def user_scope(user_id, kind):
+    """Scope name for one user's data: kind is profile, bills, payments or reminders."""
+    return f"user:{user_id}:{kind}"
+
+def bump_versions(cursor, *scopes):
+    """Bump the version counters for the given scopes (call before commit)."""
+    stamp = time.time_ns() // 1000
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    cursor.executemany('''INSERT INTO data_versions (scope, version, updated_at) VALUES (?, ?, ?)
+                          ON CONFLICT(scope) DO UPDATE SET version = MAX(data_versions.version + 1, excluded.version),
+                                                           updated_at = excluded.updated_at;''',
+                       [(scope, stamp, now) for scope in dict.fromkeys(scopes)])
+
+def get_versions(scopes):
+    """Return ({scope: version}, last_updated_at) for the given scopes (missing scopes are 0)."""
+    versions = {scope: 0 for scope in scopes}
+    last_modified = None
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(*queries.in_statement('versions.by_scope', scopes))
+            for row in cursor.fetchall():
+                versions[row['scope']] = row['version']
+                last_modified = max(last_modified or row['updated_at'], row['updated_at'])
+    except Error as e:
+        print(f"Error while fetching data versions: {e}")
+        return None, None
+    return versions, last_modified
+
+def _bill_owner(cursor, bill_id):
+    cursor.execute("SELECT user_id FROM bills WHERE bill_id = ?;", (bill_id,))
+    row = cursor.fetchone()
+    return row['user_id'] if row else None
 
 # --- Validation Functions ---
 
+# Compiled once; the bulk loader validates whole columns with the same patterns
+PAN_PATTERN = re.compile(r'^[A-Z]{5}[0-9]{4}[A-Z]{1}$')
+AADHAAR_PATTERN = re.compile(r'^\d{12}$')
+
 def is_valid_pan(pan):
     """Validate PAN number using a simple regex (example format: ABCDE1234F)."""
-    pan_pattern = r'^[A-Z]{5}[0-9]{4}[A-Z]{1}$'
-    return re.match(pan_pattern, pan) is not None
+    return PAN_PATTERN.match(pan) is not None
 
 def is_valid_aadhaar(aadhaar):
     """Validate Aadhaar number using a simple regex (12 digits)."""
-    aadhaar_pattern = r'^\d{12}$'
-    return re.match(aadhaar_pattern, aadhaar) is not None
+    return AADHAAR_PATTERN.match(aadhaar) is not None
 
 # --- User Management Functions ---
 
@@ -112,191 +239,259 @@ def add_user(username, password, email, phone_number, pan=None, aadhaar=None, ro
     if aadhaar and not is_valid_aadhaar(aadhaar):
         return "Invalid Aadhaar format."
 
-    conn = create_connection()
-    if conn:
-        try:
-            created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    try:
+        created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        password_hash = hashing.hash_password(password)
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''INSERT INTO users (username, password_hash, email, phone_number, pan, aadhaar, role, created_at)
                              VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', 
                            (username, password_hash, email, phone_number, pan, aadhaar, role, created_at))
+            bump_versions(cursor, user_scope(cursor.lastrowid, 'profile'))
             conn.commit()
             return True
-        except Error as e:
-            return str(e)
-        finally:
-            if conn: conn.close()
+    except Error as e:
+        return str(e)
             
 def get_all_users():
     """Retrieve all users (Admin)."""
-    conn = create_connection()
     users = []
-    if conn:
-        try:
+    try:
+        with get_read_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT * FROM users;")
+            cursor.execute("SELECT * FROM users ORDER BY user_id;")
             users = cursor.fetchall()
-        except Error as e:
-            print(f"Error while fetching users: {e}")
-        finally:
-            conn.close()
+    except Error as e:
+        print(f"Error while fetching users: {e}")
     return users
             
 def get_user_by_id(user_id):
     """Retrieve a user by their user_id."""
-    conn = create_connection()
     user = None
-    if conn:
-        try:
+    try:
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''SELECT * FROM users WHERE user_id = ?;''', (user_id,))
             user = cursor.fetchone()
-        except Error as e:
-            print(f"Error while fetching user: {e}")
-        finally:
-            conn.close()
+    except Error as e:
+        print(f"Error while fetching user: {e}")
+    return user
+
+# The cache may be shared between processes (cache.db), so cached profiles
+# never carry the password hash; authentication reads users uncached.
+@cache.cached('user', ttl=60)
+def get_user_profile(user_id):
+    """Retrieve a user's profile (every column except password_hash)."""
+    user = None
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''SELECT user_id, username, email, phone_number, pan, aadhaar, role, created_at
+                              FROM users WHERE user_id = ?;''', (user_id,))
+            user = cursor.fetchone()
+    except Error as e:
+        print(f"Error while fetching user: {e}")
     return user
     
 def get_user_by_username(username):
     """Retrieve a user by their username."""
-    conn = create_connection()
     user = None
-    if conn:
-        try:
+    try:
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''SELECT * FROM users WHERE username = ?;''', (username,))
             user = cursor.fetchone()
-        except Error as e:
-            print(f"Error while fetching user: {e}")
-        finally:
-            conn.close()
+    except Error as e:
+        print(f"Error while fetching user: {e}")
     return user
 
+def update_user(user_id, email=None, phone_number=None):
+    """Update a user's contact details."""
+    updates = {}
+    
+    if email:
+        updates['email'] = email
+    if phone_number:
+        updates['phone_number'] = phone_number
+        
+    if not updates:
+        return "No fields to update."
+    
+    sql, params = queries.update_statement('users.update', updates)
+    params.append(user_id)
+    
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, tuple(params))
+            changed = cursor.rowcount > 0
+            if changed:
+                bump_versions(cursor, user_scope(user_id, 'profile'))
+            conn.commit()
+            cache.invalidate('user', user_id)
+            return changed
+    except Error as e:
+        return str(e)
+
 def check_password(user, password):
     """Check if the provided password matches the stored password."""
     if not user:
         return False
-    stored_hash = user['password_hash'].encode('utf-8') if isinstance(user['password_hash'], str) else user['password_hash']
-    return bcrypt.checkpw(password.encode('utf-8'), stored_hash)
+    return hashing.verify_password(password, user['password_hash'])
+
+def update_password(user_id, password):
+    """Re-hash a user's password with the current bcrypt cost and store it."""
+    try:
+        password_hash = hashing.hash_password(password)
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE users SET password_hash = ? WHERE user_id = ?;", (password_hash, user_id))
+            changed = cursor.rowcount > 0
+            if changed:
+                bump_versions(cursor, user_scope(user_id, 'profile'))
+            conn.commit()
+            cache.invalidate('user', user_id)
+            return changed
+    except Error as e:
+        return str(e)
 
 # --- Utility Management Functions (CRUD) ---
 def add_utility(name, description, provider_name):
     """Add a utility to the utilities table."""
-    conn = create_connection()
-    if conn:
-        try:
+    try:
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''INSERT INTO utilities (name, description, provider_name, created_at)
                              VALUES (?, ?, ?, ?)''', 
                            (name, description, provider_name, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            bump_versions(cursor, 'utilities')
             conn.commit()
+            cache.invalidate_namespace('utilities')
             return cursor.lastrowid
-        except Error as e:
-            return None
-        finally:
-            if conn: conn.close()
+    except Error as e:
+        return None
 
+@cache.cached('utilities', ttl=300)
 def get_all_utilities():
     """Retrieve all utilities."""
-    conn = create_connection()
     utilities = []
-    if conn:
-        try:
+    try:
+        with get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT * FROM utilities;")
+            cursor.execute("SELECT * FROM utilities ORDER BY utility_id;")
             utilities = cursor.fetchall()
-        except Error as e:
-            print(f"Error while fetching utilities: {e}")
-        finally:
-            conn.close()
+    except Error as e:
+        print(f"Error while fetching utilities: {e}")
     return utilities
 
+@cache.cached('utility', ttl=300)
 def get_utility_by_id(utility_id):
     """Retrieve a utility by its ID."""
-    conn = create_connection()
     utility = None
-    if conn:
-        try:
+    try:
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''SELECT * FROM utilities WHERE utility_id = ?;''', (utility_id,))
             utility = cursor.fetchone()
-        except Error as e:
-            print(f"Error while fetching utility: {e}")
-        finally:
-            conn.close()
+    except Error as e:
+        print(f"Error while fetching utility: {e}")
     return utility
 
 def update_utility(utility_id, name=None, description=None, provider_name=None):
     """Update utility details."""
-    conn = create_connection()
-    if conn:
-        try:
-            updates = []
-            params = []
-            
-            if name:
-                updates.append("name = ?")
-                params.append(name)
-            if description:
-                updates.append("description = ?")
-                params.append(description)
-            if provider_name:
-                updates.append("provider_name = ?")
-                params.append(provider_name)
-                
-            if not updates:
-                return "No fields to update."
-            
-            sql = f"UPDATE utilities SET {', '.join(updates)} WHERE utility_id = ?"
-            params.append(utility_id)
-            
+    updates = {}
+    
+    if name:
+        updates['name'] = name
+    if description:
+        updates['description'] = description
+    if provider_name:
+        updates['provider_name'] = provider_name
+        
+    if not updates:
+        return "No fields to update."
+    
+    sql, params = queries.update_statement('utilities.update', updates)
+    params.append(utility_id)
+    
+    try:
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute(sql, tuple(params))
+            changed = cursor.rowcount > 0
+            if changed:
+                bump_versions(cursor, 'utilities')
             conn.commit()
-            return cursor.rowcount > 0
-        except Error as e:
-            return str(e)
-        finally:
-            if conn: conn.close()
+            cache.invalidate_namespace('utilities')
+            cache.invalidate('utility', utility_id)
+            return changed
+    except Error as e:
+        return str(e)
             
 def delete_utility(utility_id):
     """Delete a utility."""
-    conn = create_connection()
-    if conn:
-        try:
+    try:
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("DELETE FROM utilities WHERE utility_id = ?;", (utility_id,))
+            changed = cursor.rowcount > 0
+            if changed:
+                bump_versions(cursor, 'utilities')
             conn.commit()
-            return cursor.rowcount > 0
-        except Error as e:
-            return str(e)
-        finally:
-            if conn: conn.close()
+            cache.invalidate_namespace('utilities')
+            cache.invalidate('utility', utility_id)
+            return changed
+    except Error as e:
+        return str(e)
+
+def set_tariff(utility_id, unit_rate, fixed_charge=0.0, tax_rate=0.0):
+    """Create or replace the billing tariff of a utility (used by resources/billing.py)."""
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''INSERT INTO tariffs (utility_id, fixed_charge, unit_rate, tax_rate, updated_at)
+                              VALUES (?, ?, ?, ?, ?)
+                              ON CONFLICT(utility_id) DO UPDATE SET fixed_charge = excluded.fixed_charge,
+                                  unit_rate = excluded.unit_rate, tax_rate = excluded.tax_rate,
+                                  updated_at = excluded.updated_at;''',
+                           (utility_id, fixed_charge, unit_rate, tax_rate, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            conn.commit()
+            return True
+    except Error as e:
+        return str(e)
+
+def get_tariffs():
+    """Retrieve every tariff."""
+    tariffs = []
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM tariffs ORDER BY utility_id;")
+            tariffs = cursor.fetchall()
+    except Error as e:
+        print(f"Error while fetching tariffs: {e}")
+    return tariffs
 
 # --- Bill Management Functions (CRUD) ---
 def add_bill(user_id, utility_id, amount, due_date):
     """Add a bill for a user."""
-    conn = create_connection()
-    if conn:
-        try:
+    try:
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''INSERT INTO bills (user_id, utility_id, amount, due_date, status, created_at)
                              VALUES (?, ?, ?, ?, ?, ?)''', 
                            (user_id, utility_id, amount, due_date, 'pending', datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            bump_versions(cursor, 'bills', user_scope(user_id, 'bills'))
             conn.commit()
             return cursor.lastrowid
-        except Error as e:
-            return None
-        finally:
-            if conn: conn.close()
+    except Error as e:
+        return None
             
 def get_all_bills():
     """Retrieve all bills, joining with user and utility names."""
-    conn = create_connection()
     bills = []
-    if conn:
-        try:
+    try:
+        with get_read_connection() as conn:
             cursor = conn.cursor()
             sql = '''
             SELECT 
@@ -311,18 +506,15 @@ def get_all_bills():
             '''
             cursor.execute(sql)
             bills = cursor.fetchall()
-        except Error as e:
-            print(f"Error fetching all bills: {e}")
-        finally:
-            conn.close()
+    except Error as e:
+        print(f"Error fetching all bills: {e}")
     return bills
 
 def get_all_payments():
     """Retrieve all payments, joining with user and bill details."""
-    conn = create_connection()
     payments = []
-    if conn:
-        try:
+    try:
+        with get_read_connection() as conn:
             cursor = conn.cursor()
             sql = '''
             SELECT 
@@ -334,258 +526,848 @@ def get_all_payments():
             JOIN users u ON p.user_id = u.user_id
             JOIN bills b ON p.bill_id = b.bill_id
             JOIN utilities util ON b.utility_id = util.utility_id
-            ORDER BY p.transaction_date DESC;
+            ORDER BY p.transaction_date DESC, p.payment_id DESC;
             '''
             cursor.execute(sql)
             payments = cursor.fetchall()
-        except Error as e:
-            print(f"Error fetching all payments: {e}")
-        finally:
-            conn.close()
+    except Error as e:
+        print(f"Error fetching all payments: {e}")
     return payments
 
+# --- Filtered / Keyset-Paginated Admin Listings ---
+
+BILL_LIST_SQL = '''
+    SELECT 
+        b.*, 
+        u.username AS username, 
+        util.name AS utility_name,
+        util.provider_name AS provider_name
+    FROM bills b
+    JOIN users u ON b.user_id = u.user_id
+    JOIN utilities util ON b.utility_id = util.utility_id
+'''
+
+PAYMENT_LIST_SQL = '''
+    SELECT 
+        p.*, 
+        u.username AS username, 
+        b.amount AS bill_amount,
+        util.name AS utility_name
+    FROM payments p
+    JOIN users u ON p.user_id = u.user_id
+    JOIN bills b ON p.bill_id = b.bill_id
+    JOIN utilities util ON b.utility_id = util.utility_id
+'''
+
+def build_bill_filters(filters):
+    """Translate admin filters into WHERE clauses on bills (b)."""
+    filters = filters or {}
+    clauses, params = [], []
+    if filters.get('user_id') is not None:
+        clauses.append("b.user_id = ?")
+        params.append(filters['user_id'])
+    if filters.get('utility_id') is not None:
+        clauses.append("b.utility_id = ?")
+        params.append(filters['utility_id'])
+    if filters.get('status'):
+        clauses.append("b.status = ?")
+        params.append(filters['status'])
+    if filters.get('date_from'):
+        clauses.append("b.due_date >= ?")
+        params.append(filters['date_from'])
+    if filters.get('date_to'):
+        clauses.append("b.due_date <= ?")
+        params.append(filters['date_to'])
+    return clauses, params
+
+def build_payment_filters(filters):
+    """Translate admin filters into WHERE clauses on payments (p)."""
+    filters = filters or {}
+    clauses, params = [], []
+    if filters.get('user_id') is not None:
+        clauses.append("p.user_id = ?")
+        params.append(filters['user_id'])
+    if filters.get('utility_id') is not None:
+        clauses.append("b.utility_id = ?")
+        params.append(filters['utility_id'])
+    if filters.get('status'):
+        clauses.append("p.status = ?")
+        params.append(filters['status'])
+    if filters.get('date_from'):
+        clauses.append("p.transaction_date >= ?")
+        params.append(filters['date_from'])
+    if filters.get('date_to'):
+        # transaction_date carries a time; the upper bound is the whole day
+        clauses.append("p.transaction_date < date(?, '+1 day')")
+        params.append(filters['date_to'])
+    return clauses, params
+
+def _fetch_keyset_page(sql, clauses, params, date_col, id_col, after, limit):
+    if after is not None:
+        last_date, last_id = after
+        clauses = clauses + [f"{date_col} <= ? AND ({date_col} < ? OR {id_col} < ?)"]
+        params = params + [last_date, last_date, last_id]
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += f" ORDER BY {date_col} DESC, {id_col} DESC LIMIT ?;"
+
+    with get_read_connection() as conn:
+        cursor = tuple_cursor(conn)
+        # One extra row tells us whether there is a next page
+        cursor.execute(sql, tuple(params) + (limit + 1,))
+        rows = fetch_rowset(cursor)
+    more = len(rows.rows) > limit
+    rows.rows = rows.rows[:limit]
+    return rows, more
+
+def _last_key(rows, date_col, id_col):
+    last = rows.rows[-1]
+    return [last[rows.index(date_col)], last[rows.index(id_col)]]
+
+def get_bills_page(filters=None, after=None, limit=100):
+    """Retrieve one page of bills ordered by (due_date, bill_id) descending.
+
+    Returns (rows, next_key); rows is a RowSet of tuples and next_key is the
+    sort key to pass as ``after`` for the following page, or None on the last page.
+    """
+    try:
+        clauses, params = build_bill_filters(filters)
+        rows, more = _fetch_keyset_page(BILL_LIST_SQL, clauses, params, "b.due_date", "b.bill_id", after, limit)
+        next_key = _last_key(rows, 'due_date', 'bill_id') if more else None
+        return rows, next_key
+    except Error as e:
+        print(f"Error fetching bills page: {e}")
+        return [], None
+
+def get_payments_page(filters=None, after=None, limit=100):
+    """Retrieve one page of payments ordered by (transaction_date, payment_id) descending."""
+    try:
+        clauses, params = build_payment_filters(filters)
+        rows, more = _fetch_keyset_page(PAYMENT_LIST_SQL, clauses, params, "p.transaction_date", "p.payment_id", after, limit)
+        next_key = _last_key(rows, 'transaction_date', 'payment_id') if more else None
+        return rows, next_key
+    except Error as e:
+        print(f"Error fetching payments page: {e}")
+        return [], None
+
+def _iter_batches(sql, clauses, params, batch_size):
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    # No ORDER BY: sorting would force SQLite to materialize the whole result
+    with _read_pool().checkout() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql, tuple(params))
+        # Columns go out first, even when no row matches
+        yield [d[0] for d in cursor.description]
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+
+def iter_bill_batches(filters=None, batch_size=None):
+    """Yield the column names, then batches of filtered bills straight from the cursor."""
+    clauses, params = build_bill_filters(filters)
+    return _iter_batches(BILL_LIST_SQL, clauses, params, batch_size or EXPORT_BATCH_SIZE)
+
+def iter_payment_batches(filters=None, batch_size=None):
+    """Yield the column names, then batches of filtered payments straight from the cursor."""
+    clauses, params = build_payment_filters(filters)
+    return _iter_batches(PAYMENT_LIST_SQL, clauses, params, batch_size or EXPORT_BATCH_SIZE)
+
 def get_bill_by_id(bill_id):
     """Retrieve a bill by its ID."""
-    conn = create_connection()
     bill = None
-    if conn:
-        try:
+    try:
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''SELECT * FROM bills WHERE bill_id = ?;''', (bill_id,))
             bill = cursor.fetchone()
-        except Error as e:
-            print(f"Error while fetching bill: {e}")
-        finally:
-            conn.close()
+    except Error as e:
+        print(f"Error while fetching bill: {e}")
     return bill
 
 def get_bills_by_user(user_id, status=None):
-    """Retrieve all bills for a specific user, including utility name and provider."""
-    conn = create_connection()
+    """Retrieve all bills for a specific user (as a RowSet), including utility name and provider."""
     bills = []
-    if conn:
-        try:
-            cursor = conn.cursor()
-            
-            # **UPDATED SQL QUERY with JOIN:**
+    try:
+        with get_read_connection(user_id) as conn:
+            cursor = tuple_cursor(conn)
             # Joins 'bills' (b) with 'utilities' (u) to get utility details.
-            sql = '''SELECT 
-                         b.*, 
-                         u.name AS utility_name, 
-                         u.provider_name AS provider_name
-                     FROM bills b
-                     JOIN utilities u ON b.utility_id = u.utility_id
-                     WHERE b.user_id = ?
-            '''
-            params = [user_id]
-            
             if status:
-                sql += " AND b.status = ?"
-                params.append(status)
-                
-            sql += " ORDER BY b.due_date ASC;"
-
-            cursor.execute(sql, tuple(params))
-            bills = cursor.fetchall()
+                cursor.execute(queries.BILLS_BY_USER_STATUS, (user_id, status))
+            else:
+                cursor.execute(queries.BILLS_BY_USER, (user_id,))
+            bills = fetch_rowset(cursor)
             
-        except Error as e:
-            print(f"Error while fetching bills for user {user_id}: {e}")
-        finally:
-            conn.close()
+    except Error as e:
+        print(f"Error while fetching bills for user {user_id}: {e}")
     return bills
 
 def update_bill(bill_id, amount=None, due_date=None, status=None):
     """Update bill details."""
-    conn = create_connection()
-    if conn:
-        try:
-            updates = []
-            params = []
-            
-            if amount is not None:
-                updates.append("amount = ?")
-                params.append(amount)
-            if due_date:
-                updates.append("due_date = ?")
-                params.append(due_date)
-            if status:
-                updates.append("status = ?")
-                params.append(status)
-                
-            if not updates:
-                return "No fields to update."
-            
-            sql = f"UPDATE bills SET {', '.join(updates)} WHERE bill_id = ?"
-            params.append(bill_id)
-            
+    updates = {}
+    
+    if amount is not None:
+        updates['amount'] = amount
+    if due_date:
+        updates['due_date'] = due_date
+    if status:
+        updates['status'] = status
+        
+    if not updates:
+        return "No fields to update."
+    
+    sql, params = queries.update_statement('bills.update', updates)
+    params.append(bill_id)
+    
+    try:
+        with get_connection() as conn:
             cursor = conn.cursor()
+            owner = _bill_owner(cursor, bill_id)
+            if owner is None:
+                return False
             cursor.execute(sql, tuple(params))
+            changed = cursor.rowcount > 0
+            if changed:
+                bump_versions(cursor, 'bills', user_scope(owner, 'bills'))
             conn.commit()
-            return cursor.rowcount > 0
-        except Error as e:
-            return str(e)
-        finally:
-            if conn: conn.close()
+            return changed
+    except Error as e:
+        return str(e)
 
 def delete_bill(bill_id):
     """Delete a bill."""
-    conn = create_connection()
-    if conn:
-        try:
+    try:
+        with get_connection() as conn:
             cursor = conn.cursor()
+            owner = _bill_owner(cursor, bill_id)
+            if owner is None:
+                return False
             cursor.execute("DELETE FROM bills WHERE bill_id = ?;", (bill_id,))
+            changed = cursor.rowcount > 0
+            if changed:
+                bump_versions(cursor, 'bills', user_scope(owner, 'bills'))
             conn.commit()
-            return cursor.rowcount > 0
-        except Error as e:
-            return str(e)
-        finally:
-            if conn: conn.close()
+            return changed
+    except Error as e:
+        return str(e)
 
 # --- Payment Management Functions ---
 def add_payment(bill_id, user_id, amount, payment_method):
     """Record a payment and update the corresponding bill status."""
-    conn = create_connection()
-    if conn:
-        try:
-            transaction_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            cursor = conn.cursor()
-            
-            # 1. Insert payment
-            cursor.execute('''INSERT INTO payments (bill_id, user_id, amount, payment_method, transaction_date)
-                             VALUES (?, ?, ?, ?, ?)''', 
-                           (bill_id, user_id, amount, payment_method, transaction_date))
+    try:
+        with get_connection() as conn:
+            try:
+                transaction_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                cursor = conn.cursor()
+                
+                # 1. Insert payment
+                cursor.execute('''INSERT INTO payments (bill_id, user_id, amount, payment_method, transaction_date)
+                                 VALUES (?, ?, ?, ?, ?)''', 
+                               (bill_id, user_id, amount, payment_method, transaction_date))
+                payment_id = cursor.lastrowid
 
-            # 2. Update bill status
-            update_bill(bill_id, status='paid')
-            
-            conn.commit()
-            return cursor.lastrowid
-        except Error as e:
-            conn.rollback()
-            return str(e)
-        finally:
-            if conn: conn.close()
+                # 2. Update bill status (same connection, same transaction)
+                cursor.execute("UPDATE bills SET status = 'paid' WHERE bill_id = ?;", (bill_id,))
+                bump_versions(cursor, 'bills', 'payments', user_scope(user_id, 'bills'), user_scope(user_id, 'payments'))
+                
+                conn.commit()
+                return payment_id
+            except Error:
+                conn.rollback()
+                raise
+    except Error as e:
+        return str(e)
 
 # --- NEW BATCH PAYMENT FUNCTIONS ---
 
-def add_batch_payment(user_id, bill_ids, payment_method):
-    """Process a batch payment for a list of bill IDs, update their status, and create payment records."""
-    conn = create_connection()
-    if conn:
-        try:
+IDEMPOTENCY_TTL_HOURS = int(os.environ.get("IDEMPOTENCY_TTL_HOURS", "24"))
+IDEMPOTENCY_CONFLICT = "Idempotency key was already used with a different request."
+
+def _batch_request_hash(bill_ids, payment_method):
+    body = json.dumps({'bill_ids': sorted(bill_ids), 'payment_method': payment_method}, separators=(',', ':'))
+    return hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+def add_batch_payment(user_id, bill_ids, payment_method, idempotency_key=None):
+    """Pay several bills for one user in a single IMMEDIATE transaction.
+
+    Payments are written set-based (INSERT ... SELECT / UPDATE ... WHERE bill_id
+    IN (...)) in chunks of up to queries.MAX_IN_BUCKET ids. With an idempotency key, a
+    retried request returns the stored outcome instead of paying twice.
+
+    Bills with a queued payment job (POST /api/payments) are left to that
+    job and reported as in_progress.
+
+    Returns (True, outcomes, replayed) where outcomes holds one dict per
+    requested bill with an 'outcome' of paid / already_paid / in_progress /
+    not_found / not_owned, or (error_message, [], False).
+    """
+    unique_ids = list(dict.fromkeys(int(b) for b in bill_ids))
+    if not unique_ids:
+        return "No bill IDs given.", [], False
+    request_hash = _batch_request_hash(unique_ids, payment_method)
+
+    try:
+        with get_connection() as conn:
             cursor = conn.cursor()
-            transaction_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            payment_records = []
-            bill_ids_tuple = tuple(bill_ids)
+            cursor.execute("BEGIN IMMEDIATE;")
+            try:
+                if idempotency_key:
+                    cursor.execute('''SELECT request_hash, response FROM idempotency_keys
+                                      WHERE user_id = ? AND idempotency_key = ?;''', (user_id, idempotency_key))
+                    stored = cursor.fetchone()
+                    if stored:
+                        conn.rollback()
+                        if stored['request_hash'] != request_hash:
+                            return IDEMPOTENCY_CONFLICT, [], False
+                        return True, json.loads(stored['response']), True
 
-            # Fetch the bills to get the amounts and ensure they belong to the user and are pending
-            sql_fetch_bills = f'''
-                SELECT bill_id, amount
-                FROM bills
-                WHERE user_id = ? AND status = 'pending' AND bill_id IN ({','.join(['?'] * len(bill_ids_tuple))})
-            '''
-            params = [user_id] + list(bill_ids_tuple)
+                # 1. Classify every requested bill
+                found = {}
+                for chunk in queries.chunks(unique_ids):
+                    cursor.execute(*queries.in_statement('bills.classify', chunk))
+                    for row in cursor.fetchall():
+                        found[row['bill_id']] = row
 
-            cursor.execute(sql_fetch_bills, tuple(params))
-            pending_bills = cursor.fetchall()
+                candidates = [b for b in unique_ids
+                              if b in found and found[b]['user_id'] == user_id and found[b]['status'] == 'pending']
+                queued = set()
+                for chunk in queries.chunks(candidates):
+                    cursor.execute(*queries.in_statement('payment_jobs.open_for_bills', chunk))
+                    queued.update(row['bill_id'] for row in cursor.fetchall())
+                payable = [b for b in candidates if b not in queued]
 
-            if not pending_bills:
-                return "No pending bills found for the user with the given IDs.", []
+                # 2. Insert payments and mark bills paid, set-based per chunk.
+                # We hold the write lock, so every payment_id above the current max is ours.
+                transaction_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                cursor.execute("SELECT COALESCE(MAX(payment_id), 0) FROM payments;")
+                last_payment_id = cursor.fetchone()[0]
+                for chunk in queries.chunks(payable):
+                    sql, ids = queries.in_statement('payments.insert_for_bills', chunk)
+                    cursor.execute(sql, [payment_method, transaction_date] + ids)
+                    cursor.execute(*queries.in_statement('bills.mark_paid', chunk))
 
-            processed_bill_ids = []
+                cursor.execute("SELECT payment_id, bill_id FROM payments WHERE payment_id > ?;", (last_payment_id,))
+                payment_ids = {row['bill_id']: row['payment_id'] for row in cursor.fetchall()}
 
-            # Insert payment for each bill and update their status
-            for bill in pending_bills:
-                bill_id = bill['bill_id']
-                amount = bill['amount']
+                # 3. Per-bill outcomes
+                outcomes = []
+                for bill_id in unique_ids:
+                    bill = found.get(bill_id)
+                    if bill is None:
+                        outcomes.append({'bill_id': bill_id, 'outcome': 'not_found'})
+                    elif bill['user_id'] != user_id:
+                        outcomes.append({'bill_id': bill_id, 'outcome': 'not_owned'})
+                    elif bill_id in payment_ids:
+                        outcomes.append({'bill_id': bill_id, 'outcome': 'paid', 'payment_id': payment_ids[bill_id],
+                                         'amount': bill['amount'], 'transaction_date': transaction_date})
+                    elif bill_id in queued:
+                        outcomes.append({'bill_id': bill_id, 'outcome': 'in_progress'})
+                    else:
+                        outcomes.append({'bill_id': bill_id, 'outcome': 'already_paid'})
 
-                # Insert payment record
-                cursor.execute('''
-                    INSERT INTO payments (bill_id, user_id, amount, payment_method, status, transaction_date)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (bill_id, user_id, amount, payment_method, 'completed', transaction_date))
+                if payable:
+                    bump_versions(cursor, 'bills', 'payments', user_scope(user_id, 'bills'), user_scope(user_id, 'payments'))
 
-                payment_records.append(cursor.lastrowid)
-                processed_bill_ids.append(bill_id)
+                if idempotency_key:
+                    cursor.execute('''INSERT INTO idempotency_keys (user_id, idempotency_key, request_hash, response, created_at)
+                                      VALUES (?, ?, ?, ?, ?);''',
+                                   (user_id, idempotency_key, request_hash, json.dumps(outcomes), transaction_date))
+                    cursor.execute("DELETE FROM idempotency_keys WHERE created_at < datetime('now', 'localtime', ?);",
+                                   (f"-{IDEMPOTENCY_TTL_HOURS} hours",))
 
-                # Update bill status to 'paid'
-                cursor.execute('''
-                    UPDATE bills SET status = 'paid' WHERE bill_id = ?
-                ''', (bill_id,))
+                conn.commit()
+                return True, outcomes, False
+            except Exception:
+                conn.rollback()
+                raise
+    except Exception as e:
+        return str(e), [], False
 
+
+# --- Payment Job Queue (see resources/payment_queue.py) ---
+
+def enqueue_payment_job(bill_id, user_id, amount, payment_method):
+    """Queue a payment for asynchronous processing.
+
+    A bill has at most one open (pending / processing) job. Returns
+    (job_id, True) for a new job, (existing job_id, False) when the bill
+    already has one, or (None, False) on error.
+    """
+    try:
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute('''INSERT INTO payment_jobs (bill_id, user_id, amount, payment_method, status, created_at, updated_at)
+                                 VALUES (?, ?, ?, ?, 'pending', ?, ?)''',
+                               (bill_id, user_id, amount, payment_method, now, now))
+                conn.commit()
+                return cursor.lastrowid, True
+            except IntegrityError:
+                conn.rollback()
+                cursor.execute('''SELECT job_id FROM payment_jobs
+                                  WHERE bill_id = ? AND status IN ('pending', 'processing');''', (bill_id,))
+                row = cursor.fetchone()
+                if row is None:
+                    raise
+                return row['job_id'], False
+    except Error as e:
+        print(f"Error while queueing payment: {e}")
+        return None, False
+
+def claim_payment_job():
+    """Atomically move the oldest pending job to 'processing' and return it (or None)."""
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE;")
+            try:
+                cursor.execute("SELECT * FROM payment_jobs WHERE status = 'pending' ORDER BY job_id LIMIT 1;")
+                job = cursor.fetchone()
+                if job is None:
+                    conn.rollback()
+                    return None
+                cursor.execute('''UPDATE payment_jobs SET status = 'processing', attempts = attempts + 1, updated_at = ?
+                                  WHERE job_id = ?;''', (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), job['job_id']))
+                conn.commit()
+                job = dict(job)
+                job['attempts'] += 1
+                return job
+            except Error:
+                conn.rollback()
+                raise
+    except Error as e:
+        print(f"Error while claiming payment job: {e}")
+        return None
+
+def complete_payment_job(job_id, gateway_reference):
+    """Record the payment for a charged job, mark its bill paid and the job completed.
+
+    Returns (payment_id, None), or (None, error). When the job is gone or its
+    bill is no longer pending, the job is marked failed here.
+    """
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE;")
+            try:
+                now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                cursor.execute("SELECT * FROM payment_jobs WHERE job_id = ?;", (job_id,))
+                job = cursor.fetchone()
+                if job is None:
+                    conn.rollback()
+                    return None, f"Payment job {job_id} not found."
+                # Re-check under the write lock: the bill may have been paid since the job was claimed
+                cursor.execute("SELECT status FROM bills WHERE bill_id = ?;", (job['bill_id'],))
+                bill = cursor.fetchone()
+                if bill is None or bill['status'] != 'pending':
+                    error = f"Bill is no longer payable; gateway charge {gateway_reference} was not recorded."
+                    cursor.execute('''UPDATE payment_jobs SET status = 'failed', gateway_reference = ?, error = ?, updated_at = ?
+                                      WHERE job_id = ?;''', (gateway_reference, error, now, job_id))
+                    conn.commit()
+                    return None, error
+                cursor.execute('''INSERT INTO payments (bill_id, user_id, amount, payment_method, status, transaction_date)
+                                 VALUES (?, ?, ?, ?, 'completed', ?)''',
+                               (job['bill_id'], job['user_id'], job['amount'], job['payment_method'], now))
+                payment_id = cursor.lastrowid
+                cursor.execute("UPDATE bills SET status = 'paid' WHERE bill_id = ?;", (job['bill_id'],))
+                bump_versions(cursor, 'bills', 'payments', user_scope(job['user_id'], 'bills'), user_scope(job['user_id'], 'payments'))
+                cursor.execute('''UPDATE payment_jobs SET status = 'completed', payment_id = ?, gateway_reference = ?,
+                                         error = NULL, updated_at = ?
+                                  WHERE job_id = ?;''', (payment_id, gateway_reference, now, job_id))
+                conn.commit()
+                return payment_id, None
+            except Error:
+                conn.rollback()
+                raise
+    except Error as e:
+        print(f"Error while completing payment job {job_id}: {e}")
+        return None, None
+
+def fail_payment_job(job_id, error, retry=False):
+    """Mark a job failed, or put it back to 'pending' when it should be retried."""
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''UPDATE payment_jobs SET status = ?, error = ?, updated_at = ? WHERE job_id = ?;''',
+                           ('pending' if retry else 'failed', error, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), job_id))
+            conn.commit()
+            return cursor.rowcount > 0
+    except Error as e:
+        return str(e)
+
+def requeue_stale_payment_jobs(older_than_seconds):
+    """Return jobs stuck in 'processing' (e.g. after a worker crash) to the queue."""
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''UPDATE payment_jobs SET status = 'pending', updated_at = datetime('now', 'localtime')
+                              WHERE status = 'processing' AND updated_at < datetime('now', 'localtime', ?);''',
+                           (f"-{int(older_than_seconds)} seconds",))
             conn.commit()
-            return True, processed_bill_ids
-        except Exception as e:
-            conn.rollback()
-            return str(e), []
-        finally:
-            if conn: conn.close()
+            return cursor.rowcount
+    except Error as e:
+        print(f"Error while requeueing payment jobs: {e}")
+        return 0
 
+def get_payment_job(job_id):
+    """Retrieve a payment job by its ID."""
+    job = None
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM payment_jobs WHERE job_id = ?;", (job_id,))
+            job = cursor.fetchone()
+    except Error as e:
+        print(f"Error while fetching payment job: {e}")
+    return job
 
 def get_recent_payments_by_user(user_id, limit=5):
     """Retrieve the most recent payments for a user, including utility name and provider."""
-    conn = create_connection()
     payments = []
-    if conn:
-        try:
+    try:
+        with get_read_connection(user_id) as conn:
             cursor = conn.cursor()
-            sql = '''
-            SELECT 
-                p.*, 
-                u.username AS username, 
-                b.due_date AS bill_due_date,
-                util.name AS utility_name,
-                util.provider_name AS provider_name
-            FROM payments p
-            JOIN users u ON p.user_id = u.user_id
-            JOIN bills b ON p.bill_id = b.bill_id
-            JOIN utilities util ON b.utility_id = util.utility_id
-            WHERE p.user_id = ?
-            ORDER BY p.transaction_date DESC
-            LIMIT ?;
-            '''
-            cursor.execute(sql, (user_id, limit))
+            cursor.execute(queries.RECENT_PAYMENTS_BY_USER, (user_id, limit))
             payments = cursor.fetchall()
-        except Error as e:
-            print(f"Error fetching payments for user {user_id}: {e}")
-        finally:
-            conn.close()
+    except Error as e:
+        print(f"Error fetching payments for user {user_id}: {e}")
     return payments
             
 # --- Reminder Functions ---
 def add_reminder(user_id, message, reminder_date):
     """Add a reminder for a user."""
-    conn = create_connection()
-    if conn:
-        try:
+    try:
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''INSERT INTO reminders (user_id, message, reminder_date, created_at)
                              VALUES (?, ?, ?, ?)''', 
                            (user_id, message, reminder_date, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            bump_versions(cursor, user_scope(user_id, 'reminders'))
             conn.commit()
             return cursor.lastrowid
-        except Error as e:
-            return None
-        finally:
-            if conn: conn.close()
+    except Error as e:
+        return None
             
 def get_reminders_by_user(user_id):
     """Retrieve all reminders for a specific user."""
-    conn = create_connection()
     reminders = []
-    if conn:
-        try:
+    try:
+        with get_read_connection(user_id) as conn:
             cursor = conn.cursor()
             # Select reminders that are in the future or today
             today = datetime.now().strftime('%Y-%m-%d')
-            cursor.execute('''SELECT * FROM reminders WHERE user_id = ? AND reminder_date >= ? ORDER BY reminder_date ASC;''', (user_id, today))
+            cursor.execute(queries.UPCOMING_REMINDERS_BY_USER, (user_id, today))
             reminders = cursor.fetchall()
-        except Error as e:
-            print(f"Error while fetching reminders for user {user_id}: {e}")
-        finally:
-            conn.close()
+    except Error as e:
+        print(f"Error while fetching reminders for user {user_id}: {e}")
     return reminders
 
+# --- Scheduled Reminders ---
+#
+# resources/reminder_scheduler.py calls generate_due_reminders() and then
+# drains the dispatch queue (get_dispatchable_reminders ->
+# mark_reminders_dispatched / record_reminder_failures). Progress is kept in
+# scheduler_checkpoints so each run only looks at bills it has not seen yet.
+
+REMINDER_MESSAGE_SQL = "util.name || ' bill of Rs. ' || printf('%.2f', b.amount) || ' due on ' || b.due_date"
+
+def get_checkpoint(name, default=None):
+    """Read a scheduler checkpoint value."""
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT value FROM scheduler_checkpoints WHERE name = ?;", (name,))
+            row = cursor.fetchone()
+            return row['value'] if row else default
+    except Error as e:
+        print(f"Error reading checkpoint {name}: {e}")
+        return default
+
+def set_checkpoint(cursor, name, value):
+    """Write a scheduler checkpoint (call inside the caller's transaction)."""
+    cursor.execute('''INSERT INTO scheduler_checkpoints (name, value, updated_at) VALUES (?, ?, ?)
+                      ON CONFLICT(name) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at;''',
+                   (name, str(value), datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+
+def generate_due_reminders(days_ahead, lead_days, today=None):
+    """Create one reminder per pending bill due within days_ahead of today.
+
+    Set-based and incremental: one INSERT ... SELECT over the due_date range
+    the previous run had not reached yet (idx_bills_status_due), and one over
+    bills added since the previous run (bill_id range) whose due date falls in
+    the window already covered. idx_reminders_bill makes both INSERT OR IGNORE,
+    so bills that already have a reminder are skipped. Each reminder is dated
+    lead_days before the bill is due, or today if that has passed.
+    Returns the number of reminders created, or None on error.
+    """
+    today = today or datetime.now().strftime('%Y-%m-%d')
+    start = date.fromisoformat(today)
+    horizon = (start + timedelta(days=days_ahead)).isoformat()
+    yesterday = (start - timedelta(days=1)).isoformat()
+    insert_sql = f'''INSERT OR IGNORE INTO reminders (user_id, bill_id, message, reminder_date, created_at)
+                     SELECT b.user_id, b.bill_id, {REMINDER_MESSAGE_SQL}, MAX(date(b.due_date, ?), ?), ?
+                     FROM bills b JOIN utilities util ON b.utility_id = util.utility_id
+                     WHERE b.status = 'pending' AND {{window}};'''
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE;")
+            cursor.execute("SELECT name, value FROM scheduler_checkpoints WHERE name IN ('reminders.due_through', 'reminders.last_bill_id');")
+            checkpoints = {row['name']: row['value'] for row in cursor.fetchall()}
+            # Everything due up to due_through already had its chance; never look back past today
+            due_through = max(checkpoints.get('reminders.due_through', yesterday), yesterday)
+            last_bill_id = int(checkpoints.get('reminders.last_bill_id', 0))
+            cursor.execute("SELECT COALESCE(MAX(bill_id), 0) AS max_bill_id FROM bills;")
+            max_bill_id = cursor.fetchone()['max_bill_id']
+            cursor.execute("SELECT COALESCE(MAX(reminder_id), 0) AS max_reminder_id FROM reminders;")
+            before = cursor.fetchone()['max_reminder_id']
+
+            base = (f'-{lead_days} days', today, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            created = 0
+            if horizon > due_through:
+                cursor.execute(insert_sql.format(window="b.due_date > ? AND b.due_date <= ?"),
+                               base + (due_through, horizon))
+                created += cursor.rowcount
+            if max_bill_id > last_bill_id:
+                cursor.execute(insert_sql.format(window="b.bill_id > ? AND b.bill_id <= ? AND b.due_date >= ? AND b.due_date <= ?"),
+                               base + (last_bill_id, max_bill_id, today, min(due_through, horizon)))
+                created += cursor.rowcount
+
+            if created:
+                cursor.execute("SELECT DISTINCT user_id FROM reminders WHERE reminder_id > ?;", (before,))
+                bump_versions(cursor, *[user_scope(row['user_id'], 'reminders') for row in cursor.fetchall()])
+            set_checkpoint(cursor, 'reminders.due_through', max(due_through, horizon))
+            set_checkpoint(cursor, 'reminders.last_bill_id', max_bill_id)
+            conn.commit()
+            return created
+    except Error as e:
+        print(f"Error generating reminders: {e}")
+        return None
+
+def get_dispatchable_reminders(today=None, after=None, limit=500, max_attempts=5):
+    """Reminders that are due to be sent, oldest first, with the recipient's contact details.
+
+    Keyset pagination on (reminder_date, reminder_id) through the
+    idx_reminders_undispatched partial index; pass the last row's key as
+    after to continue.
+    """
+    today = today or datetime.now().strftime('%Y-%m-%d')
+    clauses = ["r.dispatched_at IS NULL", "r.dispatch_error IS NULL", "r.reminder_date <= ?", "r.dispatch_attempts < ?"]
+    params = [today, max_attempts]
+    if after is not None:
+        clauses.append("(r.reminder_date, r.reminder_id) > (?, ?)")
+        params.extend(after)
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''SELECT r.reminder_id, r.user_id, r.bill_id, r.message, r.reminder_date, r.dispatch_attempts,
+                                      u.username, u.email, u.phone_number
+                               FROM reminders r JOIN users u ON r.user_id = u.user_id
+                               WHERE {" AND ".join(clauses)}
+                               ORDER BY r.reminder_date, r.reminder_id
+                               LIMIT ?;''', params + [limit])
+            return [dict(row) for row in cursor.fetchall()]
+    except Error as e:
+        print(f"Error fetching reminders to dispatch: {e}")
+        return []
+
+def mark_reminders_dispatched(reminder_ids):
+    """Record reminders as sent. Returns the number updated, or None on error."""
+    if not reminder_ids:
+        return 0
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE;")
+            updated = 0
+            user_ids = set()
+            for chunk in queries.chunks(reminder_ids):
+                cursor.execute(*queries.in_statement('reminders.owners', chunk))
+                user_ids.update(row['user_id'] for row in cursor.fetchall())
+                sql, ids = queries.in_statement('reminders.mark_dispatched', chunk)
+                cursor.execute(sql, [now] + ids)
+                updated += cursor.rowcount
+            bump_versions(cursor, *[user_scope(user_id, 'reminders') for user_id in user_ids])
+            conn.commit()
+            return updated
+    except Error as e:
+        print(f"Error marking reminders dispatched: {e}")
+        return None
+
+def record_reminder_failures(failures, max_attempts):
+    """Count a failed send for each (reminder_id, error) pair.
+
+    A reminder that reaches max_attempts keeps the error and leaves the
+    dispatch queue; otherwise it is retried on a later run.
+    """
+    if not failures:
+        return 0
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''UPDATE reminders
+                                  SET dispatch_attempts = dispatch_attempts + 1,
+                                      dispatch_error = CASE WHEN dispatch_attempts + 1 >= ? THEN ? ELSE NULL END
+                                  WHERE reminder_id = ? AND dispatched_at IS NULL;''',
+                               [(max_attempts, error, reminder_id) for reminder_id, error in failures])
+            conn.commit()
+            return len(failures)
+    except Error as e:
+        print(f"Error recording reminder failures: {e}")
+        return None
+
+
+# --- Balances ---
+#
+# user_balances / user_utility_balances are kept current by triggers on bills
+# and payments (see migrations.BALANCE_TRIGGERS), so these reads never scan a
+# user's bills. Only the overdue count depends on today's date; it is a range
+# count on idx_bills_user_status_due.
+
+def _read_balance(cursor, user_id, today):
+    cursor.execute(queries.USER_BALANCE, (user_id,))
+    row = cursor.fetchone()
+    balance = dict(row) if row else {'bill_count': 0, 'pending_count': 0, 'pending_total': 0.0,
+                                     'paid_total': 0.0, 'last_payment_date': None}
+    cursor.execute(queries.USER_OVERDUE_COUNT, (user_id, today))
+    balance['overdue_count'] = cursor.fetchone()['overdue_count']
+    balance['pending_total'] = round(balance['pending_total'], 2)
+    balance['paid_total'] = round(balance['paid_total'], 2)
+    return balance
+
+def get_user_balance(user_id):
+    """What a user owes: totals, overdue count, last payment date and per-utility totals.
+
+    Returns None when the user does not exist.
+    """
+    today = datetime.now().strftime('%Y-%m-%d')
+    try:
+        with get_read_connection(user_id) as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN;")
+            try:
+                cursor.execute("SELECT 1 FROM users WHERE user_id = ?;", (user_id,))
+                if cursor.fetchone() is None:
+                    return None
+                balance = _read_balance(cursor, user_id, today)
+                cursor.execute(queries.USER_UTILITY_BALANCES, (user_id,))
+                balance['utilities'] = [dict(row) for row in cursor.fetchall() if row['bill_count']]
+            finally:
+                conn.rollback()  # read-only: just end the snapshot
+        balance['user_id'] = user_id
+        return balance
+    except Error as e:
+        print(f"Error while fetching balance for user {user_id}: {e}")
+        return None
+
+def get_top_balances(limit=100):
+    """Users with the largest pending totals, largest first (RowSet)."""
+    try:
+        with get_read_connection() as conn:
+            cursor = tuple_cursor(conn)
+            cursor.execute('''SELECT ub.user_id, u.username, ub.pending_count, ROUND(ub.pending_total, 2) AS pending_total,
+                                     ROUND(ub.paid_total, 2) AS paid_total, ub.last_payment_date
+                              FROM user_balances ub JOIN users u ON ub.user_id = u.user_id
+                              WHERE ub.pending_total > 0
+                              ORDER BY ub.pending_total DESC
+                              LIMIT ?;''', (limit,))
+            return fetch_rowset(cursor)
+    except Error as e:
+        print(f"Error while fetching top balances: {e}")
+        return None
+
+
+# --- Dashboard ---
+
+def get_dashboard(user_id, recent_payment_limit=5):
+    """Everything the home page needs for one user, read in a single transaction.
+
+    Returns a dict with the profile (without password hash), pending/paid bill
+    partitions, server-side totals, upcoming reminders and recent payments, or
+    None when the user does not exist.
+    """
+    today = datetime.now().strftime('%Y-%m-%d')
+    try:
+        with get_read_connection(user_id) as conn:
+            cursor = conn.cursor()
+            # One snapshot for all reads: a payment landing mid-request cannot
+            # make the bill lists and the totals disagree.
+            cursor.execute("BEGIN;")
+            try:
+                cursor.execute('''SELECT user_id, username, email, phone_number, pan, aadhaar, role, created_at
+                                  FROM users WHERE user_id = ?;''', (user_id,))
+                user = cursor.fetchone()
+                if user is None:
+                    return None
+
+                cursor.execute('''SELECT b.*, u.name AS utility_name, u.provider_name AS provider_name
+                                  FROM bills b
+                                  JOIN utilities u ON b.utility_id = u.utility_id
+                                  WHERE b.user_id = ?
+                                  ORDER BY b.due_date ASC;''', (user_id,))
+                bills = [dict(row) for row in cursor.fetchall()]
+
+                balance = _read_balance(cursor, user_id, today)
+                totals = {'total_due': balance['pending_total'], 'pending_count': balance['pending_count'],
+                          'overdue_count': balance['overdue_count'], 'total_paid': balance['paid_total']}
+
+                cursor.execute('''SELECT * FROM reminders WHERE user_id = ? AND reminder_date >= ?
+                                  ORDER BY reminder_date ASC;''', (user_id, today))
+                reminders = [dict(row) for row in cursor.fetchall()]
+
+                cursor.execute('''SELECT p.*, b.due_date AS bill_due_date,
+                                         util.name AS utility_name, util.provider_name AS provider_name
+                                  FROM payments p
+                                  JOIN bills b ON p.bill_id = b.bill_id
+                                  JOIN utilities util ON b.utility_id = util.utility_id
+                                  WHERE p.user_id = ?
+                                  ORDER BY p.transaction_date DESC, p.payment_id DESC
+                                  LIMIT ?;''', (user_id, recent_payment_limit))
+                recent_payments = [dict(row) for row in cursor.fetchall()]
+            finally:
+                conn.rollback()  # read-only: just end the snapshot
+
+        return {
+            'user': dict(user),
+            'pending_bills': [b for b in bills if b['status'] == 'pending'],
+            'paid_bills': [b for b in bills if b['status'] == 'paid'],
+            'totals': totals,
+            'reminders': reminders,
+            'recent_payments': recent_payments,
+        }
+    except Error as e:
+        print(f"Error while building dashboard for user {user_id}: {e}")
+        return None
+
+# --- Session Token Revocation ---
+def add_revoked_token(jti, expires_at):
+    """Record a revoked token id and purge revocations that have expired."""
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''INSERT INTO revoked_tokens (jti, expires_at) VALUES (?, ?)
+                              ON CONFLICT(jti) DO UPDATE SET expires_at = excluded.expires_at;''', (jti, expires_at))
+            cursor.execute("DELETE FROM revoked_tokens WHERE expires_at < ?;", (int(datetime.now().timestamp()),))
+            conn.commit()
+            return True
+    except Error as e:
+        return str(e)
+
+def get_revoked_tokens(now):
+    """Retrieve every revoked token id that has not expired yet (None if the lookup failed)."""
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT jti, expires_at FROM revoked_tokens WHERE expires_at >= ?;", (now,))
+            return cursor.fetchall()
+    except Error as e:
+        print(f"Error while fetching revoked tokens: {e}")
+        return None
+
 
 # --- Dummy Data Insertion ---
 
@@ -593,18 +1375,15 @@ def insert_dummy_data():
     """Insert dummy data for testing purposes."""
     
     # Check if data already exists to avoid duplication
-    conn = create_connection()
-    if conn:
-        try:
+    try:
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT COUNT(*) FROM users;")
             if cursor.fetchone()[0] > 0:
                 print("Dummy data already exists. Skipping insertion.")
                 return
-        except Error:
-            pass
-        finally:
-            conn.close()
+    except Error:
+        pass
 
     print("Inserting dummy data...")
 
@@ -619,6 +1398,11 @@ def insert_dummy_data():
     add_utility("Water", "Municipal water supply.", "BWSSB")
     add_utility("Gas", "Piped natural gas supply.", "Adani Gas")
 
+    # Tariffs for the monthly billing cycle (resources/billing.py)
+    set_tariff(1, unit_rate=7.5, fixed_charge=50.0, tax_rate=0.05)
+    set_tariff(2, unit_rate=0.05, fixed_charge=20.0)
+    set_tariff(3, unit_rate=45.0, fixed_charge=30.0, tax_rate=0.05)
+
     # Bills:
     # User 1 (john_doe) - Bill 1: PENDING (for testing the fix)
     add_bill(1, 1, 120.50, "2025-12-10") # Electricity
@@ -646,10 +1430,9 @@ def insert_dummy_data():
 # --- Utility Functions for Admin/Debug ---
 def fetch_all_data():
     """Retrieve all data from all tables (Admin/Debug)."""
-    conn = create_connection()
     users, utilities, bills, reminders, payments = [], [], [], [], []
-    if conn:
-        try:
+    try:
+        with get_read_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM users;")
             users = cursor.fetchall()
@@ -668,10 +1451,8 @@ def fetch_all_data():
             reminders = [dict(row) for row in reminders]
             payments = [dict(row) for row in payments]
             return users, utilities, bills, reminders, payments
-        except Error as e:
-            print(f"Error while fetching data: {e}")
-        finally:
-            conn.close()
+    except Error as e:
+        print(f"Error while fetching data: {e}")
     return users, utilities, bills, reminders, payments
 
 if __name__ == "__main__":
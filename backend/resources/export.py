@@ -0,0 +1,59 @@
+import csv
+import io
+import zlib
+
+from resources.serialization import dumps_json
+
+# --- Streaming Export Encoders ---
+#
+# Each encoder turns a batch stream - the column names first, then lists of
+# rows, as produced by database.iter_bill_batches / iter_payment_batches -
+# into an iterator of byte chunks, one chunk per batch. Only one batch is ever
+# held in memory. A stream with no rows still yields its columns, so a CSV
+# export of an empty result carries its header.
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def ndjson_chunks(batches):
+    """Encode batches as newline-delimited JSON objects."""
+    batches = iter(batches)
+    columns = next(batches, None)
+    for rows in batches:
+        yield b''.join(dumps_json(dict(zip(columns, row))) + b'\n' for row in rows)
+
+
+def csv_chunks(batches):
+    """Encode batches as CSV with a single header row."""
+    batches = iter(batches)
+    columns = next(batches, None)
+    if columns is None:
+        return
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue().encode('utf-8')
+    for rows in batches:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerows(tuple(row) for row in rows)
+        yield buffer.getvalue().encode('utf-8')
+
+
+def gzip_chunks(chunks, level=6):
+    """Compress a chunk stream into a single gzip member, incrementally."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def encode(batches, fmt, compress=False):
+    """Return a byte-chunk iterator for the requested format."""
+    chunks = csv_chunks(batches) if fmt == 'csv' else ndjson_chunks(batches)
+    return gzip_chunks(chunks) if compress else chunks
@@ -0,0 +1,89 @@
+import importlib
+import os
+import random
+import threading
+import time
+import uuid
+
+# --- Payment Gateway Interface ---
+#
+# Workers in resources/payment_queue.py call get_gateway().charge(...) for each
+# queued payment. PAYMENT_GATEWAY selects the implementation: "mock" (default)
+# or a "module:ClassName" path to any class implementing PaymentGateway.
+
+
+class GatewayResult:
+    """Outcome of a gateway charge."""
+
+    def __init__(self, success, reference=None, error=None, retryable=False):
+        self.success = success
+        self.reference = reference
+        self.error = error
+        self.retryable = retryable
+
+
+class PaymentGateway:
+    """Interface every gateway implementation provides."""
+
+    def charge(self, job, idempotency_key):
+        """Charge job['amount'] for job['bill_id'] / job['user_id'] and return a GatewayResult.
+
+        A retried charge carries the same idempotency_key and must not charge again.
+        """
+        raise NotImplementedError
+
+
+class MockGateway(PaymentGateway):
+    """Local stand-in for a real gateway with configurable latency and failure rates.
+
+    GATEWAY_LATENCY_MS       mean latency per charge (uniform +/- 50%)
+    GATEWAY_FAILURE_RATE     fraction of charges that are declined (permanent)
+    GATEWAY_TIMEOUT_RATE     fraction of charges that time out (retryable)
+    """
+
+    def __init__(self, latency_ms=None, failure_rate=None, timeout_rate=None, seed=None):
+        self.latency_ms = float(os.environ.get("GATEWAY_LATENCY_MS", "200") if latency_ms is None else latency_ms)
+        self.failure_rate = float(os.environ.get("GATEWAY_FAILURE_RATE", "0") if failure_rate is None else failure_rate)
+        self.timeout_rate = float(os.environ.get("GATEWAY_TIMEOUT_RATE", "0") if timeout_rate is None else timeout_rate)
+        self._random = random.Random(seed)
+        self._charged = {}  # idempotency_key -> reference of the successful charge
+        self._lock = threading.Lock()
+
+    def charge(self, job, idempotency_key):
+        with self._lock:
+            reference = self._charged.get(idempotency_key)
+        if reference is not None:
+            return GatewayResult(True, reference=reference)
+        if self.latency_ms > 0:
+            time.sleep(self._random.uniform(0.5, 1.5) * self.latency_ms / 1000.0)
+        roll = self._random.random()
+        if roll < self.timeout_rate:
+            return GatewayResult(False, error="Gateway timed out.", retryable=True)
+        if roll < self.timeout_rate + self.failure_rate:
+            return GatewayResult(False, error="Payment declined by gateway.")
+        reference = f"mock_{uuid.uuid4().hex[:16]}"
+        with self._lock:
+            self._charged[idempotency_key] = reference
+        return GatewayResult(True, reference=reference)
+
+
+_gateway = None
+
+
+def get_gateway():
+    """Return the configured gateway instance (created once per process)."""
+    global _gateway
+    if _gateway is None:
+        name = os.environ.get("PAYMENT_GATEWAY", "mock")
+        if name == "mock":
+            _gateway = MockGateway()
+        else:
+            module_name, _, class_name = name.partition(':')
+            _gateway = getattr(importlib.import_module(module_name), class_name)()
+    return _gateway
+
+
+def set_gateway(gateway):
+    """Swap the gateway implementation (e.g. for load tests)."""
+    global _gateway
+    _gateway = gateway
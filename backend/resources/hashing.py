@@ -0,0 +1,188 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from itertools import repeat
+
+import bcrypt
+
+# --- Password Hashing Pipeline ---
+#
+# bcrypt is deliberately CPU-expensive. Running it on the request thread holds
+# the GIL for the whole hash, so a burst of logins stalls every other endpoint.
+# Hashes run in a small process pool instead, with a bounded number of jobs
+# admitted at once; callers past that limit get HashingBusy and the API answers
+# 503 + Retry-After rather than queueing unbounded work. A job holds its slot
+# until the worker process finishes it, even when the caller gave up waiting
+# after HASH_TIMEOUT (which also answers HashingBusy).
+
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.environ.get("HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+HASH_QUEUE_LIMIT = int(os.environ.get("HASH_QUEUE_LIMIT", str(max(1, HASH_WORKERS) * 4)))
+HASH_TIMEOUT = float(os.environ.get("HASH_TIMEOUT", "10"))
+RETRY_AFTER_SECONDS = 1
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing queue is full and the caller should retry later."""
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(HASH_QUEUE_LIMIT)
+
+_metrics_lock = threading.Lock()
+_metrics = {
+    'hash': {'count': 0, 'total_time': 0.0, 'max_time': 0.0},
+    'verify': {'count': 0, 'total_time': 0.0, 'max_time': 0.0},
+    'rejected': 0,
+    'timed_out': 0,
+    'in_flight': 0,
+}
+
+
+# --- Worker functions (run inside the process pool) ---
+
+def _hashpw(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+
+
+def _checkpw(password, stored_hash):
+    return bcrypt.checkpw(password, stored_hash)
+
+
+# --- Dispatch ---
+
+def _get_executor():
+    global _executor
+    if HASH_WORKERS <= 0:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            # spawn: forking a multi-threaded server process is not safe
+            _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS,
+                                            mp_context=multiprocessing.get_context('spawn'))
+        return _executor
+
+
+def _finish(op, started):
+    elapsed = time.perf_counter() - started
+    _slots.release()
+    with _metrics_lock:
+        _metrics['in_flight'] -= 1
+        stats = _metrics[op]
+        stats['count'] += 1
+        stats['total_time'] += elapsed
+        stats['max_time'] = max(stats['max_time'], elapsed)
+
+
+def _run(op, func, *args):
+    if not _slots.acquire(blocking=False):
+        with _metrics_lock:
+            _metrics['rejected'] += 1
+        raise HashingBusy("Password hashing queue is full.")
+    with _metrics_lock:
+        _metrics['in_flight'] += 1
+    started = time.perf_counter()
+    executor = _get_executor()
+    if executor is None:
+        try:
+            return func(*args)
+        finally:
+            _finish(op, started)
+    try:
+        future = executor.submit(func, *args)
+    except BaseException:
+        _finish(op, started)
+        raise
+    # The slot is freed when the worker is done, not when this caller stops waiting
+    future.add_done_callback(lambda _: _finish(op, started))
+    try:
+        return future.result(timeout=HASH_TIMEOUT)
+    except FutureTimeout:
+        with _metrics_lock:
+            _metrics['timed_out'] += 1
+        raise HashingBusy("Password hashing timed out.")
+
+
+def hash_password(password, rounds=None):
+    """Hash a password with the configured bcrypt cost and return it as text."""
+    rounds = rounds or BCRYPT_ROUNDS
+    return _run('hash', _hashpw, password.encode('utf-8'), rounds).decode('utf-8')
+
+
+def hash_passwords(passwords, rounds=None, executor=None):
+    """Hash many passwords in parallel for offline bulk loads.
+
+    Bypasses the request admission limit, so never call it from a request
+    thread. Pass a dedicated executor to use more processes than HASH_WORKERS.
+    """
+    rounds = rounds or BCRYPT_ROUNDS
+    encoded = [p.encode('utf-8') for p in passwords]
+    executor = executor or _get_executor()
+    if executor is None:
+        hashes = [_hashpw(p, rounds) for p in encoded]
+    else:
+        hashes = executor.map(_hashpw, encoded, repeat(rounds), chunksize=max(1, len(encoded) // 64))
+    with _metrics_lock:
+        _metrics['hash']['count'] += len(encoded)
+    return [h.decode('utf-8') for h in hashes]
+
+
+def new_bulk_executor(workers=None):
+    """A process pool for hash_passwords sized for a one-off import (defaults to every CPU)."""
+    return ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1,
+                               mp_context=multiprocessing.get_context('spawn'))
+
+
+def verify_password(password, stored_hash):
+    """Check a password against a stored bcrypt hash."""
+    if isinstance(stored_hash, str):
+        stored_hash = stored_hash.encode('utf-8')
+    return _run('verify', _checkpw, password.encode('utf-8'), stored_hash)
+
+
+def get_cost(stored_hash):
+    """Return the cost factor encoded in a bcrypt hash ($2b$<cost>$...)."""
+    if isinstance(stored_hash, bytes):
+        stored_hash = stored_hash.decode('utf-8')
+    try:
+        return int(stored_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def needs_rehash(stored_hash):
+    """True when a stored hash was made with a different cost than BCRYPT_ROUNDS."""
+    return get_cost(stored_hash) != BCRYPT_ROUNDS
+
+
+def get_metrics():
+    """Return hash/verify counts and latencies plus queue state."""
+    with _metrics_lock:
+        snapshot = {
+            'rejected': _metrics['rejected'],
+            'timed_out': _metrics['timed_out'],
+            'in_flight': _metrics['in_flight'],
+            'queue_limit': HASH_QUEUE_LIMIT,
+            'workers': HASH_WORKERS,
+            'rounds': BCRYPT_ROUNDS,
+        }
+        for op in ('hash', 'verify'):
+            stats = _metrics[op]
+            snapshot[op] = {
+                'count': stats['count'],
+                'avg_ms': round(stats['total_time'] / stats['count'] * 1000, 2) if stats['count'] else 0.0,
+                'max_ms': round(stats['max_time'] * 1000, 2),
+            }
+    return snapshot
+
+
+def shutdown():
+    """Stop the hashing workers (used on server shutdown)."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
@@ -0,0 +1,400 @@
+import bisect
+import cProfile
+import functools
+import inspect
+import io
+import os
+import pstats
+import threading
+import time
+from collections import deque
+
+from flask import g, has_request_context, make_response, request
+
+from resources import engines
+from resources import queries
+
+try:
+    import pyinstrument
+except ImportError:  # optional: cProfile is always available
+    pyinstrument = None
+
+# --- Request Instrumentation ---
+#
+# install() wires up, for one Flask app:
+#
+#   spans          every resources.database function, every SQL statement
+#                  (by verb), JSON / MessagePack encoding and row_to_dict are
+#                  timed into the app_span_seconds histogram; each response
+#                  carries a Server-Timing header (db, sql, encode, total)
+#   request hooks  http_requests_total / http_request_duration_seconds per
+#                  method and URL rule
+#   slow queries   statements slower than SLOW_QUERY_MS are printed with the
+#                  count and types of their parameters (never the values:
+#                  those include password hashes and personal data) and kept
+#                  in a ring buffer (admin metrics)
+#   GET /metrics   everything above in the Prometheus text format, for admins
+#                  or scrapers sending "Authorization: Bearer $METRICS_TOKEN"
+#   profiling      an admin request with "X-Profile: cprofile" (or
+#                  "pyinstrument", if installed) gets the profile of its own
+#                  handling back instead of the normal body
+#
+# Metrics are per process: under gunicorn each worker counts its own
+# requests, and a scrape through the shared port reaches one of them.
+
+INSTRUMENTATION = os.environ.get("INSTRUMENTATION", "1") == "1"
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_LOG_SIZE = int(os.environ.get("SLOW_QUERY_LOG_SIZE", "100"))
+# Functions listed in a cProfile report, and where to keep the raw .prof files (optional)
+PROFILE_TOP = int(os.environ.get("PROFILE_TOP", "40"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "")
+# Bearer token a Prometheus scraper sends to GET /metrics (unset: admins only)
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+PROFILE_HEADER = 'X-Profile'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# --- Metrics ---
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels(self.labelnames, labels)} {value}" for labels, value in values]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [count per bucket..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    def render(self):
+        with self._lock:
+            values = sorted((labels, list(state)) for labels, state in self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, state in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), state):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {state[-1]:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """The process's metrics, plus collectors that report gauges at scrape time."""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help, labelnames=()):
+        self._metrics.append(Counter(name, help, labelnames))
+        return self._metrics[-1]
+
+    def histogram(self, name, help, labelnames=(), buckets=BUCKETS):
+        self._metrics.append(Histogram(name, help, labelnames, buckets))
+        return self._metrics[-1]
+
+    def collector(self, collect):
+        """Register collect() -> [(name, type, help, {labels tuple: value} or value)]."""
+        self._collectors.append(collect)
+        return collect
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        for collect in self._collectors:
+            try:
+                families = collect()
+            except Exception as e:
+                print(f"Error collecting metrics: {e}")
+                continue
+            for name, kind, help, values in families:
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                if not isinstance(values, dict):
+                    values = {(): values}
+                lines += [f"{name}{_labels([k for k, _ in labels], [v for _, v in labels])} {value}"
+                          for labels, value in values.items() if value is not None]
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+REQUESTS = registry.counter('http_requests_total', 'Requests served.', ('method', 'endpoint', 'status'))
+REQUEST_SECONDS = registry.histogram('http_request_duration_seconds', 'Time to build each response.',
+                                     ('method', 'endpoint'))
+SPAN_SECONDS = registry.histogram('app_span_seconds', 'Time inside instrumented code (database functions, SQL, encoding).',
+                                  ('span',))
+SLOW_QUERIES = registry.counter('db_slow_queries_total', 'Statements slower than SLOW_QUERY_MS.')
+
+
+# --- Spans ---
+
+_local = threading.local()
+
+
+def _add_timing(category, seconds):
+    """Add to the current request's Server-Timing breakdown (if any)."""
+    if has_request_context():
+        timings = g.get('_timings')
+        if timings is not None:
+            timings[category] = timings.get(category, 0.0) + seconds
+
+
+def timed(name, category=None):
+    """Decorator: time each call into the span histogram.
+
+    With a category, the outermost call on the thread also counts towards the
+    request's Server-Timing entry, so nested calls are not counted twice.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not INSTRUMENTATION:
+                return func(*args, **kwargs)
+            depth = getattr(_local, 'depth', 0)
+            _local.depth = depth + 1
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                _local.depth = depth
+                SPAN_SECONDS.observe((name,), elapsed)
+                if category and depth == 0:
+                    _add_timing(category, elapsed)
+        wrapper.instrumented = True
+        return wrapper
+    return decorator
+
+
+class span:
+    """Context manager timing a block: with instrumentation.span('encode', 'encode'): ..."""
+
+    def __init__(self, name, category=None):
+        self.name, self.category = name, category
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if INSTRUMENTATION:
+            elapsed = time.perf_counter() - self.started
+            SPAN_SECONDS.observe((self.name,), elapsed)
+            if self.category:
+                _add_timing(self.category, elapsed)
+
+
+def instrument_module(module, prefix):
+    """Replace every function defined in module with a timed one (spans '<prefix>.<name>')."""
+    count = 0
+    for name, func in list(vars(module).items()):
+        if (not inspect.isfunction(func) or func.__module__ != module.__name__
+                or getattr(func, 'instrumented', False) or inspect.isgeneratorfunction(func)):
+            continue
+        setattr(module, name, timed(f"{prefix}.{name}", prefix)(func))
+        count += 1
+    return count
+
+
+# --- SQL Statements and the Slow Query Log ---
+
+_slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+
+
+@functools.lru_cache(maxsize=2048)
+def _statement_span(sql):
+    verb = sql.lstrip().split(None, 1)[0].lower() if sql.strip() else ''
+    return f"sql.{verb}" if verb in ('select', 'insert', 'update', 'delete', 'with', 'begin') else 'sql.other'
+
+
+def _describe_parameters(parameters):
+    """Count and types of the bound parameters, e.g. '3 (int, str, NoneType)'; never their values."""
+    if parameters is None:
+        return '(executemany)'
+    if isinstance(parameters, dict):
+        parameters = list(parameters.values())
+    types = dict.fromkeys(type(value).__name__ for value in parameters)
+    return f"{len(parameters)} ({', '.join(types)})" if types else '0'
+
+
+def observe_statement(sql, parameters, seconds):
+    """engines statement observer: time the statement and log it if slow."""
+    SPAN_SECONDS.observe((_statement_span(sql),), seconds)
+    _add_timing('sql', seconds)
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        statement = ' '.join(sql.split())
+        entry = {'ms': round(seconds * 1000, 2), 'sql': statement, 'parameters': _describe_parameters(parameters),
+                 'at': time.strftime('%Y-%m-%d %H:%M:%S'),
+                 'endpoint': request.endpoint if has_request_context() else None}
+        _slow_queries.append(entry)
+        SLOW_QUERIES.inc()
+        print(f"Slow query ({entry['ms']} ms): {statement} -- parameters {entry['parameters']}")
+
+
+def get_slow_queries():
+    """The most recent slow statements, newest first."""
+    return list(reversed(_slow_queries))
+
+
+# --- Flask Hooks ---
+
+_profile_lock = threading.Lock()
+
+
+def _server_timing(timings, total):
+    entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings.items()]
+    return ', '.join(entries + [f"total;dur={total * 1000:.2f}"])
+
+
+def install(app, database=None, is_admin=None):
+    """Instrument a Flask app (and the resources.database module, if given)."""
+    if not INSTRUMENTATION:
+        return
+    if database is not None:
+        instrument_module(database, 'db')
+        # The pool captured the original factory at import time
+        database.pool.factory = database.create_connection
+        registry.collector(lambda: _pool_metrics(database.get_pool_metrics()))
+    registry.collector(lambda: _statement_cache_metrics(queries.get_cache_metrics()))
+    engines.set_statement_observer(observe_statement)
+
+    @app.before_request
+    def start_timing():
+        g._started = time.perf_counter()
+        g._timings = {}
+        mode = request.headers.get(PROFILE_HEADER)
+        if mode and is_admin is not None and is_admin():
+            _start_profile(mode.lower())
+
+    @app.after_request
+    def record_timing(response):
+        started = g.get('_started')
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUESTS.inc((request.method, endpoint, str(response.status_code)))
+        REQUEST_SECONDS.observe((request.method, endpoint), elapsed)
+        response.headers['Server-Timing'] = _server_timing(g.get('_timings') or {}, elapsed)
+        if g.get('_profile_busy'):
+            response.headers[PROFILE_HEADER] = 'busy'
+        if g.get('_profiler') is not None:
+            response = _profile_response(response)
+        return response
+
+    @app.teardown_request
+    def stop_profile(exc=None):
+        # A request that failed before after_request still frees the profiler
+        if g.get('_profiler') is not None:
+            _stop_profiler(g.pop('_profiler'))
+
+
+def _pool_metrics(stats):
+    return [
+        ('db_pool_connections', 'gauge', 'Pooled database connections by state.',
+         {(('state', 'in_use'),): stats['in_use'], (('state', 'idle'),): stats['idle']}),
+        ('db_pool_max_size', 'gauge', 'Connection pool capacity.', stats['max_size']),
+        ('db_pool_checkouts_total', 'counter', 'Connections checked out of the pool.', stats['checkouts']),
+        ('db_pool_waits_total', 'counter', 'Checkouts that had to wait for a connection.', stats['waits']),
+        ('db_pool_wait_seconds_total', 'counter', 'Time spent waiting for a connection.', round(stats['wait_time'], 6)),
+        ('db_pool_timeouts_total', 'counter', 'Checkouts that gave up waiting.', stats['timeouts']),
+        ('db_pool_created_total', 'counter', 'Connections opened.', stats['created']),
+    ]
+
+
+def _statement_cache_metrics(stats):
+    statements = stats['statements']
+    return [
+        ('db_statement_cache_hits_total', 'counter', 'Statements found compiled in the connection cache.',
+         {(('statement', name),): s['hits'] for name, s in statements.items()}),
+        ('db_statement_cache_misses_total', 'counter', 'Statements compiled (or prepared) again.',
+         {(('statement', name),): s['misses'] for name, s in statements.items()}),
+        ('db_statement_cache_evictions_total', 'counter', 'Compiled statements pushed out of a full cache.',
+         stats['evictions']),
+        ('db_statement_cache_size', 'gauge', 'Compiled statements kept per connection.', stats['size']),
+    ]
+
+
+# --- On-demand Profiling ---
+
+def _start_profile(mode):
+    # One profiled request at a time per process; others are served normally
+    if not _profile_lock.acquire(blocking=False):
+        g._profile_busy = True
+        return
+    if mode == 'pyinstrument' and pyinstrument is not None:
+        profiler = pyinstrument.Profiler()
+        profiler.start()
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    g._profiler = profiler
+
+
+def _stop_profiler(profiler):
+    try:
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+        else:
+            profiler.stop()
+    finally:
+        _profile_lock.release()
+
+
+def _profile_response(response):
+    """Replace the response with the request's profile (its status goes in X-Profiled-Status)."""
+    profiler = g.pop('_profiler')
+    _stop_profiler(profiler)
+    if isinstance(profiler, cProfile.Profile):
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_TOP)
+        body, mimetype = out.getvalue(), 'text/plain'
+        if PROFILE_DIR:
+            path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{request.endpoint}-{os.getpid()}.prof")
+            profiler.dump_stats(path)
+            body = f"Saved {path}\n\n{body}"
+    else:
+        body, mimetype = profiler.output_html(), 'text/html'
+    profiled = make_response(body, 200)
+    profiled.mimetype = mimetype
+    profiled.headers['X-Profiled-Status'] = str(response.status_code)
+    profiled.headers['Server-Timing'] = response.headers.get('Server-Timing', '')
+    # The real response may hold a streamed body (exports) or a pooled connection
+    response.close()
+    return profiled
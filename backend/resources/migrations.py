@@ -0,0 +1,484 @@
+import sys
+from datetime import datetime
+
+from resources import queries
+
+# --- Versioned Schema Migrations ---
+#
+# Each migration is (version, description, [statements]). Migrations are only
+# ever appended: a deployed database is brought forward by running the
+# versions it has not seen yet, never by dropping and recreating tables.
+# Statements are SQLite SQL, which the engine translates (resources/engines.py);
+# where that is not enough (triggers) an entry is {dialect: [statements]}.
+
+# --- Balance Summaries ---
+#
+# user_balances / user_utility_balances hold each user's bill totals so a
+# balance read is one primary-key lookup. Triggers keep them current for every
+# writer (API, billing runs, bulk loads, payment workers); REBUILD_BALANCES
+# recomputes them from bills and payments (python -m resources.balances).
+
+def _balance_upsert(table, keys, row, sign, dialect='sqlite'):
+    """One UPSERT adding (sign '') or removing (sign '-') a bill row's contribution."""
+    key_list = ', '.join(keys)
+    # SQLite adds a comparison as 0/1; PostgreSQL needs the CASE
+    is_pending = (f"({row}.status = 'pending')" if dialect == 'sqlite'
+                  else f"(CASE WHEN {row}.status = 'pending' THEN 1 ELSE 0 END)")
+    return f'''INSERT INTO {table} ({key_list}, bill_count, pending_count, pending_total, paid_total)
+                VALUES ({', '.join(f'{row}.{key}' for key in keys)}, {sign}1,
+                        {sign}{is_pending},
+                        {sign}(CASE WHEN {row}.status = 'pending' THEN {row}.amount ELSE 0 END),
+                        {sign}(CASE WHEN {row}.status = 'paid' THEN {row}.amount ELSE 0 END))
+                ON CONFLICT({key_list}) DO UPDATE SET
+                    bill_count = {table}.bill_count + excluded.bill_count,
+                    pending_count = {table}.pending_count + excluded.pending_count,
+                    pending_total = ROUND({table}.pending_total + excluded.pending_total, 2),
+                    paid_total = ROUND({table}.paid_total + excluded.paid_total, 2);'''
+
+
+def _balance_upserts(row, sign, dialect='sqlite'):
+    return (_balance_upsert('user_balances', ['user_id'], row, sign, dialect) + '\n' +
+            _balance_upsert('user_utility_balances', ['user_id', 'utility_id'], row, sign, dialect))
+
+
+def _pg_trigger(name, table, events, body):
+    """A PostgreSQL row trigger: its PL/pgSQL function, then the trigger itself."""
+    return [f'''CREATE OR REPLACE FUNCTION {name}() RETURNS trigger LANGUAGE plpgsql AS $$
+                BEGIN
+                    {body}
+                    RETURN NULL;
+                END $$;''',
+            f"DROP TRIGGER IF EXISTS {name} ON {table};",
+            f"CREATE TRIGGER {name} AFTER {events} ON {table} FOR EACH ROW EXECUTE FUNCTION {name}();"]
+
+
+BALANCE_TRIGGERS = [
+    f'''CREATE TRIGGER IF NOT EXISTS trg_bills_balance_insert AFTER INSERT ON bills BEGIN
+            {_balance_upserts('NEW', '')}
+        END;''',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_bills_balance_update AFTER UPDATE OF user_id, utility_id, amount, status ON bills BEGIN
+            {_balance_upserts('OLD', '-')}
+            {_balance_upserts('NEW', '')}
+        END;''',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_bills_balance_delete AFTER DELETE ON bills BEGIN
+            {_balance_upserts('OLD', '-')}
+        END;''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_payments_balance_insert AFTER INSERT ON payments BEGIN
+            INSERT INTO user_balances (user_id, last_payment_date) VALUES (NEW.user_id, NEW.transaction_date)
+            ON CONFLICT(user_id) DO UPDATE SET
+                last_payment_date = MAX(COALESCE(last_payment_date, ''), excluded.last_payment_date);
+        END;''',
+]
+
+PG_BALANCE_TRIGGERS = [
+    *_pg_trigger('trg_bills_balance_insert', 'bills', 'INSERT', _balance_upserts('NEW', '', 'postgresql')),
+    *_pg_trigger('trg_bills_balance_update', 'bills', 'UPDATE OF user_id, utility_id, amount, status',
+                 _balance_upserts('OLD', '-', 'postgresql') + '\n' + _balance_upserts('NEW', '', 'postgresql')),
+    *_pg_trigger('trg_bills_balance_delete', 'bills', 'DELETE', _balance_upserts('OLD', '-', 'postgresql')),
+    *_pg_trigger('trg_payments_balance_insert', 'payments', 'INSERT',
+                 '''INSERT INTO user_balances (user_id, last_payment_date) VALUES (NEW.user_id, NEW.transaction_date)
+                    ON CONFLICT(user_id) DO UPDATE SET
+                        last_payment_date = MAX(COALESCE(user_balances.last_payment_date, ''), excluded.last_payment_date);'''),
+]
+
+REBUILD_BALANCES = [
+    "DELETE FROM user_utility_balances;",
+    "DELETE FROM user_balances;",
+    '''INSERT INTO user_utility_balances (user_id, utility_id, bill_count, pending_count, pending_total, paid_total)
+       SELECT user_id, utility_id, COUNT(*),
+              COUNT(CASE WHEN status = 'pending' THEN 1 END),
+              ROUND(COALESCE(SUM(CASE WHEN status = 'pending' THEN amount END), 0), 2),
+              ROUND(COALESCE(SUM(CASE WHEN status = 'paid' THEN amount END), 0), 2)
+       FROM bills GROUP BY user_id, utility_id;''',
+    '''INSERT INTO user_balances (user_id, bill_count, pending_count, pending_total, paid_total)
+       SELECT user_id, SUM(bill_count), SUM(pending_count), ROUND(SUM(pending_total), 2), ROUND(SUM(paid_total), 2)
+       FROM user_utility_balances GROUP BY user_id;''',
+    '''INSERT INTO user_balances (user_id, last_payment_date)
+       SELECT user_id, MAX(transaction_date) FROM payments WHERE true GROUP BY user_id
+       ON CONFLICT(user_id) DO UPDATE SET last_payment_date = excluded.last_payment_date;''',
+]
+
+
+# --- Analytics Rollups ---
+#
+# payment_daily_rollup / bill_daily_rollup pre-aggregate payments by
+# transaction day and bills by due date (resources/analytics.py). A refresh
+# recomputes the days from each rollup's watermark onwards; these triggers
+# queue older days that a write touched behind the watermark.
+
+def _mark_dirty(rollup, day, dialect='sqlite'):
+    insert = f'''INSERT {'OR IGNORE ' if dialect == 'sqlite' else ''}INTO analytics_dirty_days (rollup, day)
+                SELECT '{rollup}', {day}
+                WHERE {day} < (SELECT value FROM scheduler_checkpoints WHERE name = 'analytics.{rollup}')'''
+    return insert + (';' if dialect == 'sqlite' else ' ON CONFLICT DO NOTHING;')
+
+
+ANALYTICS_TRIGGERS = [
+    f'''CREATE TRIGGER IF NOT EXISTS trg_bills_rollup_insert AFTER INSERT ON bills BEGIN
+            {_mark_dirty('bills', 'NEW.due_date')}
+        END;''',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_bills_rollup_update AFTER UPDATE OF utility_id, amount, status, due_date ON bills BEGIN
+            {_mark_dirty('bills', 'OLD.due_date')}
+            {_mark_dirty('bills', 'NEW.due_date')}
+        END;''',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_bills_rollup_delete AFTER DELETE ON bills BEGIN
+            {_mark_dirty('bills', 'OLD.due_date')}
+        END;''',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_payments_rollup_insert AFTER INSERT ON payments BEGIN
+            {_mark_dirty('payments', 'date(NEW.transaction_date)')}
+        END;''',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_payments_rollup_update AFTER UPDATE OF amount, payment_method, status, transaction_date ON payments BEGIN
+            {_mark_dirty('payments', 'date(OLD.transaction_date)')}
+            {_mark_dirty('payments', 'date(NEW.transaction_date)')}
+        END;''',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_payments_rollup_delete AFTER DELETE ON payments BEGIN
+            {_mark_dirty('payments', 'date(OLD.transaction_date)')}
+        END;''',
+]
+
+PG_ANALYTICS_TRIGGERS = [
+    *_pg_trigger('trg_bills_rollup_insert', 'bills', 'INSERT', _mark_dirty('bills', 'NEW.due_date', 'postgresql')),
+    *_pg_trigger('trg_bills_rollup_update', 'bills', 'UPDATE OF utility_id, amount, status, due_date',
+                 _mark_dirty('bills', 'OLD.due_date', 'postgresql') + _mark_dirty('bills', 'NEW.due_date', 'postgresql')),
+    *_pg_trigger('trg_bills_rollup_delete', 'bills', 'DELETE', _mark_dirty('bills', 'OLD.due_date', 'postgresql')),
+    *_pg_trigger('trg_payments_rollup_insert', 'payments', 'INSERT',
+                 _mark_dirty('payments', 'date(NEW.transaction_date)', 'postgresql')),
+    *_pg_trigger('trg_payments_rollup_update', 'payments', 'UPDATE OF amount, payment_method, status, transaction_date',
+                 _mark_dirty('payments', 'date(OLD.transaction_date)', 'postgresql') +
+                 _mark_dirty('payments', 'date(NEW.transaction_date)', 'postgresql')),
+    *_pg_trigger('trg_payments_rollup_delete', 'payments', 'DELETE',
+                 _mark_dirty('payments', 'date(OLD.transaction_date)', 'postgresql')),
+]
+
+
+MIGRATIONS = [
+    (1, 'baseline schema', [
+        '''CREATE TABLE IF NOT EXISTS users (
+                user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT NOT NULL UNIQUE,
+                password_hash TEXT NOT NULL,
+                email TEXT NOT NULL,
+                phone_number TEXT NOT NULL,
+                pan TEXT UNIQUE,
+                aadhaar TEXT UNIQUE,
+                role TEXT NOT NULL DEFAULT 'user',
+                created_at TEXT NOT NULL);''',
+        '''CREATE TABLE IF NOT EXISTS utilities (
+                utility_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                description TEXT,
+                provider_name TEXT,
+                created_at TEXT NOT NULL);''',
+        '''CREATE TABLE IF NOT EXISTS bills (
+                bill_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                utility_id INTEGER NOT NULL,
+                amount REAL NOT NULL,
+                due_date TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                created_at TEXT NOT NULL,
+                FOREIGN KEY (user_id) REFERENCES users (user_id),
+                FOREIGN KEY (utility_id) REFERENCES utilities (utility_id));''',
+        '''CREATE TABLE IF NOT EXISTS payments (
+                payment_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                bill_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                amount REAL NOT NULL,
+                payment_method TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'completed',
+                transaction_date TEXT NOT NULL,
+                FOREIGN KEY (bill_id) REFERENCES bills (bill_id),
+                FOREIGN KEY (user_id) REFERENCES users (user_id));''',
+        '''CREATE TABLE IF NOT EXISTS reminders (
+                reminder_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                message TEXT NOT NULL,
+                reminder_date TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                FOREIGN KEY (user_id) REFERENCES users (user_id));''',
+    ]),
+    (2, 'indexes for per-user bill, payment and reminder lookups', [
+        # get_bills_by_user: WHERE user_id = ? [AND status = ?] ORDER BY due_date
+        "CREATE INDEX IF NOT EXISTS idx_bills_user_due ON bills (user_id, due_date);",
+        "CREATE INDEX IF NOT EXISTS idx_bills_user_status_due ON bills (user_id, status, due_date);",
+        # get_all_bills: ORDER BY due_date DESC
+        "CREATE INDEX IF NOT EXISTS idx_bills_due ON bills (due_date);",
+        # get_recent_payments_by_user: WHERE user_id = ? ORDER BY transaction_date DESC LIMIT ?
+        "CREATE INDEX IF NOT EXISTS idx_payments_user_date ON payments (user_id, transaction_date);",
+        # get_all_payments: ORDER BY transaction_date DESC
+        "CREATE INDEX IF NOT EXISTS idx_payments_date ON payments (transaction_date);",
+        "CREATE INDEX IF NOT EXISTS idx_payments_bill ON payments (bill_id);",
+        # get_reminders_by_user: WHERE user_id = ? AND reminder_date >= ? ORDER BY reminder_date (covering)
+        "CREATE INDEX IF NOT EXISTS idx_reminders_user_date ON reminders (user_id, reminder_date, message, created_at);",
+    ]),
+    (3, 'revoked session tokens', [
+        '''CREATE TABLE IF NOT EXISTS revoked_tokens (
+                jti TEXT PRIMARY KEY,
+                expires_at INTEGER NOT NULL);''',
+        "CREATE INDEX IF NOT EXISTS idx_revoked_tokens_expiry ON revoked_tokens (expires_at);",
+    ]),
+    (4, 'indexes for filtered admin bill/payment listings', [
+        # Keyset order is (due_date, bill_id) / (transaction_date, payment_id); the
+        # rowid trailing every index supplies the id half of the key.
+        "CREATE INDEX IF NOT EXISTS idx_bills_status_due ON bills (status, due_date);",
+        "CREATE INDEX IF NOT EXISTS idx_bills_utility_due ON bills (utility_id, due_date);",
+        "CREATE INDEX IF NOT EXISTS idx_payments_status_date ON payments (status, transaction_date);",
+    ]),
+    (5, 'idempotency keys for batch payments', [
+        '''CREATE TABLE IF NOT EXISTS idempotency_keys (
+                user_id INTEGER NOT NULL,
+                idempotency_key TEXT NOT NULL,
+                request_hash TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                PRIMARY KEY (user_id, idempotency_key));''',
+        "CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created ON idempotency_keys (created_at);",
+    ]),
+    (6, 'durable payment job queue', [
+        '''CREATE TABLE IF NOT EXISTS payment_jobs (
+                job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                bill_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                amount REAL NOT NULL,
+                payment_method TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                payment_id INTEGER,
+                gateway_reference TEXT,
+                error TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                FOREIGN KEY (bill_id) REFERENCES bills (bill_id),
+                FOREIGN KEY (user_id) REFERENCES users (user_id));''',
+        "CREATE INDEX IF NOT EXISTS idx_payment_jobs_status ON payment_jobs (status, job_id);",
+    ]),
+    (7, 'data version counters for conditional GETs', [
+        '''CREATE TABLE IF NOT EXISTS data_versions (
+                scope TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                updated_at TEXT NOT NULL);''',
+    ]),
+    (8, 'billing cycles: tariffs, consumption and resumable billing runs', [
+        '''CREATE TABLE IF NOT EXISTS tariffs (
+                utility_id INTEGER PRIMARY KEY,
+                fixed_charge REAL NOT NULL DEFAULT 0,
+                unit_rate REAL NOT NULL,
+                tax_rate REAL NOT NULL DEFAULT 0,
+                updated_at TEXT NOT NULL,
+                FOREIGN KEY (utility_id) REFERENCES utilities (utility_id));''',
+        # Period first: a billing partition reads one period over a user_id range
+        '''CREATE TABLE IF NOT EXISTS consumption (
+                period TEXT NOT NULL,
+                user_id INTEGER NOT NULL,
+                utility_id INTEGER NOT NULL,
+                units REAL NOT NULL,
+                recorded_at TEXT NOT NULL,
+                PRIMARY KEY (period, user_id, utility_id));''',
+        '''CREATE TABLE IF NOT EXISTS billing_runs (
+                run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                period TEXT NOT NULL UNIQUE,
+                status TEXT NOT NULL DEFAULT 'running',
+                due_date TEXT NOT NULL,
+                partitions INTEGER NOT NULL DEFAULT 0,
+                bills_created INTEGER NOT NULL DEFAULT 0,
+                reminders_created INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                started_at TEXT NOT NULL,
+                finished_at TEXT);''',
+        '''CREATE TABLE IF NOT EXISTS billing_run_partitions (
+                run_id INTEGER NOT NULL,
+                first_user_id INTEGER NOT NULL,
+                last_user_id INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                bills_created INTEGER NOT NULL DEFAULT 0,
+                reminders_created INTEGER NOT NULL DEFAULT 0,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (run_id, first_user_id));''',
+        # One bill per user, utility and cycle, so a re-run partition cannot double-bill
+        "ALTER TABLE bills ADD COLUMN billing_period TEXT;",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_bills_cycle ON bills (billing_period, user_id, utility_id) WHERE billing_period IS NOT NULL;",
+        "ALTER TABLE reminders ADD COLUMN bill_id INTEGER;",
+    ]),
+    (9, 'scheduled reminder generation and dispatch', [
+        "ALTER TABLE reminders ADD COLUMN dispatched_at TEXT;",
+        "ALTER TABLE reminders ADD COLUMN dispatch_attempts INTEGER NOT NULL DEFAULT 0;",
+        "ALTER TABLE reminders ADD COLUMN dispatch_error TEXT;",
+        # At most one generated reminder per bill: generation is INSERT OR IGNORE against this
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_reminders_bill ON reminders (bill_id) WHERE bill_id IS NOT NULL;",
+        # The dispatch queue: reminders not yet sent (nor given up on), in the order they fall due
+        "CREATE INDEX IF NOT EXISTS idx_reminders_undispatched ON reminders (reminder_date, reminder_id) WHERE dispatched_at IS NULL AND dispatch_error IS NULL;",
+        '''CREATE TABLE IF NOT EXISTS scheduler_checkpoints (
+                name TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                updated_at TEXT NOT NULL);''',
+    ]),
+    (10, 'materialized user balances', [
+        '''CREATE TABLE IF NOT EXISTS user_balances (
+                user_id INTEGER PRIMARY KEY,
+                bill_count INTEGER NOT NULL DEFAULT 0,
+                pending_count INTEGER NOT NULL DEFAULT 0,
+                pending_total REAL NOT NULL DEFAULT 0,
+                paid_total REAL NOT NULL DEFAULT 0,
+                last_payment_date TEXT);''',
+        '''CREATE TABLE IF NOT EXISTS user_utility_balances (
+                user_id INTEGER NOT NULL,
+                utility_id INTEGER NOT NULL,
+                bill_count INTEGER NOT NULL DEFAULT 0,
+                pending_count INTEGER NOT NULL DEFAULT 0,
+                pending_total REAL NOT NULL DEFAULT 0,
+                paid_total REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, utility_id)) WITHOUT ROWID;''',
+        # Admin "who owes the most" list
+        "CREATE INDEX IF NOT EXISTS idx_user_balances_pending ON user_balances (pending_total);",
+        {'sqlite': BALANCE_TRIGGERS, 'postgresql': PG_BALANCE_TRIGGERS},
+        *REBUILD_BALANCES,
+    ]),
+    (11, 'analytics rollups', [
+        '''CREATE TABLE IF NOT EXISTS payment_daily_rollup (
+                day TEXT NOT NULL,
+                payment_method TEXT NOT NULL,
+                status TEXT NOT NULL,
+                payment_count INTEGER NOT NULL,
+                amount REAL NOT NULL,
+                PRIMARY KEY (day, payment_method, status)) WITHOUT ROWID;''',
+        '''CREATE TABLE IF NOT EXISTS bill_daily_rollup (
+                due_date TEXT NOT NULL,
+                utility_id INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                bill_count INTEGER NOT NULL,
+                amount REAL NOT NULL,
+                PRIMARY KEY (due_date, utility_id, status)) WITHOUT ROWID;''',
+        '''CREATE TABLE IF NOT EXISTS analytics_dirty_days (
+                rollup TEXT NOT NULL,
+                day TEXT NOT NULL,
+                PRIMARY KEY (rollup, day)) WITHOUT ROWID;''',
+        {'sqlite': ANALYTICS_TRIGGERS, 'postgresql': PG_ANALYTICS_TRIGGERS},
+    ]),
+    (12, 'read replica state', [
+        # Stamped on each replica copy by resources/replicas.py; stays NULL on the primary
+        '''CREATE TABLE IF NOT EXISTS replica_state (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                synced_at REAL);''',
+        "INSERT OR IGNORE INTO replica_state (id, synced_at) VALUES (1, NULL);",
+    ]),
+    (13, 'at most one open payment job per bill', [
+        # Keep the oldest open job for each bill; later duplicates would charge it twice
+        '''UPDATE payment_jobs SET status = 'failed', error = 'Duplicate of an earlier open job for this bill.'
+           WHERE status IN ('pending', 'processing')
+             AND job_id NOT IN (SELECT MIN(job_id) FROM payment_jobs
+                                WHERE status IN ('pending', 'processing') GROUP BY bill_id);''',
+        '''CREATE UNIQUE INDEX IF NOT EXISTS idx_payment_jobs_open_bill ON payment_jobs (bill_id)
+           WHERE status IN ('pending', 'processing');''',
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def _ensure_history_table(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS schema_migrations (
+                        version INTEGER PRIMARY KEY,
+                        description TEXT NOT NULL,
+                        applied_at TEXT NOT NULL);''')
+    conn.commit()
+
+
+def get_schema_version(conn):
+    """Return the highest migration version applied to this database (0 if none)."""
+    _ensure_history_table(conn)
+    row = conn.execute("SELECT MAX(version) FROM schema_migrations;").fetchone()
+    return row[0] or 0
+
+
+def _for_dialect(statements, dialect):
+    for statement in statements:
+        if isinstance(statement, dict):
+            yield from statement[dialect]
+        else:
+            yield statement
+
+
+def migrate(conn, target=None):
+    """Apply every pending migration up to ``target`` (default: latest).
+
+    Each migration runs in its own IMMEDIATE transaction together with its
+    history row, so a crash leaves the database at a well-defined version.
+    Returns the list of versions that were applied.
+    """
+    target = LATEST_VERSION if target is None else target
+    dialect = getattr(conn, 'dialect', 'sqlite')
+    current = get_schema_version(conn)
+    applied = []
+    for version, description, statements in MIGRATIONS:
+        if version <= current or version > target:
+            continue
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            # Re-check under the write lock in case another process migrated first
+            row = conn.execute("SELECT 1 FROM schema_migrations WHERE version = ?;", (version,)).fetchone()
+            if row:
+                conn.rollback()
+                continue
+            for statement in _for_dialect(statements, dialect):
+                conn.execute(statement)
+            conn.execute("INSERT INTO schema_migrations (version, description, applied_at) VALUES (?, ?, ?);",
+                         (version, description, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+
+# --- Query Plan Checks ---
+#
+# The hot per-request queries (shared with database.py via resources/queries.py),
+# with representative parameters. Any of these turning into a full table scan
+# is a performance regression.
+
+HOT_QUERIES = {
+    'get_bills_by_user': (queries.BILLS_BY_USER, (1,)),
+    'get_bills_by_user_status': (queries.BILLS_BY_USER_STATUS, (1, 'pending')),
+    'get_recent_payments_by_user': (queries.RECENT_PAYMENTS_BY_USER, (1, 5)),
+    'get_reminders_by_user': (queries.UPCOMING_REMINDERS_BY_USER, (1, '2025-01-01')),
+    'get_user_balance': (queries.USER_BALANCE, (1,)),
+    'get_user_balance_overdue': (queries.USER_OVERDUE_COUNT, (1, '2025-01-01')),
+    'get_user_balance_utilities': (queries.USER_UTILITY_BALANCES, (1,)),
+}
+
+
+def explain(conn, sql, params=()):
+    """Return the EXPLAIN QUERY PLAN detail lines for a statement."""
+    return [row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()]
+
+
+def check_query_plans(conn, hot_queries=None):
+    """Return {query_name: [plan lines]} for every hot query that does a full scan or a sort."""
+    regressions = {}
+    for name, (sql, params) in (hot_queries or HOT_QUERIES).items():
+        plan = explain(conn, sql, params)
+        # Even "SCAN ... USING INDEX" walks the whole index, which is still O(table size)
+        bad = [line for line in plan if line.startswith('SCAN ') or 'TEMP B-TREE' in line]
+        if bad:
+            regressions[name] = plan
+    return regressions
+
+
+if __name__ == "__main__":
+    # python -m resources.migrations [--check-plans]
+    from resources import database as db
+
+    applied = db.migrate()
+    print(f"Applied migrations: {applied or 'none'} (schema version {LATEST_VERSION})")
+
+    if '--check-plans' in sys.argv:
+        if db.engine.name != 'sqlite':
+            sys.exit(f"--check-plans reads SQLite query plans; not available on {db.engine.name}")
+        with db.get_connection() as conn:
+            regressions = check_query_plans(conn)
+        for name, plan in regressions.items():
+            print(f"{name} regressed to a scan:")
+            for line in plan:
+                print(f"    {line}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,110 @@
+import importlib
+import json
+import os
+import smtplib
+import threading
+from datetime import datetime
+from email.message import EmailMessage
+
+# --- Reminder Notifier Interface ---
+#
+# resources/reminder_scheduler.py calls get_notifier().send(reminder) for each
+# reminder that falls due. REMINDER_NOTIFIER selects the implementation:
+# "file" (default, appends to a local outbox), "smtp", or a
+# "module:ClassName" path to any class implementing Notifier.
+
+
+class NotificationError(Exception):
+    """A reminder could not be delivered."""
+
+
+class Notifier:
+    """Interface every notifier implementation provides."""
+
+    def send(self, reminder):
+        """Deliver one reminder (a dict with message, email, username, ...). Raise on failure."""
+        raise NotImplementedError
+
+
+class FileNotifier(Notifier):
+    """Local stand-in that appends each notification to an NDJSON outbox.
+
+    REMINDER_OUTBOX     path of the outbox file (default reminder_outbox.ndjson)
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.environ.get("REMINDER_OUTBOX", "reminder_outbox.ndjson")
+        self._lock = threading.Lock()
+
+    def send(self, reminder):
+        line = json.dumps({
+            'reminder_id': reminder['reminder_id'],
+            'to': reminder.get('email'),
+            'subject': 'Bill payment reminder',
+            'body': reminder['message'],
+            'sent_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        })
+        try:
+            with self._lock, open(self.path, 'a', encoding='utf-8') as outbox:
+                outbox.write(line + '\n')
+        except OSError as e:
+            raise NotificationError(f"Could not write to outbox: {e}")
+
+
+class SmtpNotifier(Notifier):
+    """Sends each reminder as an email.
+
+    SMTP_HOST / SMTP_PORT       server (default localhost:25)
+    SMTP_FROM                   sender address
+    SMTP_USER / SMTP_PASSWORD   login, if the server needs one (uses STARTTLS)
+    SMTP_TIMEOUT                seconds per connection
+    """
+
+    def __init__(self):
+        self.host = os.environ.get("SMTP_HOST", "localhost")
+        self.port = int(os.environ.get("SMTP_PORT", "25"))
+        self.sender = os.environ.get("SMTP_FROM", "reminders@localhost")
+        self.user = os.environ.get("SMTP_USER")
+        self.password = os.environ.get("SMTP_PASSWORD")
+        self.timeout = float(os.environ.get("SMTP_TIMEOUT", "10"))
+
+    def send(self, reminder):
+        if not reminder.get('email'):
+            raise NotificationError("User has no email address.")
+        message = EmailMessage()
+        message['From'] = self.sender
+        message['To'] = reminder['email']
+        message['Subject'] = 'Bill payment reminder'
+        message.set_content(f"Hello {reminder.get('username', '')},\n\n{reminder['message']}.\n")
+        try:
+            with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+                if self.user:
+                    smtp.starttls()
+                    smtp.login(self.user, self.password or '')
+                smtp.send_message(message)
+        except (smtplib.SMTPException, OSError) as e:
+            raise NotificationError(f"SMTP delivery failed: {e}")
+
+
+_notifier = None
+
+
+def get_notifier():
+    """Return the configured notifier instance (created once per process)."""
+    global _notifier
+    if _notifier is None:
+        name = os.environ.get("REMINDER_NOTIFIER", "file")
+        if name == "file":
+            _notifier = FileNotifier()
+        elif name == "smtp":
+            _notifier = SmtpNotifier()
+        else:
+            module_name, _, class_name = name.partition(':')
+            _notifier = getattr(importlib.import_module(module_name), class_name)()
+    return _notifier
+
+
+def set_notifier(notifier):
+    """Swap the notifier implementation (e.g. for tests or load runs)."""
+    global _notifier
+    _notifier = notifier
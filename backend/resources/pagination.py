@@ -0,0 +1,81 @@
+import base64
+import json
+import os
+from datetime import datetime
+
+# --- Keyset Pagination Helpers ---
+#
+# Admin list endpoints page with an opaque cursor holding the sort key of the
+# last row returned (e.g. [due_date, bill_id]). The next page is fetched with
+# "WHERE (sort_key) < (cursor)" on an index, so page N costs the same as
+# page 1 no matter how large the table gets - unlike LIMIT/OFFSET.
+
+DEFAULT_PAGE_SIZE = int(os.environ.get("ADMIN_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.environ.get("ADMIN_MAX_PAGE_SIZE", "500"))
+
+
+class InvalidQuery(ValueError):
+    """Raised for malformed pagination or filter query parameters."""
+
+
+def encode_cursor(key):
+    """Encode a sort key (list of values) as an opaque URL-safe cursor."""
+    if key is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, size=2):
+    """Decode a cursor produced by encode_cursor, or return None when absent."""
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        raise InvalidQuery("Invalid cursor.")
+    if not isinstance(key, list) or len(key) != size:
+        raise InvalidQuery("Invalid cursor.")
+    return key
+
+
+def parse_limit(value):
+    """Clamp the requested page size to [1, MAX_PAGE_SIZE]."""
+    if value in (None, ''):
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise InvalidQuery("limit must be an integer.")
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def _parse_int(args, name):
+    value = args.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise InvalidQuery(f"{name} must be an integer.")
+
+
+def _parse_date(args, name):
+    value = args.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise InvalidQuery(f"{name} must be a date (YYYY-MM-DD).")
+    return value
+
+
+def parse_filters(args):
+    """Read the shared admin list filters from request query arguments."""
+    return {
+        'user_id': _parse_int(args, 'user_id'),
+        'utility_id': _parse_int(args, 'utility_id'),
+        'status': args.get('status') or None,
+        'date_from': _parse_date(args, 'from'),
+        'date_to': _parse_date(args, 'to'),
+    }
@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+
+from resources import database as db
+from resources import gateway
+
+# --- Asynchronous Payment Processing ---
+#
+# POST /api/payments queues a job in payment_jobs and answers 202 right away.
+# Worker threads claim jobs (pending -> processing), call the gateway outside
+# of any database transaction, and then record the outcome
+# (processing -> completed / failed). A bill has at most one open job, and the
+# job_id goes to the gateway as the idempotency key, so a job requeued after a
+# crash does not charge twice. Jobs live in SQLite, so queued work survives
+# restarts and can be drained by a separate worker process:
+#
+#     python -m resources.payment_queue
+
+PAYMENT_WORKERS = int(os.environ.get("PAYMENT_WORKERS", "4"))
+PAYMENT_MAX_ATTEMPTS = int(os.environ.get("PAYMENT_MAX_ATTEMPTS", "3"))
+PAYMENT_POLL_INTERVAL = float(os.environ.get("PAYMENT_POLL_INTERVAL", "1.0"))
+PAYMENT_STALE_AFTER = int(os.environ.get("PAYMENT_STALE_AFTER", "300"))
+
+
+class PaymentWorkerPool:
+    """A fixed set of threads draining the payment job queue."""
+
+    def __init__(self, workers=PAYMENT_WORKERS, poll_interval=PAYMENT_POLL_INTERVAL):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._threads = []
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self.processed = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        # Anything left 'processing' by a crashed worker goes back on the queue
+        db.requeue_stale_payment_jobs(PAYMENT_STALE_AFTER)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"payment-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """Stop claiming new jobs and wait for in-flight charges to finish."""
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def notify(self):
+        """Wake idle workers (called right after a job is queued in this process)."""
+        self._wakeup.set()
+
+    @property
+    def running(self):
+        return bool(self._threads)
+
+    def _run(self):
+        while not self._stop.is_set():
+            job = db.claim_payment_job()
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self.process(job)
+
+    def process(self, job):
+        """Charge one claimed job through the gateway and record the outcome."""
+        bill = db.get_bill_by_id(job['bill_id'])
+        if bill is None or bill['user_id'] != job['user_id'] or bill['status'] != 'pending':
+            db.fail_payment_job(job['job_id'], "Bill is not payable (missing, not owned or already paid).")
+            self._count(failed=True)
+            return
+
+        try:
+            result = gateway.get_gateway().charge(job, idempotency_key=f"payment-job-{job['job_id']}")
+        except Exception as e:
+            result = gateway.GatewayResult(False, error=f"Gateway error: {e}", retryable=True)
+
+        if result.success:
+            payment_id, error = db.complete_payment_job(job['job_id'], result.reference)
+            if payment_id is None:
+                if error is None:
+                    db.fail_payment_job(job['job_id'], "Charged, but recording the payment failed.")
+                self._count(failed=True)
+                return
+            self._count(failed=False)
+        else:
+            retry = result.retryable and job['attempts'] < PAYMENT_MAX_ATTEMPTS
+            db.fail_payment_job(job['job_id'], result.error, retry=retry)
+            if not retry:
+                self._count(failed=True)
+
+    def _count(self, failed):
+        with self._lock:
+            self.processed += 1
+            if failed:
+                self.failed += 1
+
+    def metrics(self):
+        with self._lock:
+            return {'workers': len(self._threads), 'processed': self.processed, 'failed': self.failed}
+
+
+workers = PaymentWorkerPool()
+
+
+def submit_payment(bill_id, user_id, amount, payment_method):
+    """Queue a payment and nudge local workers. Returns (job_id, created) as enqueue_payment_job does."""
+    job_id, created = db.enqueue_payment_job(bill_id, user_id, amount, payment_method)
+    if created:
+        workers.notify()
+    return job_id, created
+
+
+if __name__ == "__main__":
+    # Standalone worker process: python -m resources.payment_queue
+    db.migrate()
+    workers.start()
+    print(f"Payment workers running ({workers.workers} threads). Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("Stopping payment workers...")
+        workers.stop()
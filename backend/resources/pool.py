@@ -0,0 +1,275 @@
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# --- Connection Pool ---
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    """Raised when no pooled connection became free within the wait timeout."""
+
+
+class Savepoint:
+    """The held connection as seen by a nested block inside an open transaction.
+
+    commit() and rollback() act on a savepoint rather than on the caller's
+    transaction: a helper that commits inside someone else's BEGIN IMMEDIATE
+    only hands its work to that transaction, and a helper that rolls back
+    only undoes its own statements. Everything else is the connection's.
+    """
+
+    def __init__(self, conn, name):
+        self._conn = conn
+        self._name = name
+        conn.execute(f"SAVEPOINT {name};")
+
+    def __getattr__(self, attr):
+        return getattr(self._conn, attr)
+
+    @property
+    def in_transaction(self):
+        return True
+
+    def commit(self):
+        # Keep the work as part of the caller's transaction; later statements get a fresh savepoint
+        self._conn.execute(f"RELEASE SAVEPOINT {self._name};")
+        self._conn.execute(f"SAVEPOINT {self._name};")
+
+    def rollback(self):
+        self._conn.execute(f"ROLLBACK TO SAVEPOINT {self._name};")
+
+    def release(self):
+        self._conn.execute(f"RELEASE SAVEPOINT {self._name};")
+
+
+class ConnectionPool:
+    """A bounded, thread-aware pool of database connections.
+
+    Connections are created lazily with ``factory`` up to ``max_size``. A thread
+    that re-enters ``connection()`` while it already holds a connection gets the
+    same one back, so nested database calls share a single transaction instead
+    of deadlocking against each other. Inside an open transaction the nested
+    block gets a Savepoint, so its commit() / rollback() cannot end the outer
+    transaction half-way.
+    """
+
+    def __init__(self, factory, max_size=5, timeout=30.0, health_check_after=60.0):
+        self.factory = factory
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+
+        self._idle = []  # list of (connection, last_used_at)
+        self._size = 0
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._closed = False
+
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'timeouts': 0,
+            'created': 0,
+            'evictions': 0,
+        }
+
+    # --- Checkout / Release ---
+
+    def acquire(self):
+        """Check a connection out of the pool, waiting up to ``timeout`` seconds."""
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            waited = False
+            wait_started = time.monotonic()
+            while True:
+                if self._closed:
+                    raise sqlite3.ProgrammingError("Connection pool is closed.")
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    conn, last_used = None, None
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(f"Timed out after {self.timeout}s waiting for a database connection.")
+                if not waited:
+                    waited = True
+                    self._stats['waits'] += 1
+                self._cond.wait(remaining)
+            if waited:
+                self._stats['wait_time'] += time.monotonic() - wait_started
+            self._stats['checkouts'] += 1
+
+        # Connection setup and health checks happen outside the lock.
+        if conn is not None and time.monotonic() - last_used > self.health_check_after:
+            if not self._is_healthy(conn):
+                self._discard(conn, reopen=True)
+                conn = None
+        if conn is None:
+            conn = self._open()
+        return conn
+
+    def release(self, conn, discard=False):
+        """Return a connection to the pool, rolling back any open transaction."""
+        if not discard:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                discard = True
+        if discard:
+            self._discard(conn)
+            return
+        with self._cond:
+            if self._closed:
+                conn.close()
+                self._size -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def checkout(self):
+        """Context manager yielding a connection not bound to the current thread.
+
+        For long-lived consumers such as streaming generators, which may be
+        suspended between yields or resumed on another thread.
+        """
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+        except sqlite3.Error as e:
+            broken = isinstance(e, (sqlite3.InterfaceError, sqlite3.ProgrammingError))
+            raise
+        finally:
+            self.release(conn, discard=broken)
+
+    @contextmanager
+    def connection(self):
+        """Context manager yielding a pooled connection.
+
+        Re-entrant per thread: nested uses return the connection the thread
+        already holds (wrapped in a Savepoint while a transaction is open) and
+        only the outermost block releases it.
+        """
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            self._local.depth += 1
+            try:
+                if not held.in_transaction:
+                    yield held
+                    return
+                savepoint = Savepoint(held, f"pool_nested_{self._local.depth}")
+                try:
+                    yield savepoint
+                except BaseException:
+                    try:
+                        savepoint.rollback()
+                        savepoint.release()
+                    except sqlite3.Error:
+                        pass  # the error already ended the whole transaction
+                    raise
+                savepoint.release()
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn = self.acquire()
+        self._local.conn = conn
+        self._local.depth = 1
+        broken = False
+        try:
+            yield conn
+        except sqlite3.Error as e:
+            # A connection that raised an interface-level error is not reused.
+            broken = isinstance(e, (sqlite3.InterfaceError, sqlite3.ProgrammingError))
+            raise
+        finally:
+            self._local.conn = None
+            self._local.depth = 0
+            self.release(conn, discard=broken)
+
+    def held_by_current_thread(self):
+        """True while the calling thread is inside connection() (e.g. mid-transaction)."""
+        return getattr(self._local, 'conn', None) is not None
+
+    # --- Internals ---
+
+    def _open(self):
+        try:
+            conn = self.factory()
+        except Exception:
+            conn = None
+        if conn is None:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise sqlite3.OperationalError("Could not open a database connection.")
+        with self._cond:
+            self._stats['created'] += 1
+        return conn
+
+    def _discard(self, conn, reopen=False):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._cond:
+            self._stats['evictions'] += 1
+            if not reopen:
+                self._size -= 1
+                self._cond.notify()
+
+    @staticmethod
+    def _is_healthy(conn):
+        try:
+            conn.execute("SELECT 1;").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    # --- Lifecycle / Metrics ---
+
+    def warm(self, count=None):
+        """Open connections ahead of the first requests (default: up to max_size). Returns how many are idle."""
+        count = self.max_size if count is None else min(count, self.max_size)
+        held = []
+        try:
+            for _ in range(count):
+                held.append(self.acquire())
+        finally:
+            for conn in held:
+                self.release(conn)
+        return len(held)
+
+    def close_all(self):
+        """Close every idle connection and refuse further checkouts."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            conn.close()
+
+    def reset(self):
+        """Close idle connections and reopen the pool (e.g. after the schema is rebuilt)."""
+        self.close_all()
+        with self._cond:
+            self._closed = False
+
+    def metrics(self):
+        """Return a snapshot of pool counters."""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['size'] = self._size
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._size - len(self._idle)
+            stats['max_size'] = self.max_size
+        return stats
@@ -0,0 +1,104 @@
+import os
+
+# --- SQLite Storage Profiles ---
+#
+# Each profile is the set of PRAGMAs applied to every new connection. WAL
+# journaling lets readers keep reading from their snapshot while a payment
+# writer holds the write lock, and busy_timeout makes writers queue for the
+# lock instead of failing immediately with "database is locked".
+
+PROFILES = {
+    'dev': {
+        'journal_mode': 'wal',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'cache_size': -16000,       # ~16 MB page cache (negative = KiB)
+        'mmap_size': 0,
+        'temp_store': 'DEFAULT',
+    },
+    'prod': {
+        'journal_mode': 'wal',
+        'synchronous': 'NORMAL',    # durable across app crashes; WAL keeps it consistent
+        'busy_timeout': 15000,
+        'cache_size': -64000,       # ~64 MB page cache
+        'mmap_size': 268435456,     # 256 MB memory-mapped reads
+        'temp_store': 'MEMORY',
+    },
+    'bulk-load': {
+        'journal_mode': 'wal',
+        'synchronous': 'OFF',       # only for one-off seeding/imports that can be re-run
+        'busy_timeout': 60000,
+        'cache_size': -262144,      # ~256 MB page cache
+        'mmap_size': 1073741824,    # 1 GB memory-mapped reads
+        'temp_store': 'MEMORY',
+    },
+}
+
+DEFAULT_PROFILE = 'dev'
+
+# PRAGMA readbacks return integers for these settings
+_SYNCHRONOUS_LEVELS = {'OFF': 0, 'NORMAL': 1, 'FULL': 2, 'EXTRA': 3}
+_TEMP_STORE_LEVELS = {'DEFAULT': 0, 'FILE': 1, 'MEMORY': 2}
+
+
+def get_profile_name():
+    """Return the profile selected by the DB_PROFILE environment variable."""
+    name = os.environ.get('DB_PROFILE', DEFAULT_PROFILE)
+    if name not in PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE '{name}'. Choose one of: {', '.join(PROFILES)}")
+    return name
+
+
+def apply_profile(conn, name=None):
+    """Apply every PRAGMA of the given (or configured) profile to a connection."""
+    profile = PROFILES[name or get_profile_name()]
+    cursor = conn.cursor()
+    # busy_timeout first so that switching the journal mode waits for other writers
+    cursor.execute(f"PRAGMA busy_timeout = {int(profile['busy_timeout'])};")
+    cursor.execute(f"PRAGMA journal_mode = {profile['journal_mode']};")
+    cursor.execute(f"PRAGMA synchronous = {profile['synchronous']};")
+    cursor.execute(f"PRAGMA cache_size = {int(profile['cache_size'])};")
+    cursor.execute(f"PRAGMA mmap_size = {int(profile['mmap_size'])};")
+    cursor.execute(f"PRAGMA temp_store = {profile['temp_store']};")
+    cursor.close()
+
+
+def read_settings(conn):
+    """Read back the effective value of every profile PRAGMA."""
+    cursor = conn.cursor()
+    settings = {}
+    for pragma in ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size', 'mmap_size', 'temp_store'):
+        cursor.execute(f"PRAGMA {pragma};")
+        row = cursor.fetchone()
+        settings[pragma] = row[0] if row else None
+    cursor.close()
+    return settings
+
+
+def verify_profile(conn, name=None):
+    """Compare a connection's effective PRAGMAs against a profile.
+
+    Returns a list of (pragma, expected, actual) tuples; an empty list means
+    the connection matches the profile.
+    """
+    profile = PROFILES[name or get_profile_name()]
+    actual = read_settings(conn)
+    expected = {
+        'journal_mode': profile['journal_mode'].lower(),
+        'synchronous': _SYNCHRONOUS_LEVELS[profile['synchronous']],
+        'busy_timeout': int(profile['busy_timeout']),
+        'cache_size': int(profile['cache_size']),
+        'mmap_size': int(profile['mmap_size']),
+        'temp_store': _TEMP_STORE_LEVELS[profile['temp_store']],
+    }
+    mismatches = []
+    for pragma, value in expected.items():
+        got = actual[pragma]
+        if isinstance(got, str):
+            got = got.lower()
+        # SQLite caps mmap_size at its compile-time maximum, so only require "at most"
+        if pragma == 'mmap_size' and got is not None and got <= value:
+            continue
+        if got != value:
+            mismatches.append((pragma, value, got))
+    return mismatches
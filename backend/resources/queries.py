@@ -0,0 +1,233 @@
+import functools
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+# --- Query Catalog ---
+#
+# sqlite3 compiles each statement once per connection and keeps it in an LRU
+# cache keyed by the exact SQL text (cached_statements); psycopg likewise
+# prepares a statement server-side once it has run a few times. Text that is
+# assembled per call (an UPDATE naming just the columns given, an IN list
+# with one ? per id) misses both and is compiled again every time.
+#
+# The statements database.py used to assemble are named here instead, each
+# with a bounded set of shapes:
+#
+#   UPDATES     one statement per subset of a table's updatable columns, always
+#               in the same column order (update_statement)
+#   IN_LISTS    IN (...) lists padded to a power of two, 1 .. MAX_IN_BUCKET
+#               ids, by repeating the last id (in_statement / padded)
+#
+# Statements with constant text stay next to the function that runs them;
+# they cache as they are. STATEMENT_CACHE_SIZE covers every catalog shape
+# plus STATEMENT_CACHE_HEADROOM for those, so a busy connection never evicts
+# a statement it still uses. With STATEMENT_STATS=1 (the default) the
+# connections report each statement to StatementCache.record(), which replays
+# the same LRU to give the cache hit rate.
+
+# Largest IN list; also the chunk size for longer id lists (under SQLite's
+# default limit of 999 bound variables per statement)
+MAX_IN_BUCKET = 512
+
+UPDATES = {
+    'users.update': ('users', 'user_id', ('email', 'phone_number')),
+    'utilities.update': ('utilities', 'utility_id', ('name', 'description', 'provider_name')),
+    'bills.update': ('bills', 'bill_id', ('amount', 'due_date', 'status')),
+}
+
+IN_LISTS = {
+    'versions.by_scope': "SELECT scope, version, updated_at FROM data_versions WHERE scope IN ({ids});",
+    'bills.classify': "SELECT bill_id, user_id, amount, status FROM bills WHERE bill_id IN ({ids});",
+    'payments.insert_for_bills': '''INSERT INTO payments (bill_id, user_id, amount, payment_method, status, transaction_date)
+                                    SELECT bill_id, user_id, amount, ?, 'completed', ?
+                                    FROM bills WHERE bill_id IN ({ids});''',
+    'bills.mark_paid': "UPDATE bills SET status = 'paid' WHERE bill_id IN ({ids});",
+    'payment_jobs.open_for_bills': "SELECT bill_id FROM payment_jobs WHERE status IN ('pending', 'processing') AND bill_id IN ({ids});",
+    'reminders.owners': "SELECT DISTINCT user_id FROM reminders WHERE reminder_id IN ({ids});",
+    'reminders.mark_dispatched': '''UPDATE reminders SET dispatched_at = ?, dispatch_attempts = dispatch_attempts + 1
+                                    WHERE dispatched_at IS NULL AND reminder_id IN ({ids});''',
+}
+
+IN_BUCKETS = tuple(1 << i for i in range(MAX_IN_BUCKET.bit_length()))
+
+# --- Hot Per-Request Queries ---
+#
+# Run by database.py and checked for full scans by
+# migrations.check_query_plans (python -m resources.migrations --check-plans,
+# tests/test_query_plans.py), so the checked SQL is the SQL that runs.
+
+BILLS_BY_USER = '''SELECT b.*, u.name AS utility_name, u.provider_name AS provider_name
+                   FROM bills b JOIN utilities u ON b.utility_id = u.utility_id
+                   WHERE b.user_id = ? ORDER BY b.due_date ASC;'''
+BILLS_BY_USER_STATUS = '''SELECT b.*, u.name AS utility_name, u.provider_name AS provider_name
+                          FROM bills b JOIN utilities u ON b.utility_id = u.utility_id
+                          WHERE b.user_id = ? AND b.status = ? ORDER BY b.due_date ASC;'''
+RECENT_PAYMENTS_BY_USER = '''SELECT p.*, u.username AS username, b.due_date AS bill_due_date,
+                                    util.name AS utility_name, util.provider_name AS provider_name
+                             FROM payments p
+                             JOIN users u ON p.user_id = u.user_id
+                             JOIN bills b ON p.bill_id = b.bill_id
+                             JOIN utilities util ON b.utility_id = util.utility_id
+                             WHERE p.user_id = ? ORDER BY p.transaction_date DESC, p.payment_id DESC LIMIT ?;'''
+UPCOMING_REMINDERS_BY_USER = "SELECT * FROM reminders WHERE user_id = ? AND reminder_date >= ? ORDER BY reminder_date ASC;"
+USER_BALANCE = '''SELECT bill_count, pending_count, pending_total, paid_total, last_payment_date
+                  FROM user_balances WHERE user_id = ?;'''
+USER_OVERDUE_COUNT = "SELECT COUNT(*) AS overdue_count FROM bills WHERE user_id = ? AND status = 'pending' AND due_date < ?;"
+USER_UTILITY_BALANCES = '''SELECT ub.utility_id, util.name AS utility_name, ub.bill_count, ub.pending_count,
+                                  ROUND(ub.pending_total, 2) AS pending_total, ROUND(ub.paid_total, 2) AS paid_total
+                           FROM user_utility_balances ub
+                           JOIN utilities util ON ub.utility_id = util.utility_id
+                           WHERE ub.user_id = ? ORDER BY ub.utility_id;'''
+
+
+class UnknownColumn(ValueError):
+    """Raised for an UPDATE naming a column outside its catalog entry."""
+
+
+@functools.lru_cache(maxsize=None)
+def _update_sql(name, columns):
+    table, key, _ = UPDATES[name]
+    return f"UPDATE {table} SET {', '.join(f'{column} = ?' for column in columns)} WHERE {key} = ?;"
+
+
+def update_statement(name, values):
+    """(sql, params) updating the given {column: value} for one row; the key value is appended by the caller.
+
+    Columns come out in catalog order, so every call with the same set of
+    columns runs the same statement text.
+    """
+    _, _, allowed = UPDATES[name]
+    unknown = set(values) - set(allowed)
+    if unknown:
+        raise UnknownColumn(f"{name} cannot update {', '.join(sorted(unknown))}")
+    columns = tuple(column for column in allowed if column in values)
+    return _update_sql(name, columns), [values[column] for column in columns]
+
+
+def bucket(count):
+    """The IN-list size used for count ids (the next power of two)."""
+    if count > MAX_IN_BUCKET:
+        raise ValueError(f"IN lists hold at most {MAX_IN_BUCKET} ids; use chunks()")
+    return 1 << max(count - 1, 0).bit_length()
+
+
+def padded(ids):
+    """ids padded to their bucket size by repeating the last one (IN ignores duplicates)."""
+    ids = list(ids)
+    return ids + ids[-1:] * (bucket(len(ids)) - len(ids))
+
+
+def chunks(ids):
+    """Split ids into lists of at most MAX_IN_BUCKET."""
+    ids = list(ids)
+    for i in range(0, len(ids), MAX_IN_BUCKET):
+        yield ids[i:i + MAX_IN_BUCKET]
+
+
+@functools.lru_cache(maxsize=None)
+def _in_sql(name, size):
+    return IN_LISTS[name].format(ids=','.join('?' * size))
+
+
+def in_statement(name, ids):
+    """(sql, padded ids) for an IN-list statement over at most MAX_IN_BUCKET ids."""
+    ids = padded(ids)
+    return _in_sql(name, len(ids)), ids
+
+
+def catalog():
+    """{statement text: catalog name} for every shape the catalog can produce."""
+    statements = {}
+    for name, (_, _, allowed) in UPDATES.items():
+        for mask in range(1, 1 << len(allowed)):
+            columns = tuple(column for i, column in enumerate(allowed) if mask & (1 << i))
+            statements[_update_sql(name, columns)] = name
+    for name in IN_LISTS:
+        for size in IN_BUCKETS:
+            statements[_in_sql(name, size)] = name
+    return statements
+
+
+_names = catalog()
+
+# Room for the constant statements outside the catalog (there are ~200)
+STATEMENT_CACHE_HEADROOM = int(os.environ.get("STATEMENT_CACHE_HEADROOM", "256"))
+STATEMENT_CACHE_SIZE = int(os.environ.get("STATEMENT_CACHE_SIZE", "0")) or len(_names) + STATEMENT_CACHE_HEADROOM
+STATEMENT_STATS = os.environ.get("STATEMENT_STATS", "1") == "1"
+
+
+# --- Statement Cache Hit Rates ---
+#
+# A connection is used by one thread at a time, so each StatementCache counts
+# into its own dict without a lock; get_cache_metrics() merges the live
+# caches with the totals of connections already closed (_retired).
+
+_lock = threading.RLock()  # guards _caches and _retired; a GC finalizer may take it mid-read
+_caches = weakref.WeakSet()
+_retired = {'evictions': 0}  # 'evictions', and catalog name (or 'other') -> [hits, misses]
+
+
+def _retire(counts):
+    with _lock:
+        for name, value in counts.items():
+            if name == 'evictions':
+                _retired['evictions'] += value
+            else:
+                merged = _retired.setdefault(name, [0, 0])
+                merged[0] += value[0]
+                merged[1] += value[1]
+
+
+class StatementCache:
+    """Replays one connection's statement LRU to count hits and misses."""
+
+    def __init__(self, size=STATEMENT_CACHE_SIZE):
+        self.size = size
+        self._statements = OrderedDict()
+        self.counts = {'evictions': 0}  # 'evictions', and catalog name (or 'other') -> [hits, misses]
+        with _lock:
+            _caches.add(self)
+        weakref.finalize(self, _retire, self.counts)
+
+    def record(self, sql):
+        if not STATEMENT_STATS:
+            return
+        hit = sql in self._statements
+        if hit:
+            self._statements.move_to_end(sql)
+        else:
+            self._statements[sql] = None
+            if len(self._statements) > self.size:
+                self._statements.popitem(last=False)
+                self.counts['evictions'] += 1
+        name = _names.get(sql, 'other')
+        counts = self.counts.get(name)
+        if counts is None:
+            counts = self.counts[name] = [0, 0]
+        counts[0 if hit else 1] += 1
+
+
+def _rate(hits, misses):
+    return round(hits / (hits + misses), 4) if hits + misses else None
+
+
+def get_cache_metrics():
+    """Statement cache size, hits, misses and hit rate, overall and per catalog statement."""
+    with _lock:
+        sources = [dict(_retired)] + [dict(cache.counts) for cache in list(_caches)]
+    evictions = 0
+    stats = {}
+    for counts in sources:
+        evictions += counts.pop('evictions')
+        for name, (h, m) in counts.items():
+            total = stats.setdefault(name, [0, 0])
+            total[0] += h
+            total[1] += m
+    hits = sum(h for h, _ in stats.values())
+    misses = sum(m for _, m in stats.values())
+    return {'size': STATEMENT_CACHE_SIZE, 'catalog_statements': len(_names),
+            'hits': hits, 'misses': misses, 'hit_rate': _rate(hits, misses), 'evictions': evictions,
+            'statements': {name: {'hits': h, 'misses': m, 'hit_rate': _rate(h, m)}
+                           for name, (h, m) in sorted(stats.items())}}
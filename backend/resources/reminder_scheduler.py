@@ -0,0 +1,171 @@
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from resources import database as db
+from resources import billing
+from resources import notifier
+
+# --- Scheduled Reminders ---
+#
+# Every REMINDER_INTERVAL seconds the scheduler
+#   1. creates reminders for pending bills due within REMINDER_DAYS_AHEAD days
+#      (one set-based INSERT, deduplicated per bill, incremental from the
+#      checkpoints left by the previous run), then
+#   2. drains the reminders that have fallen due through the notifier, fanned
+#      out over REMINDER_DISPATCH_WORKERS threads and capped at
+#      REMINDER_RATE_PER_SEC sends per second.
+# A failed send is retried on later runs up to REMINDER_MAX_ATTEMPTS times.
+# It can also run as its own process:
+#
+#     python -m resources.reminder_scheduler [--once]
+
+REMINDER_DAYS_AHEAD = int(os.environ.get("REMINDER_DAYS_AHEAD", "7"))
+REMINDER_INTERVAL = float(os.environ.get("REMINDER_INTERVAL", "300"))
+REMINDER_DISPATCH_WORKERS = int(os.environ.get("REMINDER_DISPATCH_WORKERS", "4"))
+REMINDER_RATE_PER_SEC = float(os.environ.get("REMINDER_RATE_PER_SEC", "20"))
+REMINDER_BATCH_SIZE = int(os.environ.get("REMINDER_BATCH_SIZE", "500"))
+REMINDER_MAX_ATTEMPTS = int(os.environ.get("REMINDER_MAX_ATTEMPTS", "5"))
+
+
+class RateLimiter:
+    """Token bucket shared by the dispatch threads; rate <= 0 means unlimited."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class ReminderScheduler:
+    """A background thread that generates and dispatches reminders on an interval."""
+
+    def __init__(self, interval=REMINDER_INTERVAL, workers=REMINDER_DISPATCH_WORKERS,
+                 rate=REMINDER_RATE_PER_SEC, days_ahead=REMINDER_DAYS_AHEAD):
+        self.interval = interval
+        self.workers = workers
+        self.days_ahead = days_ahead
+        self.limiter = RateLimiter(rate)
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.generated = 0
+        self.dispatched = 0
+        self.failed = 0
+        self.last_run = None
+
+    def start(self):
+        if self._thread:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="reminder-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop after the batch in flight and wait for the thread to exit."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Error in reminder scheduler run: {e}")
+            self._stop.wait(self.interval)
+
+    def run_once(self, today=None):
+        """Generate due reminders and send everything that has fallen due. Returns the run's counts."""
+        generated = db.generate_due_reminders(self.days_ahead, billing.REMINDER_DAYS_BEFORE, today) or 0
+        dispatched = failed = 0
+        after = None
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="reminder-dispatch") as pool:
+            while not self._stop.is_set():
+                batch = db.get_dispatchable_reminders(today, after, REMINDER_BATCH_SIZE, REMINDER_MAX_ATTEMPTS)
+                if not batch:
+                    break
+                # Keyset past this batch, so a failed reminder is tried once per run, not in a tight loop
+                after = (batch[-1]['reminder_date'], batch[-1]['reminder_id'])
+                sent, failures = [], []
+                for reminder, error in zip(batch, pool.map(self._send, batch)):
+                    if error is None:
+                        sent.append(reminder['reminder_id'])
+                    else:
+                        failures.append((reminder['reminder_id'], error))
+                db.mark_reminders_dispatched(sent)
+                db.record_reminder_failures(failures, REMINDER_MAX_ATTEMPTS)
+                dispatched += len(sent)
+                failed += len(failures)
+        stats = {'generated': generated, 'dispatched': dispatched, 'failed': failed}
+        with self._lock:
+            self.runs += 1
+            self.generated += generated
+            self.dispatched += dispatched
+            self.failed += failed
+            self.last_run = time.strftime('%Y-%m-%d %H:%M:%S')
+        return stats
+
+    def _send(self, reminder):
+        self.limiter.acquire()
+        try:
+            notifier.get_notifier().send(reminder)
+            return None
+        except Exception as e:
+            return str(e) or type(e).__name__
+
+    def metrics(self):
+        with self._lock:
+            return {'running': self.running, 'runs': self.runs, 'last_run': self.last_run,
+                    'generated': self.generated, 'dispatched': self.dispatched, 'failed': self.failed}
+
+
+scheduler = ReminderScheduler()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate and dispatch bill reminders.")
+    parser.add_argument('--once', action='store_true', help="Do a single run and exit.")
+    parser.add_argument('--today', help="Treat this date (YYYY-MM-DD) as today (with --once).")
+    args = parser.parse_args(argv)
+
+    db.migrate()
+    if args.once:
+        print(scheduler.run_once(args.today))
+        return
+    scheduler.start()
+    print(f"Reminder scheduler running every {scheduler.interval:g}s. Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("Stopping reminder scheduler...")
+        scheduler.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import argparse
+import itertools
+import os
+import sqlite3
+import threading
+import time
+
+from resources import queries
+from resources.engines import ObservedConnection
+from resources.pool import ConnectionPool
+
+# --- Read Replicas ---
+#
+# READ_REPLICAS names one or more local SQLite files that mirror the primary
+# DATABASE. ReplicaSyncer copies the primary into each of them with the SQLite
+# online backup API whenever the primary has changed (PRAGMA data_version),
+# then stamps the copy's replica_state row with the time the copy started.
+# Any process can tell from that stamp how far behind a replica is, so the
+# syncer can run as a thread in the app or as its own sidecar process:
+#
+#     python -m resources.replicas
+#
+# database.get_read_connection() sends read-only queries to a replica no more
+# than REPLICA_MAX_LAG seconds behind, and falls back to the primary
+# otherwise. Each sync copies the whole file, so keep the interval well above
+# the time a backup of the database takes.
+
+READ_REPLICAS = [path.strip() for path in os.environ.get("READ_REPLICAS", "").split(',') if path.strip()]
+REPLICA_MAX_LAG = float(os.environ.get("REPLICA_MAX_LAG", "5"))
+REPLICA_SYNC_INTERVAL = float(os.environ.get("REPLICA_SYNC_INTERVAL", "1"))
+# How long a process trusts the replica_state stamp it last read
+REPLICA_STATE_TTL = float(os.environ.get("REPLICA_STATE_TTL", "0.25"))
+
+
+class Replica:
+    """One replica file with its own pool of read-only connections."""
+
+    def __init__(self, path, pool_size=5, busy_timeout=5.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.pool = ConnectionPool(self._connect, max_size=pool_size)
+        self._synced_at = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if not os.path.exists(self.path):
+            return None
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, check_same_thread=False,
+                               factory=ObservedConnection, cached_statements=queries.STATEMENT_CACHE_SIZE)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA query_only = ON;")
+        return conn
+
+    def synced_at(self):
+        """Wall-clock time the replica's current contents were copied from the primary (None if unknown)."""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked_at < REPLICA_STATE_TTL:
+                return self._synced_at
+        try:
+            with self.pool.connection() as conn:
+                row = conn.execute("SELECT synced_at FROM replica_state WHERE id = 1;").fetchone()
+            synced_at = row[0] if row else None
+        except sqlite3.Error:
+            synced_at = None
+        with self._lock:
+            self._synced_at, self._checked_at = synced_at, now
+        return synced_at
+
+    def lag(self):
+        synced_at = self.synced_at()
+        return None if synced_at is None else max(0.0, time.time() - synced_at)
+
+
+class ReplicaSet:
+    """Picks a fresh-enough replica for each read, round robin."""
+
+    def __init__(self, paths, pool_size=5, busy_timeout=5.0, max_lag=REPLICA_MAX_LAG):
+        self.replicas = [Replica(path, pool_size, busy_timeout) for path in paths]
+        self.max_lag = max_lag
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+        self._stats = {'replica_reads': 0, 'primary_reads': 0, 'stale_fallbacks': 0, 'sticky_fallbacks': 0}
+
+    def __bool__(self):
+        return bool(self.replicas)
+
+    def choose(self, caught_up=None):
+        """Return a replica within max_lag (and for which caught_up(replica) holds), or None for the primary."""
+        start = next(self._turn)
+        fresh = []
+        for i in range(len(self.replicas)):
+            replica = self.replicas[(start + i) % len(self.replicas)]
+            lag = replica.lag()
+            if lag is not None and lag <= self.max_lag:
+                fresh.append(replica)
+        chosen, reason = None, 'stale_fallbacks'
+        for replica in fresh:
+            if caught_up is None or caught_up(replica):
+                chosen = replica
+                break
+            reason = 'sticky_fallbacks'
+        with self._lock:
+            if chosen is None:
+                self._stats['primary_reads'] += 1
+                self._stats[reason] += 1
+            else:
+                self._stats['replica_reads'] += 1
+        return chosen
+
+    def count_primary_read(self):
+        with self._lock:
+            self._stats['primary_reads'] += 1
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lags = {replica.path: replica.lag() for replica in self.replicas}
+        stats['lag_seconds'] = {path: None if lag is None else round(lag, 3) for path, lag in lags.items()}
+        stats['max_lag'] = self.max_lag
+        return stats
+
+
+class ReplicaSyncer:
+    """A background thread that keeps every replica file a recent copy of the primary."""
+
+    def __init__(self, primary_path, replica_paths, interval=REPLICA_SYNC_INTERVAL):
+        self.primary_path = primary_path
+        self.replica_paths = list(replica_paths)
+        self.interval = interval
+        self._primary = None
+        self._replicas = {}
+        self._data_version = None
+        self._thread = None
+        self._stop = threading.Event()
+        self.syncs = 0
+        self.last_sync_seconds = None
+        self.errors = 0
+
+    def start(self):
+        if self._thread or not self.replica_paths:
+            return
+        self._stop.clear()
+        self.sync_once()
+        self._thread = threading.Thread(target=self._run, name="replica-syncer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sync_once()
+            except sqlite3.Error as e:
+                self.errors += 1
+                print(f"Error syncing read replicas: {e}")
+
+    def sync_once(self):
+        """Copy the primary into every replica if it changed, then stamp them. Returns True if copied."""
+        if self._primary is None:
+            self._primary = sqlite3.connect(self.primary_path, check_same_thread=False)
+        # Taken before the change check: every commit before this moment is in the copy
+        started = time.time()
+        data_version = self._primary.execute("PRAGMA data_version;").fetchone()[0]
+        copied = data_version != self._data_version
+        for path in self.replica_paths:
+            dest = self._replicas.get(path)
+            if dest is None:
+                dest = self._replicas[path] = sqlite3.connect(path, check_same_thread=False)
+                copied = True
+            if copied:
+                began = time.perf_counter()
+                self._primary.backup(dest)
+                self.last_sync_seconds = round(time.perf_counter() - began, 4)
+            dest.execute("UPDATE replica_state SET synced_at = ? WHERE id = 1;", (started,))
+            dest.commit()
+        if copied:
+            self._data_version = data_version
+            self.syncs += 1
+        return copied
+
+    def metrics(self):
+        return {'running': self.running, 'replicas': self.replica_paths, 'syncs': self.syncs,
+                'last_sync_seconds': self.last_sync_seconds, 'errors': self.errors}
+
+
+if __name__ == "__main__":
+    # Sidecar syncer: python -m resources.replicas [--once]
+    from resources import database as db
+
+    parser = argparse.ArgumentParser(description="Keep the READ_REPLICAS files in step with the primary database.")
+    parser.add_argument('--once', action='store_true', help="Sync once and exit")
+    args = parser.parse_args()
+    if not READ_REPLICAS:
+        raise SystemExit("READ_REPLICAS is not set.")
+    db.migrate()
+    syncer = ReplicaSyncer(db.DATABASE, READ_REPLICAS)
+    if args.once:
+        syncer.sync_once()
+    else:
+        syncer.start()
+        print(f"Syncing {', '.join(READ_REPLICAS)} every {syncer.interval:g}s. Ctrl+C to stop.")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            syncer.stop()
@@ -0,0 +1,119 @@
+import json
+
+from flask import make_response
+
+from resources import instrumentation
+
+try:
+    import orjson
+except ImportError:  # optional fast encoder
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional binary encoding
+    msgpack = None
+
+# --- Response Serialization ---
+#
+# List queries hand back a RowSet: the cursor's plain tuples plus the column
+# names read once from cursor.description, instead of one sqlite3.Row -> dict
+# conversion per row. The flask-restful representations below encode
+# responses with orjson when it is installed (stdlib json otherwise), and with
+# MessagePack when the client sends "Accept: application/msgpack".
+
+JSON_MEDIATYPE = 'application/json'
+MSGPACK_MEDIATYPE = 'application/msgpack'
+
+
+class RowSet:
+    """Query rows as tuples sharing one list of column names."""
+
+    __slots__ = ('columns', 'rows')
+
+    def __init__(self, columns, rows):
+        self.columns = columns
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __bool__(self):
+        return bool(self.rows)
+
+    def index(self, column):
+        return self.columns.index(column)
+
+    def to_dicts(self):
+        columns = self.columns
+        return [dict(zip(columns, row)) for row in self.rows]
+
+
+def fetch_rowset(cursor):
+    """Fetch every remaining row of an executed cursor as a RowSet of tuples.
+
+    The cursor should have row_factory = None so SQLite hands back plain tuples.
+    """
+    columns = [d[0] for d in cursor.description] if cursor.description else []
+    return RowSet(columns, cursor.fetchall())
+
+
+def tuple_cursor(conn):
+    """A cursor on conn that returns plain tuples instead of sqlite3.Row."""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    return cursor
+
+
+def _default(obj):
+    if isinstance(obj, RowSet):
+        return obj.to_dicts()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+# --- Encoders ---
+
+def dumps_json(data):
+    """Encode data as JSON bytes using the fastest available backend."""
+    if orjson is not None:
+        return orjson.dumps(data, default=_default)
+    return json.dumps(data, default=_default, separators=(',', ':')).encode('utf-8')
+
+
+def dumps_msgpack(data):
+    return msgpack.packb(data, default=_default, use_bin_type=True)
+
+
+def encoder_name():
+    return 'orjson' if orjson is not None else 'json'
+
+
+# --- flask-restful representations ---
+
+def output_json(data, code, headers=None):
+    with instrumentation.span('encode.json', 'encode'):
+        body = dumps_json(data)
+    response = make_response(body, code)
+    response.headers['Content-Type'] = JSON_MEDIATYPE
+    response.headers.extend(headers or {})
+    return response
+
+
+def output_msgpack(data, code, headers=None):
+    with instrumentation.span('encode.msgpack', 'encode'):
+        body = dumps_msgpack(data)
+    response = make_response(body, code)
+    response.headers['Content-Type'] = MSGPACK_MEDIATYPE
+    response.headers.extend(headers or {})
+    return response
+
+
+def register(api):
+    """Install the encoders on a flask-restful Api (JSON first, so it stays the default)."""
+    api.representations = {JSON_MEDIATYPE: output_json}
+    if msgpack is not None:
+        api.representations[MSGPACK_MEDIATYPE] = output_msgpack
+        api.representations['application/x-msgpack'] = output_msgpack
@@ -0,0 +1,156 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+
+from resources import database as db
+
+# --- Signed Session Tokens ---
+#
+# Tokens look like  v1.<kid>.<payload>.<signature>  where payload is base64url
+# JSON claims and signature is HMAC-SHA256 over "v1.<kid>.<payload>" with the
+# key named by <kid>. Verification needs no database lookup: only the key
+# table and the in-memory revocation list.
+#
+# TOKEN_KEYS="kid2:secret2,kid1:secret1" - the first key signs new tokens,
+# the rest are still accepted so keys can be rotated without logging users out.
+# Without TOKEN_KEYS a well-known development key is used; the production
+# launchers (gunicorn.conf.py, asgi.py) refuse to start with it.
+
+TOKEN_VERSION = 'v1'
+TOKEN_TTL = int(os.environ.get("TOKEN_TTL", "3600"))
+REVOCATION_REFRESH = float(os.environ.get("TOKEN_REVOCATION_REFRESH", "5"))
+DEV_TOKEN_KEYS = "dev:change-me-in-production"
+
+
+class InvalidToken(Exception):
+    """Raised when a token is malformed, badly signed, expired or revoked."""
+
+
+def _load_keys():
+    raw = os.environ.get("TOKEN_KEYS", DEV_TOKEN_KEYS)
+    keys = []
+    for entry in raw.split(','):
+        kid, _, secret = entry.strip().partition(':')
+        if kid and secret:
+            keys.append((kid, secret.encode('utf-8')))
+    if not keys:
+        raise ValueError("TOKEN_KEYS must contain at least one 'kid:secret' entry.")
+    return keys
+
+
+_keys = _load_keys()
+SIGNING_KID = _keys[0][0]
+KEYS = dict(_keys)
+USING_DEV_KEY = os.environ.get("TOKEN_KEYS", DEV_TOKEN_KEYS) == DEV_TOKEN_KEYS
+
+if USING_DEV_KEY:
+    print("WARNING: TOKEN_KEYS is not set; session tokens are signed with the public development key. "
+          "Anyone can forge them. Set TOKEN_KEYS before deploying.")
+
+
+def require_production_keys():
+    """Refuse to serve production traffic with tokens signed by the development key."""
+    if USING_DEV_KEY:
+        raise RuntimeError("TOKEN_KEYS is not set: refusing to sign session tokens with the development key "
+                           "(set TOKEN_KEYS=\"kid:secret\").")
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _sign(kid, signing_input):
+    return hmac.new(KEYS[kid], signing_input.encode('ascii'), hashlib.sha256).digest()
+
+
+# --- Issue / Verify ---
+
+def issue_token(user_id, role='user', ttl=None):
+    """Create a signed token for a user. Returns (token, claims)."""
+    now = int(time.time())
+    claims = {
+        'uid': user_id,
+        'role': role,
+        'iat': now,
+        'exp': now + (ttl or TOKEN_TTL),
+        'jti': secrets.token_urlsafe(12),
+    }
+    payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode('utf-8'))
+    signing_input = f"{TOKEN_VERSION}.{SIGNING_KID}.{payload}"
+    return f"{signing_input}.{_b64encode(_sign(SIGNING_KID, signing_input))}", claims
+
+
+def verify_token(token):
+    """Return the claims of a valid token, or raise InvalidToken."""
+    try:
+        version, kid, payload, signature = token.split('.')
+    except (AttributeError, ValueError):
+        raise InvalidToken("Malformed token.")
+    if version != TOKEN_VERSION or kid not in KEYS:
+        raise InvalidToken("Unknown token version or key.")
+
+    expected = _sign(kid, f"{version}.{kid}.{payload}")
+    try:
+        given = _b64decode(signature)
+    except ValueError:
+        raise InvalidToken("Malformed token signature.")
+    if not hmac.compare_digest(expected, given):
+        raise InvalidToken("Bad token signature.")
+
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        raise InvalidToken("Malformed token payload.")
+    if claims.get('exp', 0) < time.time():
+        raise InvalidToken("Token expired.")
+    if is_revoked(claims.get('jti')):
+        raise InvalidToken("Token revoked.")
+    return claims
+
+
+# --- Revocation List ---
+#
+# Revoked token ids live in memory for O(1) checks and in the revoked_tokens
+# table so other worker processes (and restarts) see them. Each process pulls
+# new revocations from SQLite at most every REVOCATION_REFRESH seconds.
+
+_revoked = {}  # jti -> expires_at
+_revoked_lock = threading.Lock()
+_last_refresh = 0.0
+
+
+def _refresh_revocations(force=False):
+    global _last_refresh
+    now = time.time()
+    if not force and now - _last_refresh < REVOCATION_REFRESH:
+        return
+    rows = db.get_revoked_tokens(int(now))
+    with _revoked_lock:
+        _last_refresh = now
+        if rows is None:
+            # Keep the last known list (and retry next interval) rather than accept revoked tokens
+            return
+        _revoked.clear()
+        _revoked.update((row['jti'], row['expires_at']) for row in rows)
+
+
+def is_revoked(jti):
+    _refresh_revocations()
+    with _revoked_lock:
+        return jti in _revoked
+
+
+def revoke(claims):
+    """Revoke a token (by its claims) until it would have expired anyway."""
+    with _revoked_lock:
+        _revoked[claims['jti']] = claims['exp']
+    return db.add_revoked_token(claims['jti'], claims['exp'])
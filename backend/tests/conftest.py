@@ -0,0 +1,65 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Every setting is read at import time, so point the app at a throwaway
+# database (and fast, in-process hashing) before any resources module loads.
+# Set DATABASE_URL=postgresql://... to run the suite against PostgreSQL.
+WORKDIR = tempfile.mkdtemp(prefix='utility-tests-')
+os.environ.setdefault("DATABASE_URL", os.path.join(WORKDIR, 'test.db'))
+os.environ.setdefault("CACHE_DATABASE", os.path.join(WORKDIR, 'cache.db'))
+os.environ.setdefault("TOKEN_KEYS", "test:test-signing-key")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("HASH_WORKERS", "0")
+os.environ["READ_REPLICAS"] = ""
+os.chdir(WORKDIR)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db():
+    """resources.database on a freshly migrated, empty schema."""
+    from resources import database
+
+    database.create_table()
+    yield database
+
+
+@pytest.fixture
+def app(db):
+    from application import app
+
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(db):
+    """Create a user and return their user_id."""
+    def make_user(username='alice', role='user'):
+        assert db.add_user(username, 'Passw0rd!x', f'{username}@example.com', '9876543210', role=role) is True
+        return db.get_user_by_username(username)['user_id']
+    return make_user
+
+
+@pytest.fixture
+def utility_id(db):
+    return db.add_utility('Electricity', 'Power supply', 'Tata Power')
+
+
+@pytest.fixture
+def auth_headers():
+    """Bearer headers for a signed token (role 'admin' for the admin API)."""
+    from resources import tokens
+
+    def auth_headers(user_id, role='user'):
+        token, _ = tokens.issue_token(user_id, role)
+        return {'Authorization': f'Bearer {token}'}
+    return auth_headers
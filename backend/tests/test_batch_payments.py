@@ -0,0 +1,140 @@
+import pytest
+
+from resources import queries
+
+
+@pytest.fixture
+def alice(make_user):
+    return make_user('alice')
+
+
+@pytest.fixture
+def make_bills(db, utility_id):
+    def make_bills(user_id, count=1, amount=100.0):
+        return [db.add_bill(user_id, utility_id, amount + i, '2030-01-31') for i in range(count)]
+    return make_bills
+
+
+@pytest.fixture
+def pay(client, auth_headers):
+    def pay(user_id, bill_ids, key=None, method='UPI'):
+        headers = auth_headers(user_id)
+        if key:
+            headers['Idempotency-Key'] = key
+        return client.post(f'/api/payments/batch/{user_id}', json={'bill_ids': bill_ids, 'payment_method': method},
+                           headers=headers)
+    return pay
+
+
+def outcomes(response):
+    return {r['bill_id']: r['outcome'] for r in response.get_json()['results']}
+
+
+# --- Per-Bill Outcomes ---
+
+def test_pays_every_pending_bill_in_one_request(db, alice, make_bills, pay):
+    bill_ids = make_bills(alice, 3)
+
+    response = pay(alice, bill_ids)
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert outcomes(response) == dict.fromkeys(bill_ids, 'paid')
+    assert body['total_paid'] == 303.0
+    assert len({r['payment_id'] for r in body['receipts']}) == 3
+    assert all(db.get_bill_by_id(b)['status'] == 'paid' for b in bill_ids)
+    assert len(db.get_all_payments()) == 3
+
+
+def test_reports_an_outcome_for_every_requested_bill(db, alice, make_user, make_bills, pay):
+    mine, paid = make_bills(alice, 2)
+    theirs, = make_bills(make_user('bob'))
+    pay(alice, [paid])
+
+    response = pay(alice, [mine, paid, theirs, 999999, mine])
+
+    assert response.status_code == 200
+    assert outcomes(response) == {mine: 'paid', paid: 'already_paid', theirs: 'not_owned', 999999: 'not_found'}
+    assert len(response.get_json()['results']) == 4  # duplicates are paid once
+    assert db.get_bill_by_id(theirs)['status'] == 'pending'
+
+
+def test_bills_with_a_queued_payment_job_are_left_to_the_job(db, alice, make_bills, pay):
+    queued, free = make_bills(alice, 2)
+    db.enqueue_payment_job(queued, alice, 100.0, 'UPI')
+
+    response = pay(alice, [queued, free])
+
+    assert outcomes(response) == {queued: 'in_progress', free: 'paid'}
+    assert db.get_bill_by_id(queued)['status'] == 'pending'
+
+
+def test_large_batches_are_paid_in_chunks(db, alice, make_bills, pay, monkeypatch):
+    monkeypatch.setattr(queries, 'MAX_IN_BUCKET', 4)
+    bill_ids = make_bills(alice, 10)
+
+    response = pay(alice, bill_ids)
+
+    assert outcomes(response) == dict.fromkeys(bill_ids, 'paid')
+    assert sorted(p['bill_id'] for p in db.get_all_payments()) == sorted(bill_ids)
+
+
+# --- Idempotency Keys ---
+
+def test_retry_with_the_same_key_replays_the_stored_outcome(db, alice, make_bills, pay):
+    bill_ids = make_bills(alice, 2)
+
+    first = pay(alice, bill_ids, key='order-1')
+    retry = pay(alice, list(reversed(bill_ids)), key='order-1')
+
+    assert first.headers['Idempotent-Replayed'] == 'false'
+    assert retry.status_code == 200
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.get_json() == first.get_json()
+    assert outcomes(retry) == dict.fromkeys(bill_ids, 'paid')  # not already_paid
+    assert len(db.get_all_payments()) == 2
+
+
+def test_reusing_a_key_for_a_different_request_is_a_conflict(db, alice, make_bills, pay):
+    first, second = make_bills(alice, 2)
+    pay(alice, [first], key='order-1')
+
+    assert pay(alice, [second], key='order-1').status_code == 409
+    assert pay(alice, [first], key='order-1', method='Card').status_code == 409
+    assert db.get_bill_by_id(second)['status'] == 'pending'
+
+
+def test_keys_are_scoped_to_the_user(db, alice, make_user, make_bills, pay):
+    bob = make_user('bob')
+    alices, = make_bills(alice)
+    bobs, = make_bills(bob)
+    pay(alice, [alices], key='order-1')
+
+    response = pay(bob, [bobs], key='order-1')
+
+    assert response.headers['Idempotent-Replayed'] == 'false'
+    assert outcomes(response) == {bobs: 'paid'}
+
+
+def test_without_a_key_a_retry_pays_nothing_twice(db, alice, make_bills, pay):
+    bill_ids = make_bills(alice, 2)
+    pay(alice, bill_ids)
+
+    retry = pay(alice, bill_ids)
+
+    assert outcomes(retry) == dict.fromkeys(bill_ids, 'already_paid')
+    assert len(db.get_all_payments()) == 2
+
+
+# --- Request Validation ---
+
+def test_rejects_other_users_and_malformed_bodies(client, alice, make_user, make_bills, auth_headers):
+    bill_ids = make_bills(alice)
+    url = f'/api/payments/batch/{alice}'
+
+    assert client.post(url, json={'bill_ids': bill_ids, 'payment_method': 'UPI'}).status_code == 401
+    assert client.post(url, json={'bill_ids': bill_ids, 'payment_method': 'UPI'},
+                       headers=auth_headers(make_user('bob'))).status_code == 403
+    assert client.post(url, json={'bill_ids': ['1'], 'payment_method': 'UPI'},
+                       headers=auth_headers(alice)).status_code == 400
+    assert client.post(url, json={'bill_ids': bill_ids}, headers=auth_headers(alice)).status_code == 400
@@ -0,0 +1,25 @@
+import os
+
+import pytest
+
+from resources import billing
+
+
+@pytest.fixture
+def admin(make_user, auth_headers):
+    return auth_headers(make_user('admin', role='admin'), role='admin')
+
+
+@pytest.mark.parametrize('workers', [0, -1, (os.cpu_count() or 1) + 1, 10 ** 6, '4', 2.5, True, [2]])
+def test_start_rejects_bad_worker_counts(client, admin, workers):
+    response = client.post('/api/admin/billing-runs', json={'period': '2030-01', 'workers': workers}, headers=admin)
+
+    assert response.status_code == 400
+    assert 'workers' in response.get_json()['message']
+    assert billing.get_billing_run(1) is None
+
+
+def test_worker_counts_up_to_the_cpu_count_are_accepted():
+    assert billing.check_workers(None) is None
+    assert billing.check_workers(1) == 1
+    assert billing.check_workers(os.cpu_count() or 1) == (os.cpu_count() or 1)
@@ -0,0 +1,98 @@
+import sqlite3
+
+import pytest
+
+from resources import cache
+
+
+@pytest.fixture(params=['memory', 'shared'])
+def backend(request, tmp_path, monkeypatch):
+    if request.param == 'memory':
+        backend = cache.MemoryBackend()
+    else:
+        backend = cache.SQLiteBackend(str(tmp_path / 'cache.db'))
+    monkeypatch.setattr(cache, 'backend', backend)
+    return backend
+
+
+# --- Invalidation Races ---
+
+def test_a_miss_that_read_before_an_invalidation_is_not_stored(backend):
+    row = {'name': 'old'}
+
+    @cache.cached('things')
+    def get_thing(thing_id):
+        value = dict(row)
+        # A writer commits and invalidates while this miss is still reading
+        row['name'] = 'new'
+        cache.invalidate('things', thing_id)
+        return value
+
+    assert get_thing(1) == {'name': 'old'}
+    assert backend.get(cache.make_key('things', [1])) == (False, None)
+    assert get_thing.uncached(1) == {'name': 'new'}
+
+
+def test_namespace_invalidation_also_turns_away_misses_in_flight(backend):
+    @cache.cached('lists')
+    def get_list():
+        cache.invalidate_namespace('lists')
+        return ['old']
+
+    get_list()
+
+    assert backend.get(cache.make_key('lists')) == (False, None)
+
+
+def test_misses_without_a_concurrent_write_are_stored_and_hit(backend):
+    calls = []
+
+    @cache.cached('things')
+    def get_thing(thing_id):
+        calls.append(thing_id)
+        return {'id': thing_id}
+
+    assert get_thing(1) == get_thing(1) == {'id': 1}
+    assert calls == [1]
+    cache.invalidate('things', 1)
+    assert get_thing(1) == {'id': 1} and calls == [1, 1]
+
+
+def test_generations_are_shared_between_processes(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    worker_a, worker_b = cache.SQLiteBackend(path), cache.SQLiteBackend(path)
+    seen = worker_a.generation('user')
+
+    worker_b.delete(cache.make_key('user', [1]), 'user')
+
+    assert worker_a.set(cache.make_key('user', [1]), {'user_id': 1}, 60, 'user', seen) is False
+    assert worker_a.set(cache.make_key('user', [1]), {'user_id': 1}, 60, 'user', worker_a.generation('user')) is True
+    assert worker_b.get(cache.make_key('user', [1])) == (True, {'user_id': 1})
+
+
+# --- Cached User Profiles ---
+
+def test_cached_profiles_never_hold_the_password_hash(db, make_user, backend):
+    user_id = make_user()
+
+    profile = db.get_user_profile(user_id)
+
+    assert profile['username'] == 'alice' and 'password_hash' not in profile
+    hit, cached = backend.get(cache.make_key('user', [user_id]))
+    assert hit and 'password_hash' not in cached
+    if isinstance(backend, cache.SQLiteBackend):
+        conn = sqlite3.connect(backend.path)
+        assert '$2' not in ''.join(value for value, in conn.execute("SELECT value FROM cache_entries;"))
+        conn.close()
+
+
+def test_profile_updates_are_visible_immediately(client, db, make_user, auth_headers, backend):
+    user_id = make_user()
+    assert client.get(f'/api/users/{user_id}', headers=auth_headers(user_id)).status_code == 200
+
+    response = client.put(f'/api/users/{user_id}', json={'email': 'new@example.com'}, headers=auth_headers(user_id))
+
+    assert response.status_code == 200
+    assert response.get_json()['user']['email'] == 'new@example.com'
+    assert 'password_hash' not in response.get_json()['user']
+    assert client.get(f'/api/users/{user_id}', headers=auth_headers(user_id)).get_json()['user']['email'] == 'new@example.com'
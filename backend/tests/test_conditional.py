@@ -0,0 +1,137 @@
+import pytest
+
+from resources.conditional import compute_etag
+
+
+@pytest.fixture
+def alice(make_user):
+    return make_user('alice')
+
+
+@pytest.fixture
+def get_bills(client, auth_headers):
+    def get_bills(user_id, **headers):
+        headers.update(auth_headers(user_id))
+        return client.get(f'/api/bills/{user_id}', headers=headers)
+    return get_bills
+
+
+def fail(*args, **kwargs):
+    pytest.fail("the handler ran for a request that should have been answered with 304")
+
+
+# --- Validators ---
+
+def test_200_carries_etag_last_modified_and_cache_control(db, alice, utility_id, get_bills):
+    db.add_bill(alice, utility_id, 100.0, '2030-01-31')
+
+    response = get_bills(alice)
+
+    assert response.status_code == 200
+    assert response.headers['ETag'].startswith('W/"')
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+    assert response.headers['Last-Modified'].endswith(' GMT')
+    assert len(response.get_json()['bills']) == 1
+
+
+def test_matching_if_none_match_is_answered_with_304_without_running_the_query(db, alice, utility_id, get_bills,
+                                                                               monkeypatch):
+    db.add_bill(alice, utility_id, 100.0, '2030-01-31')
+    etag = get_bills(alice).headers['ETag']
+    monkeypatch.setattr(db, 'get_bills_by_user', fail)
+
+    response = get_bills(alice, **{'If-None-Match': etag})
+
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    assert response.data == b''
+    assert get_bills(alice, **{'If-None-Match': f'W/"other", {etag}'}).status_code == 304
+
+
+def test_if_modified_since_is_answered_with_304(db, alice, utility_id, get_bills, monkeypatch):
+    db.add_bill(alice, utility_id, 100.0, '2030-01-31')
+    last_modified = get_bills(alice).headers['Last-Modified']
+    monkeypatch.setattr(db, 'get_bills_by_user', fail)
+
+    assert get_bills(alice, **{'If-Modified-Since': last_modified}).status_code == 304
+
+
+def test_stale_etag_gets_a_full_response(db, alice, get_bills):
+    response = get_bills(alice, **{'If-None-Match': 'W/"stale"'})
+
+    assert response.status_code == 200
+    assert response.get_json() == {'bills': []}
+
+
+def test_validators_are_not_shown_to_unauthorized_callers(client, db, alice, make_user, get_bills, auth_headers):
+    etag = get_bills(alice).headers['ETag']
+
+    anonymous = client.get(f'/api/bills/{alice}', headers={'If-None-Match': etag})
+    other_user = client.get(f'/api/bills/{alice}', headers=dict(auth_headers(make_user('bob')), **{'If-None-Match': etag}))
+
+    assert (anonymous.status_code, other_user.status_code) == (401, 403)
+    assert 'ETag' not in anonymous.headers and 'ETag' not in other_user.headers
+
+
+# --- Version Bumps ---
+
+def test_writes_to_the_users_bills_change_the_etag(db, alice, utility_id, get_bills):
+    etag = get_bills(alice).headers['ETag']
+    bill_id = db.add_bill(alice, utility_id, 100.0, '2030-01-31')
+
+    added = get_bills(alice, **{'If-None-Match': etag})
+    assert added.status_code == 200
+    assert [b['bill_id'] for b in added.get_json()['bills']] == [bill_id]
+
+    assert db.update_bill(bill_id, status='paid') is True
+    updated = get_bills(alice, **{'If-None-Match': added.headers['ETag']})
+    assert updated.status_code == 200
+    assert updated.get_json()['bills'][0]['status'] == 'paid'
+
+
+def test_other_users_writes_keep_the_etag(db, alice, make_user, utility_id, get_bills):
+    etag = get_bills(alice).headers['ETag']
+
+    db.add_bill(make_user('bob'), utility_id, 100.0, '2030-01-31')
+
+    assert get_bills(alice, **{'If-None-Match': etag}).status_code == 304
+
+
+def test_shared_scopes_change_every_users_etag(db, alice, utility_id, get_bills):
+    etag = get_bills(alice).headers['ETag']
+
+    assert db.update_utility(utility_id, name='Power') is True
+
+    assert get_bills(alice, **{'If-None-Match': etag}).status_code == 200
+
+
+def test_writes_that_change_nothing_do_not_bump_versions(db, alice, utility_id):
+    scopes = ['bills', db.user_scope(alice, 'bills')]
+    bill_id = db.add_bill(alice, utility_id, 100.0, '2030-01-31')
+    before, _ = db.get_versions(scopes)
+
+    assert db.update_bill(bill_id + 1, status='paid') is False
+    assert db.delete_bill(bill_id + 1) is False
+
+    assert db.get_versions(scopes)[0] == before
+
+
+def test_versions_strictly_increase(db, alice):
+    scope = db.user_scope(alice, 'bills')
+    seen = []
+    for _ in range(5):
+        with db.get_connection() as conn:
+            db.bump_versions(conn.cursor(), scope)
+            conn.commit()
+        seen.append(db.get_versions([scope])[0][scope])
+
+    assert seen == sorted(set(seen))
+    assert db.get_versions(['never-written'])[0] == {'never-written': 0}
+
+
+def test_etag_depends_on_every_scope_version():
+    base = compute_etag({'a': 1, 'b': 2})
+
+    assert compute_etag({'b': 2, 'a': 1}) == base
+    assert compute_etag({'a': 1, 'b': 3}) != base
+    assert compute_etag({'a': 1, 'b': 2}, '2030-01-31') != base
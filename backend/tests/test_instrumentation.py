@@ -0,0 +1,44 @@
+import pytest
+
+from resources import instrumentation
+
+
+# --- Slow Query Log ---
+
+def test_slow_queries_log_parameter_types_not_values(app, db, monkeypatch, capsys):
+    monkeypatch.setattr(instrumentation, 'SLOW_QUERY_MS', 0)
+
+    db.get_user_by_username('secret-username')
+
+    entry = next(e for e in instrumentation.get_slow_queries() if 'WHERE username = ?' in e['sql'])
+    assert entry['parameters'] == '1 (str)'
+    assert 'secret-username' not in capsys.readouterr().out
+
+
+@pytest.mark.parametrize('parameters, described', [
+    ((1, 'a', 'b', None), '4 (int, str, NoneType)'),
+    ([], '0'),
+    ({'user_id': 1}, '1 (int)'),
+    (None, '(executemany)'),
+])
+def test_describe_parameters(parameters, described):
+    assert instrumentation._describe_parameters(parameters) == described
+
+
+# --- GET /metrics ---
+
+def test_metrics_need_admin_credentials(client, make_user, auth_headers):
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers=auth_headers(make_user())).status_code == 401
+
+    response = client.get('/metrics', headers=auth_headers(make_user('root', role='admin'), role='admin'))
+
+    assert response.status_code == 200
+    assert response.content_type == instrumentation.CONTENT_TYPE
+
+
+def test_metrics_accept_the_scrape_token(client, db, monkeypatch):
+    monkeypatch.setattr(instrumentation, 'METRICS_TOKEN', 'scrape-secret')
+
+    assert client.get('/metrics', headers={'Authorization': 'Bearer scrape-secret'}).status_code == 200
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
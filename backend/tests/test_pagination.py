@@ -0,0 +1,113 @@
+import pytest
+
+from resources import pagination
+
+
+@pytest.fixture
+def admin(make_user, auth_headers):
+    return auth_headers(make_user('admin', role='admin'), role='admin')
+
+
+@pytest.fixture
+def alice(make_user):
+    return make_user('alice')
+
+
+@pytest.fixture
+def pages(client, admin):
+    def pages(kind, sort_column, **params):
+        """Follow next_cursor from the first page to the last; return each page's (sort key, id) pairs."""
+        result = []
+        cursor = None
+        while True:
+            query = dict(params, cursor=cursor) if cursor else params
+            response = client.get(f'/api/admin/{kind}', query_string=query, headers=admin)
+            assert response.status_code == 200
+            body = response.get_json()
+            id_column = kind[:-1] + '_id'
+            result.append([(row[sort_column], row[id_column]) for row in body[kind]])
+            cursor = body['next_cursor']
+            if cursor is None:
+                return result
+    return pages
+
+
+# --- Cursors ---
+
+def test_cursor_round_trips_the_sort_key():
+    key = ['2030-01-31', 42]
+
+    cursor = pagination.encode_cursor(key)
+
+    assert '=' not in cursor
+    assert pagination.decode_cursor(cursor) == key
+    assert pagination.encode_cursor(None) is None and pagination.decode_cursor('') is None
+
+
+@pytest.mark.parametrize('cursor', ['not base64!', pagination.encode_cursor(['2030-01-31']), 'bnVsbA'])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(pagination.InvalidQuery):
+        pagination.decode_cursor(cursor)
+
+
+def test_limit_is_clamped():
+    assert pagination.parse_limit(None) == pagination.DEFAULT_PAGE_SIZE
+    assert pagination.parse_limit('0') == 1
+    assert pagination.parse_limit(str(pagination.MAX_PAGE_SIZE + 1)) == pagination.MAX_PAGE_SIZE
+    with pytest.raises(pagination.InvalidQuery):
+        pagination.parse_limit('ten')
+
+
+# --- Page Boundaries ---
+
+@pytest.mark.parametrize('count', [1, 4, 5])
+def test_walking_every_page_returns_each_bill_once_in_order(db, alice, utility_id, pages, count):
+    # Equal due dates straddle the page boundaries, so the bill_id tie-breaker decides
+    for i in range(count):
+        db.add_bill(alice, utility_id, 10.0 + i, '2030-01-31' if i % 3 else '2030-02-28')
+
+    walked = pages('bills', 'due_date', limit=2)
+
+    rows = [row for page in walked for row in page]
+    assert [len(page) for page in walked] == [2] * (count // 2) + ([count % 2] if count % 2 else [])
+    assert rows == sorted(rows, reverse=True)
+    assert len(set(rows)) == count
+
+
+def test_rows_added_while_paging_do_not_shift_later_pages(client, db, alice, utility_id, admin):
+    ids = [db.add_bill(alice, utility_id, 10.0, '2030-01-31') for _ in range(4)]
+    first = client.get('/api/admin/bills', query_string={'limit': 2}, headers=admin).get_json()
+
+    db.add_bill(alice, utility_id, 10.0, '2030-12-31')  # sorts before everything already returned
+    second = client.get('/api/admin/bills', query_string={'limit': 2, 'cursor': first['next_cursor']},
+                        headers=admin).get_json()
+
+    assert [b['bill_id'] for b in first['bills']] == ids[:1:-1]
+    assert [b['bill_id'] for b in second['bills']] == ids[1::-1]
+    assert second['next_cursor'] is None
+
+
+def test_cursor_pages_respect_filters(db, alice, make_user, utility_id, pages):
+    bob = make_user('bob')
+    mine = [db.add_bill(alice, utility_id, 10.0, f'2030-01-{day:02d}') for day in range(1, 6)]
+    db.add_bill(bob, utility_id, 10.0, '2030-01-03')
+
+    walked = pages('bills', 'due_date', limit=2, user_id=alice, **{'from': '2030-01-02'})
+
+    assert [bill_id for page in walked for _, bill_id in page] == mine[:0:-1]
+
+
+def test_payments_page_by_transaction_date(db, alice, utility_id, pages):
+    bill_ids = [db.add_bill(alice, utility_id, 10.0, '2030-01-31') for _ in range(5)]
+    db.add_batch_payment(alice, bill_ids, 'UPI')
+
+    walked = pages('payments', 'transaction_date', limit=2)
+
+    rows = [row for page in walked for row in page]
+    assert len(walked) == 3
+    assert rows == sorted(rows, reverse=True) and len(set(rows)) == 5
+
+
+def test_bad_query_parameters_are_a_400(client, db, admin):
+    for query in ({'cursor': 'garbage'}, {'limit': 'ten'}, {'user_id': 'alice'}, {'from': '31-01-2030'}):
+        assert client.get('/api/admin/bills', query_string=query, headers=admin).status_code == 400
@@ -0,0 +1,200 @@
+import pytest
+
+from resources import gateway
+from resources import payment_queue
+
+
+class ScriptedGateway(gateway.PaymentGateway):
+    """Answers charges with the given results in order and records every call."""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = []
+
+    def charge(self, job, idempotency_key):
+        self.calls.append((job['job_id'], idempotency_key))
+        return self.results.pop(0)
+
+
+APPROVED = gateway.GatewayResult(True, reference='ref-1')
+TIMED_OUT = gateway.GatewayResult(False, error="Gateway timed out.", retryable=True)
+DECLINED = gateway.GatewayResult(False, error="Payment declined by gateway.")
+
+
+@pytest.fixture
+def alice(make_user):
+    return make_user('alice')
+
+
+@pytest.fixture
+def bill_id(db, alice, utility_id):
+    return db.add_bill(alice, utility_id, 250.0, '2030-01-31')
+
+
+@pytest.fixture
+def use_gateway(monkeypatch):
+    def use_gateway(*results):
+        scripted = ScriptedGateway(*results)
+        monkeypatch.setattr(gateway, '_gateway', scripted)
+        return scripted
+    return use_gateway
+
+
+@pytest.fixture
+def worker():
+    # No threads: tests claim and process jobs one at a time
+    return payment_queue.PaymentWorkerPool(workers=0)
+
+
+def run_next(db, worker):
+    job = db.claim_payment_job()
+    assert job is not None
+    worker.process(job)
+    return db.get_payment_job(job['job_id'])
+
+
+# --- Submitting ---
+
+def test_post_queues_a_job_and_answers_202_with_a_status_url(client, db, alice, bill_id, auth_headers):
+    response = client.post(f'/api/payments/{alice}', json={'bill_id': bill_id, 'payment_amount': 250.0,
+                                                          'payment_method': 'UPI'}, headers=auth_headers(alice))
+
+    assert response.status_code == 202
+    body = response.get_json()
+    assert response.headers['Location'] == body['status_url'] == f"/api/payments/jobs/{body['job_id']}"
+    job = client.get(body['status_url'], headers=auth_headers(alice)).get_json()['job']
+    assert (job['bill_id'], job['status'], job['attempts']) == (bill_id, 'pending', 0)
+    assert db.get_bill_by_id(bill_id)['status'] == 'pending'
+
+
+def test_a_bill_has_at_most_one_open_job(client, db, alice, bill_id, auth_headers):
+    body = {'bill_id': bill_id, 'payment_amount': 250.0, 'payment_method': 'UPI'}
+    first = client.post(f'/api/payments/{alice}', json=body, headers=auth_headers(alice))
+    second = client.post(f'/api/payments/{alice}', json=body, headers=auth_headers(alice))
+
+    assert second.status_code == 409
+    assert second.get_json()['job_id'] == first.get_json()['job_id']
+
+
+def test_the_job_charges_the_bill_amount(client, db, alice, bill_id, auth_headers):
+    response = client.post(f'/api/payments/{alice}', json={'bill_id': bill_id, 'payment_amount': '250.00',
+                                                          'payment_method': 'UPI'}, headers=auth_headers(alice))
+
+    assert response.status_code == 202
+    assert db.get_payment_job(response.get_json()['job_id'])['amount'] == 250.0
+
+
+@pytest.mark.parametrize('payment_amount', [1, 250.01, 'all of it'])
+def test_an_amount_other_than_the_bill_amount_is_rejected(client, db, alice, bill_id, auth_headers, payment_amount):
+    response = client.post(f'/api/payments/{alice}', json={'bill_id': bill_id, 'payment_amount': payment_amount,
+                                                          'payment_method': 'UPI'}, headers=auth_headers(alice))
+
+    assert response.status_code == 400
+    assert db.claim_payment_job() is None
+
+
+def test_job_status_is_only_visible_to_its_owner(client, db, alice, bill_id, make_user, auth_headers):
+    job_id, _ = db.enqueue_payment_job(bill_id, alice, 250.0, 'UPI')
+
+    assert client.get(f'/api/payments/jobs/{job_id}').status_code == 401
+    assert client.get(f'/api/payments/jobs/{job_id}', headers=auth_headers(make_user('bob'))).status_code == 403
+    assert client.get(f'/api/payments/jobs/{job_id + 1}', headers=auth_headers(alice)).status_code == 404
+
+
+# --- Claiming ---
+
+def test_claim_moves_the_oldest_pending_job_to_processing(db, alice, bill_id, utility_id):
+    other_bill = db.add_bill(alice, utility_id, 10.0, '2030-02-28')
+    first, _ = db.enqueue_payment_job(bill_id, alice, 250.0, 'UPI')
+    second, _ = db.enqueue_payment_job(other_bill, alice, 10.0, 'UPI')
+
+    claimed = db.claim_payment_job()
+
+    assert (claimed['job_id'], claimed['attempts']) == (first, 1)
+    assert db.get_payment_job(first)['status'] == 'processing'
+    assert db.claim_payment_job()['job_id'] == second
+    assert db.claim_payment_job() is None
+
+
+def test_stale_processing_jobs_are_requeued(db, alice, bill_id):
+    job_id, _ = db.enqueue_payment_job(bill_id, alice, 250.0, 'UPI')
+    db.claim_payment_job()
+    with db.get_connection() as conn:
+        conn.execute("UPDATE payment_jobs SET updated_at = '2000-01-01 00:00:00' WHERE job_id = ?;", (job_id,))
+        conn.commit()
+
+    assert db.requeue_stale_payment_jobs(60) == 1
+    assert db.get_payment_job(job_id)['status'] == 'pending'
+    assert db.claim_payment_job()['attempts'] == 2
+
+
+# --- Completing ---
+
+def test_approved_charge_records_the_payment_and_marks_the_bill_paid(db, alice, bill_id, worker, use_gateway):
+    scripted = use_gateway(APPROVED)
+    job_id, _ = db.enqueue_payment_job(bill_id, alice, 250.0, 'UPI')
+
+    job = run_next(db, worker)
+
+    assert (job['status'], job['gateway_reference'], job['error']) == ('completed', 'ref-1', None)
+    assert scripted.calls == [(job_id, f'payment-job-{job_id}')]
+    payment = [p for p in db.get_all_payments() if p['payment_id'] == job['payment_id']][0]
+    assert (payment['bill_id'], payment['amount']) == (bill_id, 250.0)
+    assert db.get_bill_by_id(bill_id)['status'] == 'paid'
+    assert worker.metrics()['processed'] == 1 and worker.metrics()['failed'] == 0
+
+
+def test_charge_for_a_bill_paid_meanwhile_is_not_recorded(db, alice, bill_id, worker, use_gateway):
+    use_gateway(APPROVED)
+    job_id, _ = db.enqueue_payment_job(bill_id, alice, 250.0, 'UPI')
+    job = db.claim_payment_job()
+    db.update_bill(bill_id, status='paid')  # e.g. paid at the counter while the charge was in flight
+
+    payment_id, error = db.complete_payment_job(job_id, 'ref-1')
+
+    assert payment_id is None and 'ref-1' in error
+    assert db.get_payment_job(job_id)['status'] == 'failed'
+    assert db.get_all_payments() == []
+    worker.process(dict(job, attempts=1))  # processing it anyway changes nothing
+    assert db.get_all_payments() == []
+
+
+# --- Retrying ---
+
+def test_retryable_failures_go_back_to_pending_until_max_attempts(db, alice, bill_id, worker, use_gateway, monkeypatch):
+    monkeypatch.setattr(payment_queue, 'PAYMENT_MAX_ATTEMPTS', 2)
+    scripted = use_gateway(TIMED_OUT, TIMED_OUT)
+    job_id, _ = db.enqueue_payment_job(bill_id, alice, 250.0, 'UPI')
+
+    job = run_next(db, worker)
+    assert (job['status'], job['attempts'], job['error']) == ('pending', 1, "Gateway timed out.")
+
+    job = run_next(db, worker)
+    assert (job['status'], job['attempts']) == ('failed', 2)
+    assert db.claim_payment_job() is None
+    # Every attempt carries the same idempotency key, so the gateway never charges twice
+    assert [key for _, key in scripted.calls] == [f'payment-job-{job_id}'] * 2
+    assert db.get_bill_by_id(bill_id)['status'] == 'pending'
+
+
+def test_retry_succeeds_after_a_timeout(db, alice, bill_id, worker, use_gateway):
+    use_gateway(TIMED_OUT, APPROVED)
+    db.enqueue_payment_job(bill_id, alice, 250.0, 'UPI')
+
+    run_next(db, worker)
+    job = run_next(db, worker)
+
+    assert (job['status'], job['attempts'], job['error']) == ('completed', 2, None)
+    assert db.get_bill_by_id(bill_id)['status'] == 'paid'
+
+
+def test_declined_charges_fail_without_retry(db, alice, bill_id, worker, use_gateway):
+    use_gateway(DECLINED)
+    db.enqueue_payment_job(bill_id, alice, 250.0, 'UPI')
+
+    job = run_next(db, worker)
+
+    assert (job['status'], job['error']) == ('failed', "Payment declined by gateway.")
+    assert db.claim_payment_job() is None
+    # A failed job no longer blocks a new attempt for the bill
+    assert db.enqueue_payment_job(bill_id, alice, 250.0, 'UPI')[1] is True
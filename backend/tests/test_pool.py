@@ -0,0 +1,157 @@
+import sqlite3
+import threading
+
+import pytest
+
+from resources.pool import ConnectionPool, PoolTimeout, Savepoint
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / 'pool.db')
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE items (name TEXT);")
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def make_pool(path):
+    pools = []
+
+    def make_pool(**kwargs):
+        pool = ConnectionPool(lambda: sqlite3.connect(path, check_same_thread=False), **kwargs)
+        pools.append(pool)
+        return pool
+    yield make_pool
+    for pool in pools:
+        pool.close_all()
+
+
+def names(path):
+    conn = sqlite3.connect(path)
+    try:
+        return [row[0] for row in conn.execute("SELECT name FROM items ORDER BY name;")]
+    finally:
+        conn.close()
+
+
+# --- Exhaustion ---
+
+def test_checkout_times_out_when_exhausted(make_pool):
+    pool = make_pool(max_size=1, timeout=0.05)
+    held = pool.acquire()
+    errors = []
+    thread = threading.Thread(target=lambda: errors.append(pytest.raises(PoolTimeout, pool.acquire)))
+    thread.start()
+    thread.join()
+    assert errors
+    assert pool.metrics()['timeouts'] == 1
+    pool.release(held)
+
+
+def test_waiter_gets_the_released_connection(make_pool):
+    pool = make_pool(max_size=1, timeout=5)
+    held = pool.acquire()
+    got = []
+    thread = threading.Thread(target=lambda: got.append(pool.acquire()))
+    thread.start()
+    pool.release(held)
+    thread.join()
+    assert got == [held]
+    assert pool.metrics()['waits'] == 1
+    pool.release(got[0])
+
+
+# --- Broken connections ---
+
+def test_broken_connection_is_discarded(make_pool):
+    pool = make_pool(max_size=1)
+    with pytest.raises(sqlite3.ProgrammingError):
+        with pool.connection() as conn:
+            conn.close()
+            conn.execute("SELECT 1;")
+    assert pool.metrics()['evictions'] == 1
+    with pool.connection() as fresh:
+        assert fresh is not conn
+        assert fresh.execute("SELECT 1;").fetchone() == (1,)
+
+
+def test_unhealthy_idle_connection_is_replaced(make_pool):
+    pool = make_pool(max_size=1, health_check_after=0)
+    with pool.connection() as conn:
+        pass
+    conn.close()  # e.g. the server dropped it while idle
+    with pool.connection() as fresh:
+        assert fresh is not conn
+        assert fresh.execute("SELECT 1;").fetchone() == (1,)
+    assert pool.metrics()['size'] == 1
+
+
+def test_uncommitted_work_is_rolled_back_on_release(make_pool, path):
+    pool = make_pool(max_size=1)
+    with pool.connection() as conn:
+        conn.execute("INSERT INTO items VALUES ('lost');")
+    assert names(path) == []
+
+
+# --- Re-entrancy ---
+
+def test_nested_block_shares_the_connection(make_pool):
+    pool = make_pool(max_size=1, timeout=0.05)
+    with pool.connection() as outer:
+        with pool.connection() as inner:
+            assert inner is outer
+        assert pool.held_by_current_thread()
+    assert not pool.held_by_current_thread()
+
+
+def test_nested_commit_does_not_commit_the_outer_transaction(make_pool, path):
+    pool = make_pool()
+    with pool.connection() as outer:
+        outer.execute("INSERT INTO items VALUES ('outer');")
+        with pool.connection() as inner:
+            assert isinstance(inner, Savepoint)
+            inner.execute("INSERT INTO items VALUES ('inner');")
+            inner.commit()
+        assert names(path) == []
+        outer.rollback()
+    assert names(path) == []
+
+
+def test_nested_work_joins_the_outer_commit(make_pool, path):
+    pool = make_pool()
+    with pool.connection() as outer:
+        outer.execute("INSERT INTO items VALUES ('outer');")
+        with pool.connection() as inner:
+            inner.execute("INSERT INTO items VALUES ('inner');")
+            inner.commit()
+        outer.commit()
+    assert names(path) == ['inner', 'outer']
+
+
+def test_nested_rollback_and_errors_undo_only_the_nested_work(make_pool, path):
+    pool = make_pool()
+    with pool.connection() as outer:
+        outer.execute("INSERT INTO items VALUES ('outer');")
+        with pool.connection() as inner:
+            inner.execute("INSERT INTO items VALUES ('rolled back');")
+            inner.rollback()
+        with pytest.raises(ZeroDivisionError):
+            with pool.connection() as inner:
+                inner.execute("INSERT INTO items VALUES ('failed');")
+                1 / 0
+        outer.commit()
+    assert names(path) == ['outer']
+
+
+def test_database_helper_inside_a_transaction_does_not_commit_it(db, make_user):
+    user_id = make_user()
+    with db.get_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE;")
+        conn.execute('''INSERT INTO utilities (name, description, provider_name, created_at)
+                        VALUES ('Gas', 'd', 'p', '2025-01-01 00:00:00');''')
+        assert db.update_user(user_id, email='new@example.com') is True  # commits inside
+        conn.rollback()
+    assert [u['name'] for u in db.get_all_utilities()] == []
+    assert db.get_user_by_id(user_id)['email'] == 'alice@example.com'
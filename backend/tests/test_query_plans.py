@@ -0,0 +1,28 @@
+import pytest
+
+from resources import migrations
+
+
+@pytest.fixture
+def sqlite_db(db):
+    if db.engine.name != 'sqlite':
+        pytest.skip("query plans are checked with SQLite's EXPLAIN QUERY PLAN")
+    return db
+
+
+def test_hot_queries_use_indexes(sqlite_db):
+    with sqlite_db.get_connection() as conn:
+        assert migrations.check_query_plans(conn) == {}
+
+
+def test_hot_queries_use_indexes_with_data(sqlite_db):
+    sqlite_db.insert_dummy_data()
+    with sqlite_db.get_connection() as conn:
+        conn.execute("ANALYZE;")
+        assert migrations.check_query_plans(conn) == {}
+
+
+def test_check_flags_full_scans(sqlite_db):
+    scan = {'unindexed': ("SELECT * FROM bills WHERE amount > ?;", (1,))}
+    with sqlite_db.get_connection() as conn:
+        assert list(migrations.check_query_plans(conn, scan)) == ['unindexed']
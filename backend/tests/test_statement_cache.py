@@ -0,0 +1,80 @@
+import gc
+import threading
+
+from resources import queries
+
+UPDATE_EMAIL = queries.update_statement('users.update', {'email': 'a@example.com'})[0]
+
+
+def totals():
+    metrics = queries.get_cache_metrics()
+    other = metrics['statements'].get('other', {'hits': 0, 'misses': 0})
+    return metrics['hits'], metrics['misses'], metrics['evictions'], other['hits'], other['misses']
+
+
+def delta(before):
+    return tuple(after - was for after, was in zip(totals(), before))
+
+
+def test_replays_the_connection_lru():
+    before = totals()
+    cache = queries.StatementCache(size=2)
+
+    for sql in ("SELECT 1;", "SELECT 2;", "SELECT 1;", "SELECT 3;", "SELECT 2;"):
+        cache.record(sql)
+
+    # misses: 1, 2, 3 (evicts 2), 2 (evicts 1); hit: 1
+    assert delta(before) == (1, 4, 2, 1, 4)
+    assert cache.counts['other'] == [1, 4]
+
+
+def test_counts_are_named_after_the_catalog_statement():
+    cache = queries.StatementCache()
+
+    cache.record(UPDATE_EMAIL)
+    cache.record(UPDATE_EMAIL)
+
+    assert cache.counts['users.update'] == [1, 1]
+    assert queries.get_cache_metrics()['statements']['users.update']['hits'] >= 1
+
+
+def test_closed_connections_keep_their_counts():
+    before = totals()
+    cache = queries.StatementCache()
+    cache.record("SELECT 1;")
+    cache.record("SELECT 1;")
+
+    del cache
+    gc.collect()
+
+    assert delta(before) == (1, 1, 0, 1, 1)
+
+
+def test_connections_on_other_threads_count_without_sharing_a_lock():
+    before = totals()
+    caches = []
+
+    def run():
+        cache = queries.StatementCache()
+        caches.append(cache)
+        for i in range(1000):
+            cache.record(f"SELECT {i % 10};")
+
+    threads = [threading.Thread(target=run) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert delta(before) == (8 * 990, 8 * 10, 0, 8 * 990, 8 * 10)
+
+
+def test_nothing_is_recorded_when_statement_stats_are_off(monkeypatch):
+    monkeypatch.setattr(queries, 'STATEMENT_STATS', False)
+    before = totals()
+    cache = queries.StatementCache()
+
+    cache.record("SELECT 1;")
+
+    assert delta(before) == (0, 0, 0, 0, 0)
+    assert cache.counts == {'evictions': 0}
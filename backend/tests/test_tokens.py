@@ -0,0 +1,130 @@
+import time
+
+import pytest
+
+from resources import tokens
+
+
+def tamper(token, part, value):
+    parts = token.split('.')
+    parts[part] = value
+    return '.'.join(parts)
+
+
+# --- Signing ---
+
+def test_issued_token_verifies_without_a_database(monkeypatch):
+    token, claims = tokens.issue_token(7, 'admin')
+    # Revocation list is fresh, so verification must not query the database
+    monkeypatch.setattr(tokens, '_last_refresh', time.time())
+    monkeypatch.setattr(tokens.db, 'get_revoked_tokens', lambda now: pytest.fail("database queried"))
+
+    verified = tokens.verify_token(token)
+
+    assert verified == claims
+    assert verified['uid'] == 7 and verified['role'] == 'admin'
+    assert token.startswith(f"v1.{tokens.SIGNING_KID}.")
+
+
+@pytest.mark.parametrize('token', ['', 'garbage', 'v1.test.payload', None])
+def test_malformed_tokens_are_rejected(token):
+    with pytest.raises(tokens.InvalidToken):
+        tokens.verify_token(token)
+
+
+def test_tampered_payload_is_rejected():
+    token, _ = tokens.issue_token(1, 'user')
+    forged, _ = tokens.issue_token(2, 'admin')
+
+    with pytest.raises(tokens.InvalidToken, match="signature"):
+        tokens.verify_token(tamper(token, 2, forged.split('.')[2]))
+
+
+def test_signature_from_another_key_is_rejected(monkeypatch):
+    token, _ = tokens.issue_token(1, 'user')
+    monkeypatch.setitem(tokens.KEYS, tokens.SIGNING_KID, b'some-other-key')
+
+    with pytest.raises(tokens.InvalidToken, match="signature"):
+        tokens.verify_token(token)
+
+
+def test_unknown_key_id_is_rejected():
+    token, _ = tokens.issue_token(1, 'user')
+
+    with pytest.raises(tokens.InvalidToken, match="key"):
+        tokens.verify_token(tamper(token, 1, 'retired'))
+
+
+# --- Key Rotation ---
+
+def test_tokens_signed_with_a_retired_key_still_verify(monkeypatch):
+    current_kid = tokens.SIGNING_KID
+    monkeypatch.setitem(tokens.KEYS, 'old', b'old-signing-key')
+    monkeypatch.setattr(tokens, 'SIGNING_KID', 'old')
+    old_token, claims = tokens.issue_token(3)
+
+    # After rotation "old" is still listed (second in TOKEN_KEYS) but no longer signs
+    monkeypatch.setattr(tokens, 'SIGNING_KID', current_kid)
+    new_token, _ = tokens.issue_token(3)
+
+    assert old_token.split('.')[1] == 'old'
+    assert new_token.split('.')[1] == tokens.SIGNING_KID
+    assert tokens.verify_token(old_token) == claims
+
+
+# --- Expiry ---
+
+def test_expired_token_is_rejected(monkeypatch):
+    token, claims = tokens.issue_token(1, ttl=60)
+    monkeypatch.setattr(tokens.time, 'time', lambda: claims['exp'] + 1)
+
+    with pytest.raises(tokens.InvalidToken, match="expired"):
+        tokens.verify_token(token)
+
+
+def test_token_is_valid_until_it_expires(monkeypatch):
+    token, claims = tokens.issue_token(1, ttl=60)
+    monkeypatch.setattr(tokens, '_last_refresh', claims['exp'])
+    monkeypatch.setattr(tokens.time, 'time', lambda: claims['exp'] - 1)
+
+    assert tokens.verify_token(token)['uid'] == 1
+
+
+# --- Revocation ---
+
+def test_revoked_token_is_rejected_in_this_process(db):
+    token, claims = tokens.issue_token(1)
+
+    assert tokens.revoke(claims) is True
+    with pytest.raises(tokens.InvalidToken, match="revoked"):
+        tokens.verify_token(token)
+
+
+def test_revocations_from_other_processes_are_picked_up_on_refresh(db, monkeypatch):
+    token, claims = tokens.issue_token(1)
+    tokens._refresh_revocations(force=True)
+    # Another worker process logs the token out: only the table changes here
+    assert db.add_revoked_token(claims['jti'], claims['exp']) is True
+
+    assert tokens.verify_token(token) == claims  # still inside the refresh interval
+
+    monkeypatch.setattr(tokens, '_last_refresh', time.time() - tokens.REVOCATION_REFRESH - 1)
+    with pytest.raises(tokens.InvalidToken, match="revoked"):
+        tokens.verify_token(token)
+
+
+def test_failed_refresh_keeps_the_known_revocations(db, monkeypatch):
+    token, claims = tokens.issue_token(1)
+    tokens.revoke(claims)
+    monkeypatch.setattr(tokens.db, 'get_revoked_tokens', lambda now: None)
+
+    tokens._refresh_revocations(force=True)
+
+    assert tokens.is_revoked(claims['jti'])
+
+
+def test_logout_revokes_the_presented_token(client, make_user, auth_headers):
+    headers = auth_headers(make_user())
+
+    assert client.post('/api/auth/logout', headers=headers).status_code == 200
+    assert client.post('/api/auth/logout', headers=headers).status_code == 401
@@ -48,30 +48,14 @@ function HomePage() {
       };
 
       try {
-        // Fetch User Data, Bills, and Reminders in parallel
-        const [userRes, billsRes, remindersRes] = await Promise.all([
-          axios.get(`${API_BASE_URL}/api/users/${userId}`, config),
-          axios.get(`${API_BASE_URL}/api/bills/${userId}`, config),
-          axios.get(`${API_BASE_URL}/api/reminders/${userId}`, config),
-        ]);
-
-        setUserData(userRes.data.user || {});
-
-        const fetchedBills = billsRes.data.bills || [];
-
-        const pendingBills = fetchedBills.filter(
-          (bill) => bill.status && bill.status.toLowerCase() === 'pending'
-        );
-
-        setBills(pendingBills);
-
-        const total = pendingBills.reduce((sum, bill) => {
-          return sum + (parseFloat(bill.amount) || 0);
-        }, 0);
-
-        setTotalDue(total);
-
-        setReminders(remindersRes.data.reminders || []);
+        // One request: profile, pending bills, totals and reminders are aggregated server-side
+        const dashboardRes = await axios.get(`${API_BASE_URL}/api/dashboard/${userId}`, config);
+        const dashboard = dashboardRes.data || {};
+
+        setUserData(dashboard.user || {});
+        setBills(dashboard.pending_bills || []);
+        setTotalDue(parseFloat(dashboard.totals?.total_due) || 0);
+        setReminders(dashboard.reminders || []);
 
       } catch (error) {
         console.error('Error fetching data for HomePage:', error);